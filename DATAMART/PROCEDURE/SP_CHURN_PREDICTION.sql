@@ -1,23 +1,165 @@
-CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_CHURN_PREDICTION()
+CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_CHURN_PREDICTION("RETENTION_DAYS" NUMBER(38,0) DEFAULT 90)
 RETURNS VARCHAR
 LANGUAGE SQL
 EXECUTE AS OWNER
 AS '
+DECLARE
+    -- Naikkan versi kalau model / isi prompt diubah: entry cache lama tidak dipakai lagi lalu di-evict
+    prompt_version VARCHAR DEFAULT ''churn-reason-v1'';
+    candidates INTEGER DEFAULT 0;
+    generated INTEGER DEFAULT 0;
+    evicted INTEGER DEFAULT 0;
 BEGIN
     CALL TELCO.DATAMART.SP_CUSTOMER_STATUS_PREDICTION();
-    CREATE OR REPLACE TABLE TELCO.DATAMART.TB_F_CHURN_PREDICTION AS
-    SELECT DISTINCT
-        a.CUSTOMER_ID,
-        a.PREDICTION_RESULTS,
-        CASE 
-            WHEN a.PREDICTION_RESULTS = ''No'' THEN NULL
-            ELSE SNOWFLAKE.CORTEX.COMPLETE(
-                ''snowflake-arctic'',
-                CONCAT(''You are a churn prediction analyst...'')
-            )
-        END AS CHURN_REASON,
-        a.PREDICTION_DATE
-    FROM TELCO.DATAMART.TB_R_CHURN_PREDICTION a;
-    RETURN ''✅ Churn prediction table created successfully.'';
+
+    CREATE TABLE IF NOT EXISTS TELCO.DATAMART.TB_F_CHURN_PREDICTION (
+        CUSTOMER_ID VARCHAR,
+        PREDICTION_RESULTS VARCHAR,
+        CHURN_REASON VARCHAR,
+        PREDICTION_DATE DATE
+    );
+
+    -- Cache alasan churn per (customer, hash fitur, versi prompt)
+    CREATE TABLE IF NOT EXISTS TELCO.DATAMART.TB_C_CHURN_REASON_CACHE (
+        CUSTOMER_ID VARCHAR,
+        FEATURE_HASH VARCHAR,
+        PROMPT_VERSION VARCHAR,
+        CHURN_REASON VARCHAR,
+        CREATED_AT TIMESTAMP_NTZ,
+        LAST_USED_AT TIMESTAMP_NTZ
+    );
+
+    -- 1. Prediksi terbaru per (customer, tanggal); yang sudah ada di TB_F dengan hasil sama dilewati.
+    --    Dedup dulu baru dibandingkan: filter sebelum QUALIFY bisa memilih baris lama yang kebetulan beda.
+    CREATE OR REPLACE TEMPORARY TABLE TELCO.DATAMART.TMP_CHURN_CANDIDATE AS
+    WITH latest AS (
+        SELECT CUSTOMER_ID, PREDICTION_RESULTS, PREDICTION_DATE
+        FROM TELCO.DATAMART.TB_R_CHURN_PREDICTION
+        QUALIFY ROW_NUMBER() OVER (
+            PARTITION BY CUSTOMER_ID, PREDICTION_DATE
+            ORDER BY SCORED_AT DESC NULLS LAST, PREDICTION_RESULTS DESC
+        ) = 1
+    ),
+    pred AS (
+        SELECT r.CUSTOMER_ID, r.PREDICTION_RESULTS, r.PREDICTION_DATE
+        FROM latest r
+        WHERE NOT EXISTS (
+            SELECT 1 FROM TELCO.DATAMART.TB_F_CHURN_PREDICTION p
+            WHERE p.CUSTOMER_ID = r.CUSTOMER_ID
+              AND p.PREDICTION_DATE = r.PREDICTION_DATE
+              AND p.PREDICTION_RESULTS IS NOT DISTINCT FROM r.PREDICTION_RESULTS
+        )
+    ),
+    prompt AS (
+        SELECT
+            a.CUSTOMER_ID,
+            a.PREDICTION_RESULTS,
+            a.PREDICTION_DATE,
+            CONCAT(
+                ''You are a churn prediction analyst. '',
+                ''Given this customer profile, explain briefly (in 5–10 words) why this customer might churn: '',
+                ''Gender: '', b.GENDER, '', '',
+                ''Senior Citizen: '', b.SENIOR_CITIZEN, '', '',
+                ''Partner: '', b.PARTNER, '', '',
+                ''Dependents: '', b.DEPENDENTS, '', '',
+                ''Country: '', b.COUNTRY_CODE, '', '',
+                ''State: '', b.STATE, '', '',
+                ''City: '', b.CITY, '', '',
+                ''Latitude: '', b.LATITUDE, '', Longitude: '', b.LONGITUDE, '', '',
+                ''Phone Service: '', c.PHONE_SERVICE, '', '',
+                ''Multiple Lines: '', c.MULTIPLE_LINES, '', '',
+                ''Internet Service: '', c.INTERNET_SERVICE, '', '',
+                ''Online Security: '', c.ONLINE_SECURITY, '', '',
+                ''Online Backup: '', c.ONLINE_BACKUP, '', '',
+                ''Device Protection: '', c.DEVICE_PROTECTION, '', '',
+                ''Tech Support: '', c.TECH_SUPPORT, '', '',
+                ''Streaming TV: '', c.STREAMING_TV, '', '',
+                ''Streaming Movies: '', c.STREAMING_MOVIES, '', '',
+                ''Contract: '', c.CONTRACT_TYPE, '', '',
+                ''Paperless Billing: '', c.PAPERLESS_BILLING, '', '',
+                ''Payment Method: '', c.PAYMENT_METHOD, '', '',
+                ''Date Joined: '', d.DATE_JOINED, '', '',
+                ''Quarter: '', CONCAT(''Q'', f.quarter, ''-'', f.year), '', '',
+                ''Tenure (months): '', d.TENURE_MONTHS, '', '',
+                ''Monthly Charges: '', d.MONTHLY_CHARGES, '', '',
+                ''Total Charges: '', d.TOTAL_CHARGES, '', '',
+                ''CLTV: '', d.CLTV, '', '',
+                ''Birth Date: '', b.BIRTH_DATE, '', '',
+                ''Predicted churn status: '', a.PREDICTION_RESULTS, ''.''
+            ) AS PROMPT
+        FROM pred a
+        LEFT JOIN TELCO.DATAMART.TB_R_CUSTOMER b ON a.customer_id = b.customer_id
+        LEFT JOIN TELCO.DATAMART.TB_F_SERVICE_USAGE c ON a.customer_id = c.customer_id
+        LEFT JOIN TELCO.DATAMART.TB_F_REVENUE d ON a.customer_id = d.customer_id
+        LEFT JOIN TELCO.DATAMART.TB_R_DATE f ON d.date_joined = f.date_id
+    )
+    -- Prompt = seluruh fitur yang dilihat model + status prediksi -> hash prompt = hash vektor fitur
+    SELECT *, SHA2(COALESCE(PROMPT, ''''), 256) AS FEATURE_HASH
+    FROM prompt;
+    candidates := (SELECT COUNT(*) FROM TELCO.DATAMART.TMP_CHURN_CANDIDATE);
+
+    -- 2. COMPLETE hanya untuk (customer, fitur) churner yang belum ada di cache
+    INSERT INTO TELCO.DATAMART.TB_C_CHURN_REASON_CACHE
+        (CUSTOMER_ID, FEATURE_HASH, PROMPT_VERSION, CHURN_REASON, CREATED_AT, LAST_USED_AT)
+    SELECT
+        m.CUSTOMER_ID,
+        m.FEATURE_HASH,
+        :prompt_version,
+        SNOWFLAKE.CORTEX.COMPLETE(''snowflake-arctic'', m.PROMPT),
+        CURRENT_TIMESTAMP(),
+        CURRENT_TIMESTAMP()
+    FROM (
+        SELECT t.CUSTOMER_ID, t.FEATURE_HASH, ANY_VALUE(t.PROMPT) AS PROMPT
+        FROM TELCO.DATAMART.TMP_CHURN_CANDIDATE t
+        WHERE t.PREDICTION_RESULTS <> ''No''
+          AND NOT EXISTS (
+            SELECT 1 FROM TELCO.DATAMART.TB_C_CHURN_REASON_CACHE k
+            WHERE k.CUSTOMER_ID = t.CUSTOMER_ID
+              AND k.FEATURE_HASH = t.FEATURE_HASH
+              AND k.PROMPT_VERSION = :prompt_version
+          )
+        GROUP BY t.CUSTOMER_ID, t.FEATURE_HASH
+    ) m;
+    generated := SQLROWCOUNT;
+
+    -- Cache hit ikut diperbarui LAST_USED_AT-nya (dasar eviction)
+    UPDATE TELCO.DATAMART.TB_C_CHURN_REASON_CACHE k
+    SET LAST_USED_AT = CURRENT_TIMESTAMP()
+    FROM (SELECT DISTINCT CUSTOMER_ID, FEATURE_HASH FROM TELCO.DATAMART.TMP_CHURN_CANDIDATE) t
+    WHERE k.CUSTOMER_ID = t.CUSTOMER_ID
+      AND k.FEATURE_HASH = t.FEATURE_HASH
+      AND k.PROMPT_VERSION = :prompt_version;
+
+    -- 3. TB_F dipelihara incremental (bukan CREATE OR REPLACE); rerun yang mengubah hasil prediksi -> UPDATE
+    MERGE INTO TELCO.DATAMART.TB_F_CHURN_PREDICTION p
+    USING (
+        SELECT
+            t.CUSTOMER_ID,
+            t.PREDICTION_RESULTS,
+            IFF(t.PREDICTION_RESULTS = ''No'', NULL, k.CHURN_REASON) AS CHURN_REASON,
+            t.PREDICTION_DATE
+        FROM TELCO.DATAMART.TMP_CHURN_CANDIDATE t
+        LEFT JOIN TELCO.DATAMART.TB_C_CHURN_REASON_CACHE k
+            ON k.CUSTOMER_ID = t.CUSTOMER_ID
+           AND k.FEATURE_HASH = t.FEATURE_HASH
+           AND k.PROMPT_VERSION = :prompt_version
+    ) s
+    ON p.CUSTOMER_ID = s.CUSTOMER_ID AND p.PREDICTION_DATE = s.PREDICTION_DATE
+    WHEN MATCHED THEN UPDATE SET
+        PREDICTION_RESULTS = s.PREDICTION_RESULTS,
+        CHURN_REASON = s.CHURN_REASON
+    WHEN NOT MATCHED THEN INSERT (CUSTOMER_ID, PREDICTION_RESULTS, CHURN_REASON, PREDICTION_DATE)
+        VALUES (s.CUSTOMER_ID, s.PREDICTION_RESULTS, s.CHURN_REASON, s.PREDICTION_DATE);
+
+    -- 4. Eviction: versi prompt lama, atau tidak terpakai lebih dari RETENTION_DAYS hari
+    DELETE FROM TELCO.DATAMART.TB_C_CHURN_REASON_CACHE
+    WHERE PROMPT_VERSION <> :prompt_version
+       OR LAST_USED_AT < DATEADD(day, -1 * :RETENTION_DAYS, CURRENT_TIMESTAMP());
+    evicted := SQLROWCOUNT;
+
+    DROP TABLE IF EXISTS TELCO.DATAMART.TMP_CHURN_CANDIDATE;
+
+    RETURN ''✅ Churn prediction merged: candidates='' || candidates ||
+           '', reasons_generated='' || generated || '', cache_evicted='' || evicted;
 END;
 ';
\ No newline at end of file
@@ -1,11 +1,12 @@
-CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_CUSTOMER_SEGMENTATION()
+CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_CUSTOMER_SEGMENTATION("MODE" VARCHAR DEFAULT 'auto', "BATCH_ROWS" NUMBER(38,0) DEFAULT 10000)
 RETURNS VARCHAR
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.9'
-PACKAGES = ('snowflake-snowpark-python','pandas','scikit-learn','category_encoders')
-HANDLER = 'main'
+PACKAGES = ('snowflake-snowpark-python','pandas','scikit-learn','category_encoders','joblib')
+HANDLER = 'run'
+IMPORTS = ('@TELCO.APPS.ST_CODE/churn_scoring.py', '@TELCO.APPS.ST_CODE/customer_segmentation.py')
 EXECUTE AS OWNER
 AS '
-import pandas as pd
-def main(session): return "segmentation done"
+import customer_segmentation
+def run(session, mode: str, batch_rows: int): return customer_segmentation.main(session, mode, batch_rows)
 ';
\ No newline at end of file
@@ -1,11 +1,12 @@
-CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_CUSTOMER_STATUS_PREDICTION()
+CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_CUSTOMER_STATUS_PREDICTION("MODE" VARCHAR DEFAULT 'udf', "BATCH_ROWS" NUMBER(38,0) DEFAULT 10000)
 RETURNS VARCHAR
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.9'
-PACKAGES = ('pandas','scikit-learn','joblib','snowflake-snowpark-python')
-HANDLER = 'main'
+PACKAGES = ('pandas','scikit-learn','joblib','snowflake-snowpark-python','imbalanced-learn','category_encoders')
+HANDLER = 'run'
+IMPORTS = ('@TELCO.APPS.ST_CODE/churn_scoring.py')
 EXECUTE AS OWNER
 AS '
-import pandas as pd
-def main(session): return "prediction done"
+import churn_scoring
+def run(session, mode: str, batch_rows: int): return churn_scoring.main(session, mode, batch_rows)
 ';
\ No newline at end of file
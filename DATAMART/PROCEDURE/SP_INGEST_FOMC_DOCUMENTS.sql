@@ -0,0 +1,12 @@
+CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_INGEST_FOMC_DOCUMENTS("BATCH_FILES" NUMBER(38,0) DEFAULT 20, "PARALLELISM" NUMBER(38,0) DEFAULT 4)
+RETURNS VARCHAR
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.9'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'run'
+IMPORTS = ('@TELCO.APPS.ST_CODE/ingest_documents.py')
+EXECUTE AS OWNER
+AS '
+import ingest_documents
+def run(session, batch_files: int, parallelism: int): return ingest_documents.ingest(session, batch_files, parallelism)
+';
\ No newline at end of file
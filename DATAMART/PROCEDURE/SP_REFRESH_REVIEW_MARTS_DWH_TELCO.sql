@@ -1,10 +1,12 @@
-CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_REFRESH_REVIEW_MARTS_DWH_TELCO()
+CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_REFRESH_REVIEW_MARTS_DWH_TELCO("MODE" VARCHAR DEFAULT 'incremental')
 RETURNS VARCHAR
-LANGUAGE SQL
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.10'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'run'
+IMPORTS = ('@TELCO.APPS.ST_CODE/semantic_rollups.py')
 EXECUTE AS OWNER
 AS '
-BEGIN
-  CREATE OR REPLACE TABLE DATAMART.TB_RPT_REVIEWS_YEARLY_NEG_DWH_TELCO AS SELECT 1;
-  RETURN ''OK'';
-END;
+import semantic_rollups
+def run(session, mode: str): return semantic_rollups.main(session, mode)
 ';
\ No newline at end of file
@@ -0,0 +1,12 @@
+CREATE OR REPLACE PROCEDURE TELCO.DATAMART.SP_TRAIN_CHURN_STATUS_MODEL("STRATEGY" VARCHAR DEFAULT 'halving', "FACTOR" NUMBER(38,0) DEFAULT 3)
+RETURNS VARCHAR
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.9'
+PACKAGES = ('pandas','scikit-learn','joblib','snowflake-snowpark-python','imbalanced-learn','category_encoders')
+HANDLER = 'run'
+IMPORTS = ('@TELCO.APPS.ST_CODE/churn_scoring.py', '@TELCO.APPS.ST_CODE/churn_training.py')
+EXECUTE AS OWNER
+AS '
+import churn_training
+def run(session, strategy: str, factor: int): return churn_training.main(session, strategy, factor)
+';
\ No newline at end of file
@@ -0,0 +1,220 @@
+# benchmark_scoring.py
+# ============================================
+# Benchmark lokal churn_scoring.py (tanpa Snowflake)
+# Seed = data_churn.xlsx / CSV snapshot TB_R_CHURN, di-scale up sintetis ke N customer.
+# Membandingkan:
+#   whole   : cara SP lama, seluruh snapshot jadi satu DataFrame lalu predict sekali
+#   batched : iter_batches -> rebatch -> score per batch (mode "batches" di SP)
+#   workers : batch dibagi ke N proses yang masing-masing load model sekali (simulasi
+#             vectorized UDF di thread warehouse)
+# Tanpa --model dipakai pipeline pengganti (ColumnTransformer notebook + DecisionTree).
+#
+# Contoh:
+#   python DATAMART/benchmark_scoring.py                                # 10k / 100k / 1M
+#   python DATAMART/benchmark_scoring.py --rows 2000000 --batch-rows 50000 --workers 1 4 8
+#   python DATAMART/benchmark_scoring.py --model /tmp/churn_status_best_model.sav --modes batched
+# ============================================
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import joblib
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SEED_FILES = [
+    os.path.join(HERE, "..", "data_churn.xlsx"),
+    os.path.join(HERE, "..", "data_googleplay_scraping.csv"),
+]
+NUMERIC_JITTER = ["MONTHLY_CHARGES", "TOTAL_CHARGES", "CLTV"]
+
+# -----------------------------
+# Seed & data sintetis
+# -----------------------------
+def load_seed(path: str = None) -> pd.DataFrame:
+    """
+    Baca seed customer. Header Excel ("Churn Label", "Birth Date", ...) dinormalisasi ke
+    nama kolom TB_R_CHURN (CHURN_LABEL, BIRTH_DATE, ...); "CustomerID" -> CUSTOMER_ID.
+    """
+    for p in ([path] if path else DEFAULT_SEED_FILES):
+        if p and os.path.exists(p):
+            df = pd.read_excel(p) if p.endswith(".xlsx") else pd.read_csv(p)
+            df.columns = [c.strip().upper().replace(" ", "_") for c in df.columns]
+            df = df.rename(columns={"CUSTOMERID": "CUSTOMER_ID"})
+            df["BIRTH_DATE"] = pd.to_datetime(df["BIRTH_DATE"], errors="coerce", utc=True).dt.tz_localize(None)
+            return df
+    raise FileNotFoundError("seed tidak ditemukan: " + ", ".join(DEFAULT_SEED_FILES))
+
+def synth_chunks(seed: pd.DataFrame, rows: int, chunk_rows: int, random_seed: int = 0):
+    """
+    Generator snapshot sintetis: baris seed di-sample ulang, charge di-jitter, CUSTOMER_ID baru.
+    Ukuran chunk sengaja tidak sama dengan batch scoring (meniru chunk hasil to_pandas_batches()).
+    """
+    rng = np.random.default_rng(random_seed)
+    done = 0
+    while done < rows:
+        n = min(chunk_rows, rows - done)
+        chunk = seed.iloc[rng.integers(0, len(seed), n)].reset_index(drop=True)
+        for c in NUMERIC_JITTER:
+            chunk[c] = chunk[c] * rng.uniform(0.9, 1.1, n)
+        chunk["CUSTOMER_ID"] = [f"SYN-{i:09d}" for i in range(done, done + n)]
+        done += n
+        yield chunk
+
+def build_standin_model(seed: pd.DataFrame, path: str):
+    """Pipeline pengganti dengan preprocessing yang sama seperti notebook CHURN ANALYSIS."""
+    from category_encoders import BinaryEncoder
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, RobustScaler
+    from sklearn.tree import DecisionTreeClassifier
+    import churn_scoring
+
+    transformer = ColumnTransformer([
+        ("onehot", OneHotEncoder(drop="first", handle_unknown="ignore"), [
+            "GENDER", "SENIOR_CITIZEN", "PARTNER", "DEPENDENTS", "COUNTRY_CODE", "PHONE_SERVICE",
+            "MULTIPLE_LINES", "INTERNET_SERVICE", "ONLINE_SECURITY", "ONLINE_BACKUP", "DEVICE_PROTECTION",
+            "TECH_SUPPORT", "STREAMING_TV", "STREAMING_MOVIES", "CONTRACT", "PAPERLESS_BILLING", "PAYMENT_METHOD",
+        ]),
+        ("binary", BinaryEncoder(), ["STATE", "CITY", "QUARTER"]),
+        ("robust", RobustScaler(), [
+            "LATITUDE", "LONGITUDE", "TENURE_MONTHS", "MONTHLY_CHARGES", "TOTAL_CHARGES", "CLTV",
+            "BIRTH_YEAR", "BIRTH_MONTH", "BIRTH_DAY",
+        ]),
+    ], remainder="passthrough")
+    model = Pipeline([
+        ("preprocessing", transformer),
+        ("modeling", DecisionTreeClassifier(max_depth=5, random_state=0)),
+    ])
+    X = churn_scoring.prepare_features(seed[["CUSTOMER_ID"] + churn_scoring.INPUT_NAMES])
+    model.fit(X, np.where(seed["CHURN_LABEL"] == "Yes", 1, 0))
+    joblib.dump(model, path)
+    return path
+
+# -----------------------------
+# Skenario
+# -----------------------------
+def _worker_init(model_path: str):
+    sys.path.insert(0, HERE)
+    import churn_scoring
+    churn_scoring.load_model(path=model_path)
+
+def _worker_score(model_path: str, batch: pd.DataFrame) -> int:
+    import churn_scoring
+    return len(churn_scoring.score_frame(churn_scoring.load_model(path=model_path), batch))
+
+def run_scenario(scenario: dict):
+    """Satu skenario per child process -> peak RSS tidak tercampur skenario lain."""
+    sys.path.insert(0, HERE)
+    import churn_scoring
+
+    seed = load_seed(scenario["seed_file"])[["CUSTOMER_ID"] + churn_scoring.INPUT_NAMES]
+    chunks = synth_chunks(seed, scenario["rows"], scenario["chunk_rows"], scenario["seed"])
+    mode, batch_rows = scenario["mode"], scenario["batch_rows"]
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    model = churn_scoring.load_model(path=scenario["model_path"])
+    load_s = time.perf_counter() - started
+    scored, batches = 0, 0
+    if mode == "whole":
+        df = pd.concat(list(chunks), ignore_index=True)
+        scored, batches = len(churn_scoring.score_frame(model, df)), 1
+    elif mode == "batched":
+        for batch in churn_scoring.rebatch(chunks, batch_rows):
+            scored += len(churn_scoring.score_frame(model, batch))
+            batches += 1
+    else:
+        # maksimal 2 batch in-flight per worker supaya memori producer tetap terbatas
+        with ProcessPoolExecutor(max_workers=scenario["workers"], initializer=_worker_init,
+                                 initargs=(scenario["model_path"],)) as pool:
+            pending = set()
+            for batch in churn_scoring.rebatch(chunks, batch_rows):
+                if len(pending) >= 2 * scenario["workers"]:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    scored += sum(f.result() for f in finished)
+                pending.add(pool.submit(_worker_score, scenario["model_path"], batch))
+                batches += 1
+            scored += sum(f.result() for f in pending)
+    elapsed = time.perf_counter() - started
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if mode == "workers" else 0
+
+    return {
+        "mode": mode,
+        "rows": scenario["rows"],
+        "batch_rows": batch_rows if mode != "whole" else None,
+        "workers": scenario["workers"] if mode == "workers" else 1,
+        "batches": batches,
+        "scored": scored,
+        "elapsed_s": round(elapsed, 3),
+        "model_load_s": round(load_s, 3),
+        "rows_per_sec": round(scored / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_mb": round(rss_peak / 1024, 1),  # Linux: ru_maxrss dalam KB
+        "rss_growth_mb": round((rss_peak - rss_before) / 1024, 1),
+        "worker_peak_rss_mb": round(child_peak / 1024, 1) if child_peak else None,
+    }
+
+def print_report(results: list):
+    header = f"{'mode':>8} {'rows':>9} {'batch':>7} {'wrk':>3} {'batches':>7} {'sec':>8} {'rows/s':>10} {'rss MB':>7} {'+rss MB':>7} {'wrk MB':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:>8} {r['rows']:>9} {r['batch_rows']!s:>7} {r['workers']:>3} {r['batches']:>7} "
+              f"{r['elapsed_s']:>8} {r['rows_per_sec']:>10} {r['peak_rss_mb']:>7} {r['rss_growth_mb']:>7} "
+              f"{r['worker_peak_rss_mb']!s:>7}")
+    print("rss MB = peak proses utama; wrk MB = peak worker terbesar (mode workers).")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark lokal scoring churn (tanpa Snowflake).")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="jumlah customer sintetis, satu set skenario per nilai")
+    parser.add_argument("--modes", nargs="+", default=["whole", "batched", "workers"],
+                        choices=["whole", "batched", "workers"])
+    parser.add_argument("--batch-rows", type=int, default=10_000)
+    parser.add_argument("--chunk-rows", type=int, default=7_919, help="ukuran chunk 'to_pandas_batches' sintetis")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--seed-file", default=None, help="xlsx/csv seed (default data_churn.xlsx lalu CSV)")
+    parser.add_argument("--model", default=None, help="file .sav hasil notebook; default pipeline pengganti")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_out", help="tulis hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, HERE)
+    model_path = args.model
+    if not model_path:
+        model_path = os.path.join(tempfile.gettempdir(), "bench_churn_standin_model.sav")
+        build_standin_model(load_seed(args.seed_file), model_path)
+
+    results = []
+    for n in args.rows:
+        for mode in args.modes:
+            for workers in (args.workers if mode == "workers" else [1]):
+                scenario = {
+                    "mode": mode,
+                    "rows": n,
+                    "batch_rows": args.batch_rows,
+                    "chunk_rows": args.chunk_rows,
+                    "workers": workers,
+                    "seed_file": args.seed_file,
+                    "model_path": model_path,
+                    "seed": args.seed,
+                }
+                # proses baru per skenario -> peak RSS tidak tercampur skenario sebelumnya
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    results.append(pool.submit(run_scenario, scenario).result())
+
+    print_report(results)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# churn_scoring.py
+# ============================================
+# Scoring status churn (Yes/No) untuk SP_CUSTOMER_STATUS_PREDICTION
+# Pipeline joblib dari @TELCO.RAW.ML_MODEL di-load sekali per proses Python lalu di-cache.
+# Snapshot TB_R_CHURN terakhir tidak lagi di-.to_pandas() sekaligus, tapi di-score per batch
+# ukuran tetap supaya memori tetap datar berapa pun jumlah customer:
+# - mode "udf"     : vectorized UDF, batch di-score paralel di semua thread/node warehouse (default)
+# - mode "batches" : loop to_pandas_batches() di proses SP (tanpa UDF), hasil per batch di-append
+# Hasil hari ini diganti (DELETE + INSERT dalam satu transaksi), jadi rerun di hari yang sama
+# tidak menggandakan baris PREDICTION_DATE = CURRENT_DATE().
+# ============================================
+import os
+import sys
+import uuid
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Konfigurasi
+# -----------------------------
+MODEL_STAGE = "@TELCO.RAW.ML_MODEL"
+MODEL_FILE = "churn_status_best_model.sav"
+CODE_STAGE = "@TELCO.APPS.ST_CODE"
+LOCAL_DIR = "/tmp"
+
+SOURCE_TABLE = "TELCO.RAW.TB_R_CHURN"
+TARGET_TABLE = "TELCO.DATAMART.TB_R_CHURN_PREDICTION"
+
+DEFAULT_MODE = "udf"
+DEFAULT_BATCH_ROWS = 10000
+
+MODEL_PACKAGES = ["pandas", "scikit-learn", "joblib", "imbalanced-learn", "category_encoders"]
+
+# Kolom input model (sebelum feature engineering) + tipe untuk register vectorized UDF
+INPUT_COLUMNS = [
+    ("GENDER", "str"), ("BIRTH_DATE", "date"), ("SENIOR_CITIZEN", "str"), ("PARTNER", "str"),
+    ("DEPENDENTS", "str"), ("COUNTRY_CODE", "str"), ("STATE", "str"), ("CITY", "str"),
+    ("LATITUDE", "float"), ("LONGITUDE", "float"), ("PHONE_SERVICE", "str"), ("MULTIPLE_LINES", "str"),
+    ("INTERNET_SERVICE", "str"), ("ONLINE_SECURITY", "str"), ("ONLINE_BACKUP", "str"),
+    ("DEVICE_PROTECTION", "str"), ("TECH_SUPPORT", "str"), ("STREAMING_TV", "str"),
+    ("STREAMING_MOVIES", "str"), ("CONTRACT", "str"), ("PAPERLESS_BILLING", "str"),
+    ("PAYMENT_METHOD", "str"), ("QUARTER", "str"), ("TENURE_MONTHS", "float"),
+    ("MONTHLY_CHARGES", "float"), ("TOTAL_CHARGES", "float"), ("CLTV", "float"),
+]
+INPUT_NAMES = [c for c, _ in INPUT_COLUMNS]
+# Kolom yang di-drop sebelum predict (sama dengan notebook CHURN ANALYSIS)
+DROP_COLUMNS = ["CUSTOMER_ID", "DATE_JOINED", "BIRTH_DATE", "ZIP_CODE", "CHURN_REASON"]
+
+def snapshot_sql(extra_columns=()) -> str:
+    """Snapshot sync Fivetran terakhir; hanya kolom yang dipakai model (+ extra_columns) yang ditarik."""
+    columns = ["a.CUSTOMER_ID"] + ["a." + c for c in extra_columns] + [
+        "TO_DATE(a.BIRTH_DATE) AS BIRTH_DATE" if c == "BIRTH_DATE" else "a." + c for c in INPUT_NAMES
+    ]
+    return f"""
+      WITH MAX_DATE AS (
+        SELECT MAX(TO_DATE(_FIVETRAN_SYNCED)) AS MAX_DATE
+        FROM {SOURCE_TABLE}
+      )
+      SELECT
+        {", ".join(columns)}
+      FROM {SOURCE_TABLE} a
+      JOIN MAX_DATE b
+        ON TO_DATE(a._FIVETRAN_SYNCED) = b.MAX_DATE
+    """
+
+SNAPSHOT_SQL = snapshot_sql()
+
+# -----------------------------
+# Model (cache per proses)
+# -----------------------------
+_MODELS = {}
+
+def model_path() -> str:
+    """Di vectorized UDF file model ikut IMPORTS; di SP / lokal pakai salinan di LOCAL_DIR."""
+    import_dir = sys._xoptions.get("snowflake_import_directory")
+    if import_dir and os.path.exists(os.path.join(import_dir, MODEL_FILE)):
+        return os.path.join(import_dir, MODEL_FILE)
+    return os.path.join(LOCAL_DIR, MODEL_FILE)
+
+def load_model(session=None, path: str = None):
+    """
+    Load pipeline sekali per proses. Di SP file di-download dari stage pada load pertama,
+    pemanggilan berikutnya (batch lain / UDF batch lain di proses yang sama) pakai cache.
+    """
+    path = path or model_path()
+    if path not in _MODELS:
+        if session is not None and path == os.path.join(LOCAL_DIR, MODEL_FILE):
+            session.file.get(f"{MODEL_STAGE}/{MODEL_FILE}", LOCAL_DIR)
+        _MODELS[path] = joblib.load(path)
+    return _MODELS[path]
+
+# -----------------------------
+# Feature & scoring (vectorized per batch)
+# -----------------------------
+def prepare_features(df: pd.DataFrame, feature_names=None) -> pd.DataFrame:
+    """Feature engineering notebook: BIRTH_DATE -> BIRTH_YEAR/MONTH/DAY, drop kolom non-fitur."""
+    birth = pd.to_datetime(df["BIRTH_DATE"], errors="coerce")
+    X = df.drop(columns=[c for c in DROP_COLUMNS if c in df.columns])
+    X["BIRTH_YEAR"] = birth.dt.year
+    X["BIRTH_MONTH"] = birth.dt.month
+    X["BIRTH_DAY"] = birth.dt.day
+    if feature_names is not None:
+        # ColumnTransformer menolak urutan kolom yang beda dari saat fit
+        X = X[list(feature_names)]
+    return X
+
+def score_frame(model, df: pd.DataFrame) -> np.ndarray:
+    """Predict satu batch; 1 -> 'Yes', 0 -> 'No'."""
+    pred = model.predict(prepare_features(df, getattr(model, "feature_names_in_", None)))
+    return np.where(pred == 1, "Yes", "No")
+
+def rebatch(frames, batch_rows: int):
+    """
+    Potong/gabung DataFrame dari to_pandas_batches() (ukurannya ikut chunk hasil query)
+    jadi batch berukuran tetap batch_rows. Yang ditahan di memori maksimal satu chunk + satu batch.
+    """
+    buf, n = [], 0
+    for frame in frames:
+        while len(frame):
+            part = frame.iloc[:batch_rows - n]
+            frame = frame.iloc[len(part):]
+            buf.append(part)
+            n += len(part)
+            if n == batch_rows:
+                yield pd.concat(buf, ignore_index=True)
+                buf, n = [], 0
+    if buf:
+        yield pd.concat(buf, ignore_index=True)
+
+def _score_udf(df: pd.DataFrame) -> pd.Series:
+    """Handler vectorized UDF: satu batch baris dari warehouse, kolom posisional sesuai INPUT_COLUMNS."""
+    df.columns = INPUT_NAMES
+    return pd.Series(score_frame(load_model(), df))
+
+# -----------------------------
+# Runner
+# -----------------------------
+def ensure_table_exists(session):
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {TARGET_TABLE} (
+        CUSTOMER_ID        VARCHAR,
+        PREDICTION_RESULTS VARCHAR,
+        PREDICTION_DATE    DATE,
+        SCORED_AT          TIMESTAMP_NTZ
+      )
+    """).collect()
+    # SCORED_AT dipakai SP_CHURN_PREDICTION untuk memilih prediksi terbaru per (customer, tanggal)
+    session.sql(f"ALTER TABLE {TARGET_TABLE} ADD COLUMN IF NOT EXISTS SCORED_AT TIMESTAMP_NTZ").collect()
+
+def register_score_udf(session, batch_rows: int):
+    """Temporary vectorized UDF; model + modul ini ikut IMPORTS supaya load_model() jalan di node warehouse."""
+    from snowflake.snowpark.types import (
+        DateType, FloatType, PandasDataFrameType, PandasSeriesType, StringType,
+    )
+    types = {"str": StringType(), "float": FloatType(), "date": DateType()}
+    return session.udf.register(
+        _score_udf,
+        name=f"TMP_SCORE_CHURN_{uuid.uuid4().hex[:12]}",
+        input_types=[PandasDataFrameType([types[t] for _, t in INPUT_COLUMNS])],
+        return_type=PandasSeriesType(StringType()),
+        imports=[f"{MODEL_STAGE}/{MODEL_FILE}", f"{CODE_STAGE}/churn_scoring.py"],
+        packages=list(MODEL_PACKAGES),
+        max_batch_size=batch_rows,
+        replace=True,
+    )
+
+def replace_today(session, select_sql: str) -> int:
+    """
+    Ganti prediksi PREDICTION_DATE = CURRENT_DATE() dengan hasil select_sql
+    (CUSTOMER_ID, PREDICTION_RESULTS, PREDICTION_DATE, SCORED_AT) secara atomik.
+    DDL (temp table / UDF) harus dibuat sebelum ini: DDL di Snowflake meng-commit transaksi yang terbuka.
+    """
+    session.sql("BEGIN").collect()
+    try:
+        session.sql(f"DELETE FROM {TARGET_TABLE} WHERE PREDICTION_DATE = CURRENT_DATE()").collect()
+        rows = session.sql(f"""
+          INSERT INTO {TARGET_TABLE} (CUSTOMER_ID, PREDICTION_RESULTS, PREDICTION_DATE, SCORED_AT)
+          {select_sql}
+        """).collect()[0][0]
+        session.sql("COMMIT").collect()
+    except Exception:
+        session.sql("ROLLBACK").collect()
+        raise
+    return rows
+
+def score_with_udf(session, batch_rows: int) -> int:
+    """Satu INSERT ... SELECT; warehouse membagi snapshot ke batch <= batch_rows di semua thread."""
+    fn = register_score_udf(session, batch_rows)
+    return replace_today(session, f"""
+      SELECT
+        s.CUSTOMER_ID,
+        {fn.name}({", ".join("s." + c for c in INPUT_NAMES)}),
+        CURRENT_DATE(),
+        CURRENT_TIMESTAMP()
+      FROM ({SNAPSHOT_SQL}) s
+    """)
+
+def score_in_batches(session, batch_rows: int) -> int:
+    """
+    Stream snapshot lewat to_pandas_batches(), score per batch dan tulis ke temp table;
+    hasil ke target cukup satu DELETE + INSERT di akhir, jadi run yang gagal di tengah tidak meninggalkan sebagian hasil.
+    """
+    model = load_model(session)
+    # uppercase: nama tanpa quote disimpan uppercase, sedangkan write_pandas meng-quote identifier
+    tmp = f"TMP_CHURN_SCORE_{uuid.uuid4().hex[:12].upper()}"
+    session.sql(f"CREATE TEMPORARY TABLE {tmp} (CUSTOMER_ID VARCHAR, PREDICTION_RESULTS VARCHAR)").collect()
+    try:
+        for batch in rebatch(session.sql(SNAPSHOT_SQL).to_pandas_batches(), batch_rows):
+            out = pd.DataFrame({
+                "CUSTOMER_ID": batch["CUSTOMER_ID"].to_numpy(),
+                "PREDICTION_RESULTS": score_frame(model, batch),
+            })
+            session.write_pandas(out, tmp, auto_create_table=False)
+        return replace_today(session, f"SELECT CUSTOMER_ID, PREDICTION_RESULTS, CURRENT_DATE(), CURRENT_TIMESTAMP() FROM {tmp}")
+    finally:
+        session.sql(f"DROP TABLE IF EXISTS {tmp}").collect()
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def main(session, mode: str = DEFAULT_MODE, batch_rows: int = DEFAULT_BATCH_ROWS):
+    mode = (mode or DEFAULT_MODE).strip().lower()
+    batch_rows = int(batch_rows or DEFAULT_BATCH_ROWS)
+    ensure_table_exists(session)
+    if mode == "batches":
+        rows = score_in_batches(session, batch_rows)
+    elif mode == "udf":
+        rows = score_with_udf(session, batch_rows)
+    else:
+        raise ValueError(f"Unknown mode: {mode} (udf | batches)")
+    return f"PREDICTION_DONE mode={mode} rows={rows} batch_rows={batch_rows}"
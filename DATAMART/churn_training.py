@@ -0,0 +1,283 @@
+# churn_training.py
+# ============================================
+# Training ulang model status churn (kode training notebook CHURN ANALYSIS jadi modul)
+# - search "halving": HalvingGridSearchCV atas hyperparam_tree notebook, n_jobs=-1 (proses loky)
+# - preprocessing (ColumnTransformer one-hot + BinaryEncoder + scaler) di-cache per fold & pilihan
+#   scaler di memori worker, jadi kandidat yang cuma beda resampler / param tree tidak fit ulang
+# - search "grid": baseline notebook (GridSearchCV penuh, n_jobs=1, resampling sebelum preprocessing)
+# Pipeline pemenang di-upload ke @TELCO.RAW.ML_MODEL (dipakai churn_scoring.py).
+#
+# Lokal (tanpa Snowflake), bandingkan dengan baseline:
+#   python DATAMART/churn_training.py --data data_churn.xlsx --strategies halving grid
+# ============================================
+import argparse
+import json
+import os
+import resource
+import time
+import warnings
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+from category_encoders import BinaryEncoder
+from imblearn.over_sampling import SMOTE, RandomOverSampler
+from imblearn.pipeline import Pipeline
+from imblearn.under_sampling import NearMiss, RandomUnderSampler
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.compose import ColumnTransformer
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.metrics import fbeta_score, make_scorer
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, StratifiedKFold, train_test_split
+from sklearn.preprocessing import MinMaxScaler, OneHotEncoder, RobustScaler, StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+import churn_scoring
+
+# -----------------------------
+# Konfigurasi
+# -----------------------------
+ONEHOT_COLUMNS = [
+    "GENDER", "SENIOR_CITIZEN", "PARTNER", "DEPENDENTS", "COUNTRY_CODE", "PHONE_SERVICE", "MULTIPLE_LINES",
+    "INTERNET_SERVICE", "ONLINE_SECURITY", "ONLINE_BACKUP", "DEVICE_PROTECTION", "TECH_SUPPORT",
+    "STREAMING_TV", "STREAMING_MOVIES", "CONTRACT", "PAPERLESS_BILLING", "PAYMENT_METHOD",
+]
+BINARY_COLUMNS = ["STATE", "CITY", "QUARTER"]
+ROBUST_COLUMNS = [
+    "LATITUDE", "LONGITUDE", "TENURE_MONTHS", "MONTHLY_CHARGES", "TOTAL_CHARGES", "CLTV",
+    "BIRTH_YEAR", "BIRTH_MONTH", "BIRTH_DAY",
+]
+
+DEFAULT_STRATEGY = "halving"
+DEFAULT_FACTOR = 3
+CV_FOLDS = 5
+TEST_SIZE = 0.3
+RANDOM_STATE = 0
+PREP_CACHE_ENTRIES = 64   # per proses worker; cukup untuk 5 fold x 3 scaler x (fit + 2 transform) satu iterasi halving
+
+# Snapshot sync terakhir + label; kolom sama dengan yang di-score churn_scoring.py
+TRAINING_SQL = churn_scoring.snapshot_sql(["CHURN_LABEL"])
+
+F2 = make_scorer(fbeta_score, beta=2)
+
+# -----------------------------
+# Pipeline & search space
+# -----------------------------
+def build_transformer():
+    return ColumnTransformer([
+        ("onehot", OneHotEncoder(drop="first", handle_unknown="ignore"), ONEHOT_COLUMNS),
+        ("binary", BinaryEncoder(), BINARY_COLUMNS),
+        ("robust", RobustScaler(), ROBUST_COLUMNS),
+    ], remainder="passthrough")
+
+_PREP_CACHE = OrderedDict()
+
+def _cache_get(key, build):
+    if key in _PREP_CACHE:
+        _PREP_CACHE.move_to_end(key)
+        return _PREP_CACHE[key]
+    value = _PREP_CACHE[key] = build()
+    if len(_PREP_CACHE) > PREP_CACHE_ENTRIES:
+        _PREP_CACHE.popitem(last=False)
+    return value
+
+def _frame_key(X: pd.DataFrame):
+    """Fold CV / subsample halving = subset baris dataset yang sama -> cukup hash index-nya (int, murah)."""
+    return len(X), joblib.hash(X.index.to_numpy())
+
+class CachedTransformer(TransformerMixin, BaseEstimator):
+    """
+    Bungkus ColumnTransformer: hasil fit & transform di-cache di memori proses dengan key
+    (parameter transformer, index baris). Kandidat di fold yang sama dengan pilihan scaler yang sama
+    memakai hasil fit yang sama. Sengaja tidak pakai joblib.Memory: hash DataFrame object-dtype
+    per fit lebih mahal dari fit ColumnTransformer-nya sendiri.
+    """
+    def __init__(self, transformer=None):
+        self.transformer = transformer
+
+    def fit(self, X, y=None):
+        self.key_ = (joblib.hash(self.transformer), _frame_key(X))
+        self.transformer_ = _cache_get(("fit",) + self.key_, lambda: clone(self.transformer).fit(X, y))
+        return self
+
+    def transform(self, X):
+        return _cache_get(("transform", self.key_, _frame_key(X)), lambda: self.transformer_.transform(X))
+
+    def fit_transform(self, X, y=None):
+        return self.fit(X, y).transform(X)
+
+def build_pipeline(strategy: str = DEFAULT_STRATEGY):
+    """
+    "halving": prep (cached) -> resampling -> tree. Prep jadi step pertama supaya input-nya cuma
+    bergantung ke fold (bukan ke resampler) -> hasil fit bisa dipakai ulang lintas kandidat;
+    SMOTE/NearMiss juga butuh fitur numerik, di urutan notebook kandidat itu selalu gagal.
+    "grid": urutan & setting notebook apa adanya (baseline).
+    """
+    tree = DecisionTreeClassifier(max_depth=5, random_state=RANDOM_STATE)
+    resampling = RandomOverSampler(random_state=RANDOM_STATE)
+    if strategy == "grid":
+        return Pipeline([("resampling", resampling), ("prep", build_transformer()), ("modeling", tree)])
+    return Pipeline([("prep", CachedTransformer(build_transformer())), ("resampling", resampling), ("modeling", tree)])
+
+def param_grid(strategy: str = DEFAULT_STRATEGY):
+    """hyperparam_tree notebook: 5 resampler x 3 scaler x 4 x 4 x 4 = 960 kandidat."""
+    return {
+        "resampling": [
+            RandomOverSampler(random_state=RANDOM_STATE), RandomUnderSampler(random_state=RANDOM_STATE),
+            SMOTE(random_state=RANDOM_STATE), NearMiss(), None,
+        ],
+        "prep__robust" if strategy == "grid" else "prep__transformer__robust": [
+            RobustScaler(), MinMaxScaler(), StandardScaler(),
+        ],
+        "modeling__max_depth": [3, 5, 7, 10],
+        "modeling__min_samples_split": [5, 10, 20, 30],
+        "modeling__min_samples_leaf": [1, 2, 4, 6],
+    }
+
+def build_search(strategy: str = DEFAULT_STRATEGY, n_jobs: int = -1, factor: int = DEFAULT_FACTOR):
+    if strategy == "grid":
+        return GridSearchCV(build_pipeline("grid"), param_grid("grid"), cv=CV_FOLDS, scoring=F2, n_jobs=1)
+    if strategy != "halving":
+        raise ValueError(f"Unknown strategy: {strategy} (halving | grid)")
+    # Fold tetap (shuffle + random_state) supaya key cache prep per fold stabil antar kandidat
+    return HalvingGridSearchCV(
+        build_pipeline("halving"), param_grid("halving"),
+        cv=StratifiedKFold(CV_FOLDS, shuffle=True, random_state=RANDOM_STATE),
+        scoring=F2, factor=factor, n_jobs=n_jobs, random_state=RANDOM_STATE,
+    )
+
+# -----------------------------
+# Data
+# -----------------------------
+def load_training_frame(session=None, path: str = None) -> pd.DataFrame:
+    """Snapshot TB_R_CHURN terakhir (session) atau file lokal xlsx/csv dengan kolom yang sama."""
+    if session is not None:
+        return session.sql(TRAINING_SQL).to_pandas()
+    df = pd.read_excel(path) if path.endswith(".xlsx") else pd.read_csv(path)
+    # header Excel ("Churn Label", "CustomerID", ...) -> nama kolom TB_R_CHURN
+    df.columns = [c.strip().upper().replace(" ", "_") for c in df.columns]
+    df = df.rename(columns={"CUSTOMERID": "CUSTOMER_ID"})
+    df["BIRTH_DATE"] = pd.to_datetime(df["BIRTH_DATE"], errors="coerce", utc=True).dt.tz_localize(None)
+    return df[["CUSTOMER_ID", "CHURN_LABEL"] + churn_scoring.INPUT_NAMES]
+
+def split_xy(df: pd.DataFrame):
+    X = churn_scoring.prepare_features(df.drop(columns=["CHURN_LABEL"]))
+    y = np.where(df["CHURN_LABEL"] == "Yes", 1, 0)
+    return X, y
+
+# -----------------------------
+# Training
+# -----------------------------
+def peak_rss_mb() -> float:
+    """Peak RSS proses ini vs worker loky (yang sudah di-reap); Linux: ru_maxrss dalam KB."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+def _shutdown_workers():
+    """Matikan pool loky yang di-reuse supaya RSS worker ikut tercatat di RUSAGE_CHILDREN."""
+    from joblib.externals.loky import get_reusable_executor
+    get_reusable_executor().shutdown(wait=True)
+
+def train(df: pd.DataFrame, strategy: str = DEFAULT_STRATEGY, n_jobs: int = -1, factor: int = DEFAULT_FACTOR):
+    """
+    Search di train split, evaluasi F2 di test split, lalu fit ulang pemenang di seluruh data
+    (sama dengan alur notebook). Return (model, stats).
+    """
+    X, y = split_xy(df)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, stratify=y, random_state=RANDOM_STATE, test_size=TEST_SIZE
+    )
+    started = time.perf_counter()
+    with warnings.catch_warnings():
+        # kandidat gagal (mis. NearMiss di subsample kecil) di-score NaN, bukan error
+        warnings.simplefilter("ignore")
+        search = build_search(strategy, n_jobs, factor)
+        search.fit(X_train, y_train)
+        search_s = time.perf_counter() - started
+        best = search.best_estimator_
+        test_f2 = fbeta_score(y_test, best.predict(X_test), beta=2)
+        best.fit(X, y)
+    if n_jobs != 1:
+        _shutdown_workers()
+    if strategy == "halving":
+        # model yang disimpan = ColumnTransformer biasa, supaya churn_scoring (UDF) tidak butuh modul ini
+        best.steps[0] = ("prep", best.named_steps["prep"].transformer_)
+        _PREP_CACHE.clear()
+
+    stats = {
+        "strategy": strategy,
+        "rows": len(df),
+        "candidates": len(search.cv_results_["params"]),
+        "fits": int(np.sum(search.n_candidates_)) * CV_FOLDS if strategy == "halving"
+                else len(search.cv_results_["params"]) * CV_FOLDS,
+        "cv_f2": round(float(search.best_score_), 4),
+        "test_f2": round(float(test_f2), 4),
+        "search_s": round(search_s, 2),
+        "wall_s": round(time.perf_counter() - started, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "best_params": {k: str(v) for k, v in search.best_params_.items()},
+    }
+    return best, stats
+
+def save_model(model, session=None, path: str = None) -> str:
+    """Dump pipeline ke file lokal; kalau ada session, upload ke @TELCO.RAW.ML_MODEL (overwrite)."""
+    path = path or os.path.join(churn_scoring.LOCAL_DIR, churn_scoring.MODEL_FILE)
+    joblib.dump(model, path)
+    if session is not None:
+        session.file.put(path, churn_scoring.MODEL_STAGE, auto_compress=False, overwrite=True)
+    return path
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def main(session, strategy: str = DEFAULT_STRATEGY, factor: int = DEFAULT_FACTOR):
+    strategy = (strategy or DEFAULT_STRATEGY).strip().lower()
+    model, stats = train(load_training_frame(session), strategy, factor=int(factor or DEFAULT_FACTOR))
+    save_model(model, session)
+    return "TRAINING_DONE " + " ".join(f"{k}={v}" for k, v in stats.items() if k != "best_params")
+
+def _run_local(args):
+    """Satu strategi per child process -> peak RSS tidak tercampur strategi lain."""
+    data, strategy, n_jobs, factor, output = args
+    model, stats = train(load_training_frame(path=data), strategy, n_jobs, factor)
+    if output:
+        save_model(model, path=output.replace(".sav", f"_{strategy}.sav"))
+    return stats
+
+def cli(argv=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Training lokal model status churn + perbandingan baseline.")
+    parser.add_argument("--data", default=os.path.join(here, "..", "data_churn.xlsx"), help="xlsx/csv snapshot TB_R_CHURN")
+    parser.add_argument("--strategies", nargs="+", default=["halving", "grid"], choices=["halving", "grid"])
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--factor", type=int, default=DEFAULT_FACTOR)
+    parser.add_argument("--output", default=None, help="simpan pipeline pemenang, mis. /tmp/churn_status_best_model.sav")
+    parser.add_argument("--json", dest="json_out", help="tulis hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for strategy in args.strategies:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(_run_local, (args.data, strategy, args.n_jobs, args.factor, args.output)).result())
+
+    header = f"{'strategy':>8} {'rows':>6} {'cand':>5} {'fits':>6} {'cv F2':>6} {'test F2':>7} {'search s':>9} {'wall s':>8} {'rss MB':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['strategy']:>8} {r['rows']:>6} {r['candidates']:>5} {r['fits']:>6} {r['cv_f2']:>6} {r['test_f2']:>7} "
+              f"{r['search_s']:>9} {r['wall_s']:>8} {r['peak_rss_mb']:>7}")
+    for r in results:
+        print(f"{r['strategy']}: {r['best_params']}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    # lewat import (bukan __main__) supaya CachedTransformer & cache-nya satu modul di worker loky
+    import churn_training
+    churn_training.cli()
@@ -0,0 +1,476 @@
+# customer_segmentation.py
+# ============================================
+# Segmentasi customer non-churn (notebook CUSTOMER SEGMENTATION jadi engine inkremental)
+# Artefak fit (ColumnTransformer, IncrementalPCA 11 komponen, MiniBatchKMeans 4 cluster + metrik baseline)
+# disimpan sebagai satu bundle joblib di @TELCO.RAW.ML_MODEL.
+# - mode "assign" : hanya customer baru / fitur berubah (FEATURE_HASH beda dari state) yang di-assign
+#                   ke centroid terdekat, di-stream per batch
+# - mode "refit"  : MiniBatchKMeans.partial_fit lanjut dari centroid lama atas seluruh populasi per chunk;
+#                   kalau metrik di sample masih drift -> full refit
+# - mode "full"   : fit ulang dari nol (transformer di sample, IncrementalPCA + MiniBatchKMeans per chunk)
+# - mode "auto"   : assign, lalu metrik drift (inertia per baris, silhouette sample) yang memutuskan refit (default)
+# ============================================
+import copy
+import os
+import time
+import uuid
+
+import joblib
+import numpy as np
+import pandas as pd
+from category_encoders import BinaryEncoder
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.compose import ColumnTransformer
+from sklearn.decomposition import IncrementalPCA
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import OneHotEncoder, RobustScaler
+
+import churn_scoring
+
+# -----------------------------
+# Konfigurasi
+# -----------------------------
+MODEL_STAGE = churn_scoring.MODEL_STAGE
+MODEL_FILE = "customer_segmentation.sav"
+LOCAL_DIR = churn_scoring.LOCAL_DIR
+
+PREDICTION_TABLE = "TELCO.DATAMART.TB_R_CHURN_PREDICTION"
+CLUSTER_TABLE = "TELCO.DATAMART.TB_F_CUSTOMER_CLUSTER"
+STATE_TABLE = "TELCO.DATAMART.TB_C_CUSTOMER_SEGMENT_STATE"
+DRIFT_TABLE = "TELCO.DATAMART.TB_C_CUSTOMER_SEGMENT_DRIFT"
+
+N_COMPONENTS = 11
+N_CLUSTERS = 4
+RANDOM_STATE = 0
+
+DEFAULT_MODE = "auto"
+DEFAULT_BATCH_ROWS = 10000
+FIT_SAMPLE_ROWS = 50000      # transformer + init centroid di-fit di sample ini (memori tetap)
+SILHOUETTE_SAMPLE = 2000     # silhouette O(n^2) -> selalu di reservoir sample
+DRIFT_MIN_ROWS = 500         # delta harian lebih kecil dari ini tidak dipakai memutuskan refit
+INERTIA_TOLERANCE = 0.25     # median jarak^2 ke centroid boleh naik 25% dari baseline
+SILHOUETTE_TOLERANCE = 0.05  # silhouette boleh turun 0.05 dari baseline
+
+ONEHOT_COLUMNS = [
+    "GENDER", "SENIOR_CITIZEN", "PARTNER", "DEPENDENTS", "PHONE_SERVICE", "MULTIPLE_LINES",
+    "INTERNET_SERVICE", "ONLINE_SECURITY", "ONLINE_BACKUP", "DEVICE_PROTECTION", "TECH_SUPPORT",
+    "STREAMING_TV", "STREAMING_MOVIES", "CONTRACT_TYPE", "PAPERLESS_BILLING", "PAYMENT_METHOD",
+]
+BINARY_COLUMNS = ["STATE", "CITY", "QUARTER_JOINED"]
+ROBUST_COLUMNS = ["LATITUDE", "LONGITUDE", "TENURE_MONTHS", "MONTHLY_CHARGES", "TOTAL_CHARGES", "CLTV"]
+FEATURE_COLUMNS = ONEHOT_COLUMNS + BINARY_COLUMNS + ROBUST_COLUMNS
+
+# Populasi = customer dengan prediksi 'No' di PREDICTION_DATE terakhir
+LATEST_SQL = f"""
+  SELECT CUSTOMER_ID, MAX(PREDICTION_DATE) AS PREDICTION_DATE
+  FROM {PREDICTION_TABLE}
+  WHERE PREDICTION_DATE = (SELECT MAX(PREDICTION_DATE) FROM {PREDICTION_TABLE})
+    AND PREDICTION_RESULTS = 'No'
+  GROUP BY CUSTOMER_ID
+"""
+
+# Fitur notebook + FEATURE_HASH. TENURE/TOTAL_CHARGES/CLTV relatif ke PREDICTION_DATE,
+# jadi hash customer ikut berubah saat tenure bertambah bulan -> di-assign ulang bulan itu.
+FEATURES_SQL = f"""
+  WITH LATEST AS ({LATEST_SQL}),
+  FEATURES AS (
+    SELECT
+      a.CUSTOMER_ID,
+      b.GENDER,
+      b.SENIOR_CITIZEN,
+      b.PARTNER,
+      b.DEPENDENTS,
+      b.STATE,
+      b.CITY,
+      b.LATITUDE,
+      b.LONGITUDE,
+      f.QUARTER AS QUARTER_JOINED,
+      c.PHONE_SERVICE,
+      c.MULTIPLE_LINES,
+      c.INTERNET_SERVICE,
+      c.ONLINE_SECURITY,
+      c.ONLINE_BACKUP,
+      c.DEVICE_PROTECTION,
+      c.TECH_SUPPORT,
+      c.STREAMING_TV,
+      c.STREAMING_MOVIES,
+      c.CONTRACT_TYPE,
+      c.PAPERLESS_BILLING,
+      c.PAYMENT_METHOD,
+      DATEDIFF('MONTH', b.DATE_JOINED, a.PREDICTION_DATE) AS TENURE_MONTHS,
+      d.MONTHLY_CHARGES,
+      DATEDIFF('MONTH', b.DATE_JOINED, a.PREDICTION_DATE) * d.MONTHLY_CHARGES AS TOTAL_CHARGES,
+      CASE
+        WHEN DATEDIFF('YEAR', b.DATE_JOINED, a.PREDICTION_DATE) <= 1 THEN
+          1 * (DATEDIFF('MONTH', b.DATE_JOINED, a.PREDICTION_DATE) * d.MONTHLY_CHARGES)
+        ELSE
+          DATEDIFF('YEAR', b.DATE_JOINED, a.PREDICTION_DATE) *
+          (DATEDIFF('MONTH', b.DATE_JOINED, a.PREDICTION_DATE) * d.MONTHLY_CHARGES)
+      END AS CLTV
+    FROM LATEST a
+    LEFT JOIN TELCO.DATAMART.TB_R_CUSTOMER b ON a.CUSTOMER_ID = b.CUSTOMER_ID
+    LEFT JOIN TELCO.DATAMART.TB_F_SERVICE_USAGE c ON a.CUSTOMER_ID = c.CUSTOMER_ID
+    LEFT JOIN TELCO.DATAMART.TB_F_REVENUE d ON a.CUSTOMER_ID = d.CUSTOMER_ID
+    LEFT JOIN TELCO.DATAMART.TB_R_DATE f ON d.DATE_JOINED = f.DATE_ID
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY a.CUSTOMER_ID ORDER BY d.MONTHLY_CHARGES DESC NULLS LAST) = 1
+  )
+  SELECT x.*, SHA2(TO_JSON(OBJECT_CONSTRUCT_KEEP_NULL(x.*)), 256) AS FEATURE_HASH
+  FROM FEATURES x
+"""
+
+def ensure_tables(session):
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {CLUSTER_TABLE} (
+        PREDICTION_DATE       DATE,
+        CUSTOMER_ID           VARCHAR,
+        CUSTOMER_SEGMENTATION VARCHAR
+      )
+    """).collect()
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+        CUSTOMER_ID      VARCHAR PRIMARY KEY RELY,
+        FEATURE_HASH     VARCHAR,
+        CUSTOMER_CLUSTER NUMBER,
+        MODEL_VERSION    VARCHAR,
+        ASSIGNED_AT      TIMESTAMP_NTZ
+      )
+    """).collect()
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {DRIFT_TABLE} (
+        RUN_AT               TIMESTAMP_NTZ,
+        MODE                 VARCHAR,
+        MODEL_VERSION        VARCHAR,
+        REFIT                VARCHAR,    -- NONE / INCREMENTAL / FULL
+        REFIT_REASON         VARCHAR,
+        ASSIGNED_ROWS        NUMBER,
+        REMOVED_ROWS         NUMBER,
+        INERTIA_PER_ROW      FLOAT,
+        INERTIA_MEDIAN       FLOAT,
+        SILHOUETTE           FLOAT,
+        BASELINE_INERTIA     FLOAT,    -- median di sample saat fit
+        BASELINE_SILHOUETTE  FLOAT
+      )
+    """).collect()
+
+# -----------------------------
+# Bundle model (cache per proses)
+# -----------------------------
+_BUNDLES = {}
+
+def load_bundle(session=None, path: str = None):
+    """Bundle dari stage (download sekali per proses). None kalau belum pernah di-fit."""
+    path = path or os.path.join(LOCAL_DIR, MODEL_FILE)
+    if path not in _BUNDLES:
+        if session is not None:
+            try:
+                session.file.get(f"{MODEL_STAGE}/{MODEL_FILE}", LOCAL_DIR)
+            except Exception:
+                return None
+        if not os.path.exists(path):
+            return None
+        _BUNDLES[path] = joblib.load(path)
+    return _BUNDLES[path]
+
+def save_bundle(bundle: dict, session=None, path: str = None) -> str:
+    path = path or os.path.join(LOCAL_DIR, MODEL_FILE)
+    joblib.dump(bundle, path)
+    if session is not None:
+        session.file.put(path, MODEL_STAGE, auto_compress=False, overwrite=True)
+    _BUNDLES[path] = bundle
+    return path
+
+# -----------------------------
+# Embedding, assignment & drift
+# -----------------------------
+def build_transformer():
+    # sparse_threshold=0 -> output dense, IncrementalPCA.partial_fit tidak menerima sparse
+    return ColumnTransformer([
+        ("onehot", OneHotEncoder(drop="first", handle_unknown="ignore"), ONEHOT_COLUMNS),
+        ("binary", BinaryEncoder(), BINARY_COLUMNS),
+        ("robust", RobustScaler(), ROBUST_COLUMNS),
+    ], remainder="drop", sparse_threshold=0)
+
+def embed(bundle: dict, df: pd.DataFrame) -> np.ndarray:
+    return bundle["pca"].transform(bundle["transformer"].transform(df[FEATURE_COLUMNS]))
+
+def assign(bundle: dict, Z: np.ndarray):
+    """Centroid terdekat di ruang PCA. Return (label, jarak kuadrat ke centroid-nya)."""
+    dist = bundle["kmeans"].transform(Z)
+    labels = dist.argmin(axis=1)
+    return labels, dist[np.arange(len(labels)), labels] ** 2
+
+class DriftMeter:
+    """
+    Akumulasi inertia per baris + reservoir sample (titik, label, jarak^2) untuk silhouette & median
+    inertia; memori tetap. Keputusan drift pakai median: CLTV punya outlier ekstrem yang membuat
+    rata-rata inertia naik-turun jauh antar sample walau populasinya sama.
+    """
+    def __init__(self, sample_size: int = SILHOUETTE_SAMPLE, seed: int = RANDOM_STATE):
+        self.rows, self.inertia = 0, 0.0
+        self.sample_size = sample_size
+        self.points, self.labels = None, None
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, Z: np.ndarray, labels: np.ndarray, dist2: np.ndarray):
+        if self.points is None:
+            self.points = np.empty((self.sample_size, Z.shape[1]))
+            self.labels = np.empty(self.sample_size, dtype=int)
+            self.dist2 = np.empty(self.sample_size)
+        # reservoir sampling (algorithm R), divektorkan per batch
+        seen = self.rows + np.arange(len(Z))
+        slots = np.where(seen < self.sample_size, seen, self._rng.integers(0, seen + 1))
+        keep = slots < self.sample_size
+        self.points[slots[keep]], self.labels[slots[keep]] = Z[keep], labels[keep]
+        self.dist2[slots[keep]] = dist2[keep]
+        self.rows += len(Z)
+        self.inertia += float(dist2.sum())
+
+    def metrics(self) -> dict:
+        n = min(self.rows, self.sample_size)
+        silhouette = None
+        if n > N_CLUSTERS and len(np.unique(self.labels[:n])) > 1:
+            silhouette = float(silhouette_score(self.points[:n], self.labels[:n]))
+        return {
+            "rows": self.rows,
+            "inertia_per_row": self.inertia / self.rows if self.rows else None,
+            "inertia_median": float(np.median(self.dist2[:n])) if n else None,
+            "silhouette": silhouette,
+        }
+
+def measure(bundle: dict, df: pd.DataFrame) -> dict:
+    meter = DriftMeter()
+    Z = embed(bundle, df)
+    meter.add(Z, *assign(bundle, Z))
+    return meter.metrics()
+
+def drift_reason(metrics: dict, baseline: dict):
+    """Alasan refit (string) kalau metrik memburuk melewati toleransi, None kalau masih sehat."""
+    if metrics["rows"] < DRIFT_MIN_ROWS:
+        return None
+    if metrics["inertia_median"] > baseline["inertia_median"] * (1 + INERTIA_TOLERANCE):
+        return f"inertia median {metrics['inertia_median']:.4g} > {baseline['inertia_median']:.4g}"
+    if (metrics["silhouette"] is not None and baseline["silhouette"] is not None
+            and metrics["silhouette"] < baseline["silhouette"] - SILHOUETTE_TOLERANCE):
+        return f"silhouette {metrics['silhouette']:.3f} < {baseline['silhouette']:.3f}"
+    return None
+
+# -----------------------------
+# Fit (streaming per chunk)
+# -----------------------------
+def _new_version() -> str:
+    return time.strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+def align_clusters(bundle: dict, previous: dict, sample: pd.DataFrame):
+    """
+    Urutkan ulang centroid `bundle` supaya index cluster (-> "Segment n") tetap berarti sama dengan
+    `previous`. Full refit memakai transformer & PCA baru, jadi centroid lama dan baru tidak bisa
+    dibandingkan langsung; pasangan dipilih dari overlap assignment sample di kedua model
+    (linear_sum_assignment memaksimalkan jumlah customer yang segmennya tidak berubah).
+    """
+    old_labels, _ = assign(previous, embed(previous, sample))
+    new_labels, _ = assign(bundle, embed(bundle, sample))
+    overlap = np.zeros((N_CLUSTERS, N_CLUSTERS), dtype=int)
+    np.add.at(overlap, (old_labels, new_labels), 1)
+    old_idx, new_idx = linear_sum_assignment(overlap, maximize=True)
+    order = new_idx[np.argsort(old_idx)]  # order[i] = cluster baru yang jadi cluster i
+
+    kmeans = bundle["kmeans"]
+    kmeans.cluster_centers_ = kmeans.cluster_centers_[order]
+    kmeans._counts = kmeans._counts[order]  # bobot partial_fit ikut centroid-nya
+    kmeans.labels_ = np.argsort(order)[kmeans.labels_]
+
+def fit_full(frames, sample: pd.DataFrame, batch_rows: int = DEFAULT_BATCH_ROWS, previous: dict = None) -> dict:
+    """
+    Fit dari nol tanpa memuat seluruh populasi: transformer di sample, IncrementalPCA pass 1
+    per chunk, MiniBatchKMeans pass 2 per chunk (init k-means++ di sample).
+    frames() harus mengembalikan iterator DataFrame baru tiap dipanggil.
+    Kalau ada bundle `previous`, index cluster disejajarkan ke model lama (align_clusters).
+    """
+    transformer = build_transformer().fit(sample[FEATURE_COLUMNS])
+    pca = IncrementalPCA(n_components=N_COMPONENTS)
+    for batch in churn_scoring.rebatch(frames(), batch_rows):
+        if len(batch) >= N_COMPONENTS:
+            pca.partial_fit(transformer.transform(batch[FEATURE_COLUMNS]))
+    bundle = {"transformer": transformer, "pca": pca}
+
+    init = KMeans(n_clusters=N_CLUSTERS, random_state=RANDOM_STATE, n_init=10).fit(embed(bundle, sample))
+    kmeans = MiniBatchKMeans(n_clusters=N_CLUSTERS, init=init.cluster_centers_, n_init=1,
+                             random_state=RANDOM_STATE)
+    for batch in churn_scoring.rebatch(frames(), batch_rows):
+        kmeans.partial_fit(embed(bundle, batch))
+    bundle.update(kmeans=kmeans, version=_new_version(), refit="FULL")
+    if previous is not None:
+        align_clusters(bundle, previous, sample)
+    bundle["baseline"] = measure(bundle, sample)
+    return bundle
+
+def fit_incremental(bundle: dict, frames, sample: pd.DataFrame, batch_rows: int = DEFAULT_BATCH_ROWS) -> dict:
+    """Transformer & PCA tetap; centroid lanjut di-update MiniBatchKMeans.partial_fit per chunk."""
+    # salinan: bundle lama tetap utuh kalau refit gagal di tengah
+    kmeans = copy.deepcopy(bundle["kmeans"])
+    for batch in churn_scoring.rebatch(frames(), batch_rows):
+        kmeans.partial_fit(embed(bundle, batch))
+    candidate = dict(bundle, kmeans=kmeans, version=_new_version(), refit="INCREMENTAL")
+    candidate["baseline"] = measure(candidate, sample)
+    return candidate
+
+def refit(bundle, frames, sample: pd.DataFrame, batch_rows: int = DEFAULT_BATCH_ROWS, force_full: bool = False):
+    """Coba refit inkremental dulu; kalau di sample metriknya tetap drift dari baseline lama -> full refit."""
+    if bundle is not None and not force_full:
+        candidate = fit_incremental(bundle, frames, sample, batch_rows)
+        reason = drift_reason(candidate["baseline"], bundle["baseline"])
+        if reason is None:
+            return candidate, None
+        return fit_full(frames, sample, batch_rows, previous=bundle), reason
+    return fit_full(frames, sample, batch_rows, previous=bundle), "no model" if bundle is None else "forced"
+
+# -----------------------------
+# Assignment harian (hanya delta)
+# -----------------------------
+def delta_sql(model_version: str) -> str:
+    """Customer baru, fitur berubah, atau masih di-assign model versi lama."""
+    return f"""
+      SELECT f.*
+      FROM ({FEATURES_SQL}) f
+      LEFT JOIN {STATE_TABLE} s
+        ON s.CUSTOMER_ID = f.CUSTOMER_ID
+      WHERE s.CUSTOMER_ID IS NULL
+         OR s.FEATURE_HASH <> f.FEATURE_HASH
+         OR s.MODEL_VERSION <> '{model_version}'
+    """
+
+def remove_departed(session) -> int:
+    """
+    Customer yang churn / hilang dari populasi terakhir dibuang dari state & tabel cluster.
+    Dua DELETE dalam satu transaksi: kalau yang kedua gagal, customer tidak tertinggal di state
+    tanpa baris cluster (run berikutnya tidak akan meng-assign ulang karena hash-nya masih sama).
+    """
+    gone = f"SELECT s.CUSTOMER_ID FROM {STATE_TABLE} s LEFT JOIN ({LATEST_SQL}) l ON l.CUSTOMER_ID = s.CUSTOMER_ID WHERE l.CUSTOMER_ID IS NULL"
+    session.sql("BEGIN").collect()
+    try:
+        session.sql(f"DELETE FROM {CLUSTER_TABLE} WHERE CUSTOMER_ID IN ({gone})").collect()
+        removed = session.sql(f"DELETE FROM {STATE_TABLE} WHERE CUSTOMER_ID IN ({gone})").collect()[0][0]
+        session.sql("COMMIT").collect()
+    except Exception:
+        session.sql("ROLLBACK").collect()
+        raise
+    return removed
+
+def assign_changed(session, bundle: dict, batch_rows: int = DEFAULT_BATCH_ROWS) -> dict:
+    """
+    Stream delta per batch -> centroid terdekat -> temp table, lalu satu MERGE ke state & TB_F_CUSTOMER_CLUSTER.
+    Kedua MERGE dalam satu transaksi: state yang sudah maju tanpa TB_F ikut berubah membuat delta_sql
+    tidak lagi memilih customer itu, jadi segmen di TB_F tertinggal selamanya.
+    Return metrik drift dari baris yang di-assign.
+    """
+    # uppercase: nama tanpa quote disimpan uppercase, sedangkan write_pandas meng-quote identifier
+    tmp = f"TMP_SEG_ASSIGN_{uuid.uuid4().hex[:12].upper()}"
+    session.sql(f"CREATE TEMPORARY TABLE {tmp} (CUSTOMER_ID VARCHAR, FEATURE_HASH VARCHAR, CUSTOMER_CLUSTER NUMBER)").collect()
+    meter = DriftMeter()
+    try:
+        for batch in churn_scoring.rebatch(session.sql(delta_sql(bundle["version"])).to_pandas_batches(), batch_rows):
+            Z = embed(bundle, batch)
+            labels, dist2 = assign(bundle, Z)
+            meter.add(Z, labels, dist2)
+            session.write_pandas(pd.DataFrame({
+                "CUSTOMER_ID": batch["CUSTOMER_ID"].to_numpy(),
+                "FEATURE_HASH": batch["FEATURE_HASH"].to_numpy(),
+                "CUSTOMER_CLUSTER": labels,
+            }), tmp, auto_create_table=False)
+        if meter.rows:
+            # temp table (DDL) sudah dibuat di atas: DDL di Snowflake meng-commit transaksi yang terbuka
+            session.sql("BEGIN").collect()
+            try:
+                session.sql(f"""
+                  MERGE INTO {STATE_TABLE} s
+                  USING {tmp} t
+                  ON s.CUSTOMER_ID = t.CUSTOMER_ID
+                  WHEN MATCHED THEN UPDATE SET
+                    FEATURE_HASH = t.FEATURE_HASH, CUSTOMER_CLUSTER = t.CUSTOMER_CLUSTER,
+                    MODEL_VERSION = '{bundle["version"]}', ASSIGNED_AT = CURRENT_TIMESTAMP()
+                  WHEN NOT MATCHED THEN INSERT (CUSTOMER_ID, FEATURE_HASH, CUSTOMER_CLUSTER, MODEL_VERSION, ASSIGNED_AT)
+                    VALUES (t.CUSTOMER_ID, t.FEATURE_HASH, t.CUSTOMER_CLUSTER, '{bundle["version"]}', CURRENT_TIMESTAMP())
+                """).collect()
+                # label sama dengan SP lama: cluster 0..3 -> "Segment 1".."Segment 4"
+                session.sql(f"""
+                  MERGE INTO {CLUSTER_TABLE} c
+                  USING (SELECT CUSTOMER_ID, 'Segment ' || (CUSTOMER_CLUSTER + 1) AS CUSTOMER_SEGMENTATION FROM {tmp}) t
+                  ON c.CUSTOMER_ID = t.CUSTOMER_ID
+                  WHEN MATCHED THEN UPDATE SET
+                    CUSTOMER_SEGMENTATION = t.CUSTOMER_SEGMENTATION, PREDICTION_DATE = CURRENT_DATE()
+                  WHEN NOT MATCHED THEN INSERT (PREDICTION_DATE, CUSTOMER_ID, CUSTOMER_SEGMENTATION)
+                    VALUES (CURRENT_DATE(), t.CUSTOMER_ID, t.CUSTOMER_SEGMENTATION)
+                """).collect()
+                session.sql("COMMIT").collect()
+            except Exception:
+                session.sql("ROLLBACK").collect()
+                raise
+    finally:
+        session.sql(f"DROP TABLE IF EXISTS {tmp}").collect()
+    return meter.metrics()
+
+def log_drift(session, mode: str, bundle: dict, refit_kind: str, reason, metrics: dict, removed: int):
+    values = [
+        mode, bundle["version"], refit_kind, reason, metrics["rows"], removed,
+        metrics["inertia_per_row"], metrics["inertia_median"], metrics["silhouette"],
+        bundle["baseline"]["inertia_median"], bundle["baseline"]["silhouette"],
+    ]
+    sql_values = ", ".join(
+        "NULL" if v is None else (str(v) if isinstance(v, (int, float)) else "'" + str(v).replace("'", "''") + "'")
+        for v in values
+    )
+    session.sql(f"""
+      INSERT INTO {DRIFT_TABLE}
+        (RUN_AT, MODE, MODEL_VERSION, REFIT, REFIT_REASON, ASSIGNED_ROWS, REMOVED_ROWS,
+         INERTIA_PER_ROW, INERTIA_MEDIAN, SILHOUETTE, BASELINE_INERTIA, BASELINE_SILHOUETTE)
+      SELECT CURRENT_TIMESTAMP(), {sql_values}
+    """).collect()
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def run(session, mode: str = DEFAULT_MODE, batch_rows: int = DEFAULT_BATCH_ROWS):
+    ensure_tables(session)
+    bundle = load_bundle(session)
+
+    def frames():
+        return session.sql(FEATURES_SQL).to_pandas_batches()
+
+    def sample():
+        return session.sql(f"SELECT * FROM ({FEATURES_SQL}) SAMPLE ({FIT_SAMPLE_ROWS} ROWS)").to_pandas()
+
+    refit_kind, reason = "NONE", None
+    if bundle is None or mode in ("full", "refit"):
+        bundle, reason = refit(bundle, frames, sample(), batch_rows, force_full=(mode == "full"))
+        refit_kind = bundle["refit"]
+        # simpan dulu: kalau assign gagal, run berikutnya tetap assign ulang semua ke versi baru
+        save_bundle(bundle, session)
+
+    metrics = assign_changed(session, bundle, batch_rows)
+    removed = remove_departed(session)
+
+    drift = drift_reason(metrics, bundle["baseline"]) if refit_kind == "NONE" else None
+    if drift and mode == "auto":
+        bundle, escalated = refit(bundle, frames, sample(), batch_rows)
+        refit_kind, reason = bundle["refit"], drift + (f"; {escalated}" if escalated else "")
+        save_bundle(bundle, session)
+        metrics = assign_changed(session, bundle, batch_rows)
+
+    log_drift(session, mode, bundle, refit_kind, reason or drift, metrics, removed)
+    stats = {
+        "mode": mode,
+        "refit": refit_kind,
+        "assigned": metrics["rows"],
+        "removed": removed,
+        "inertia_median": None if metrics["inertia_median"] is None else round(metrics["inertia_median"], 4),
+        "silhouette": None if metrics["silhouette"] is None else round(metrics["silhouette"], 4),
+        "drift": bool(drift),
+    }
+    return "SEGMENTATION_DONE " + " ".join(f"{k}={v}" for k, v in stats.items())
+
+def main(session, mode: str = DEFAULT_MODE, batch_rows: int = DEFAULT_BATCH_ROWS):
+    mode = (mode or DEFAULT_MODE).strip().lower()
+    if mode not in ("auto", "assign", "refit", "full"):
+        raise ValueError(f"Unknown mode: {mode} (auto | assign | refit | full)")
+    return run(session, mode, int(batch_rows or DEFAULT_BATCH_ROWS))
@@ -1,6 +1,137 @@
 # enrich_reviews.py (FIX: pisah multi-statement jadi single statements)
+import hashlib
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 from snowflake.snowpark.context import get_active_session
-from snowflake.snowpark.functions import col, sql_expr, when, lit
+from snowflake.snowpark.functions import col, sql_expr, when, lit, when_not_matched, count, count_distinct, sum as sum_
+
+# -----------------------------
+# Konfigurasi enrichment Cortex
+# -----------------------------
+TOPIC_LABELS = ['Network', 'App', 'Payment/Billing', 'Recharge/Sales', 'Customer Service', 'Other']
+SATISFACTION_QUESTION = 'Apakah pelanggan puas? Jawab dengan salah satu: Puas / Tidak Puas / Netral.'
+SENTIMENT_THRESHOLD = 0.2  # |score| di atas ini -> POSITIVE / NEGATIVE
+
+# Versi enrichment = hash dari fungsi/label/prompt yang dipakai. Kalau salah satunya berubah,
+# key cache ikut berubah sehingga hasil lama otomatis tidak dipakai lagi.
+ENRICH_VERSION = hashlib.sha1(json.dumps(
+    ["CLASSIFY_TEXT", "SENTIMENT", "EXTRACT_ANSWER", TOPIC_LABELS, SATISFACTION_QUESTION]
+).encode("utf-8")).hexdigest()[:12]
+
+# Mode 'single': satu panggilan COMPLETE dengan structured output (JSON schema) per teks,
+# menggantikan CLASSIFY_TEXT + SENTIMENT + EXTRACT_ANSWER dan pencocokan ILIKE '%puas%'.
+SATISFACTION_LABELS = ['PUAS', 'TIDAK_PUAS', 'NETRAL']
+SINGLE_PASS_MODEL = 'mistral-large2'
+SINGLE_PASS_PROMPT = (
+    'Analisis ulasan aplikasi telco berikut dan isi JSON sesuai schema: '
+    'topic = kategori keluhan/ulasan, '
+    'sentiment = angka -1 (sangat negatif) sampai 1 (sangat positif), '
+    'satisfaction = apakah pelanggan puas (PUAS / TIDAK_PUAS / NETRAL).\n\nUlasan: '
+)
+SINGLE_PASS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'topic': {'type': 'string', 'enum': TOPIC_LABELS},
+        'sentiment': {'type': 'number'},
+        'satisfaction': {'type': 'string', 'enum': SATISFACTION_LABELS},
+    },
+    'required': ['topic', 'sentiment', 'satisfaction'],
+}
+SINGLE_PASS_VERSION = hashlib.sha1(json.dumps(
+    ["COMPLETE", SINGLE_PASS_MODEL, SINGLE_PASS_PROMPT, SINGLE_PASS_SCHEMA]
+).encode("utf-8")).hexdigest()[:12]
+
+CACHE_TABLE = "TELCO.DATAMART.TB_C_REVIEW_ENRICHMENT_CACHE"
+
+# Mode 'micro': delta stream dipindah dulu ke tabel staging (offset stream langsung maju),
+# lalu di-enrich + MERGE per batch berukuran tetap, paralel, dengan progress per batch.
+DELTA_STAGE_TABLE = "TELCO.DATAMART.TB_S_REVIEW_ENRICH_DELTA"
+BATCH_PROGRESS_TABLE = "TELCO.DATAMART.TB_C_REVIEW_ENRICH_BATCH"
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_PARALLELISM = 4
+DEFAULT_BATCH_RETRIES = 2
+# Batch RUNNING/RETRY yang tidak selesai selama ini (proses mati) boleh di-claim run lain
+CLAIM_TIMEOUT_MINUTES = 120
+# Kolom TB_R_REVIEW yang dibaca prepare_source; staging dideklarasikan eksplisit (bukan CTAS
+# dari TB_R_REVIEW) supaya perubahan skema raw tidak membuat INSERT dari stream gagal
+DELTA_STAGE_COLUMNS = [
+    ("_FIVETRAN_ID", "STRING"), ("REVIEW_ID", "STRING"), ("APP_ID", "STRING"), ("COUNTRY", "STRING"),
+    ("LANG", "STRING"), ("APP_VERSION", "STRING"), ("USER_NAME", "STRING"), ("CONTENT_CLEAN", "STRING"),
+    ("THUMBS_UP_COUNT", "NUMBER"), ("SCORE", "NUMBER(10,2)"),
+    # timestamp disimpan apa adanya sebagai teks; prepare_source yang mem-parse (sama dengan jalur non-micro)
+    ("REVIEWED_AT", "STRING"), ("REPLIED_AT", "STRING"),
+]
+
+# Mode 'dedup': teks dinormalisasi dulu (lowercase, spasi tunggal, huruf berulang >= 3 jadi dua)
+# sehingga "Mantappppp" dan "MANTAPP" cukup satu kali panggilan Cortex. Hanya huruf yang dipendekkan:
+# angka ("100000" -> "10") dan tanda baca tetap, karena bisa mengubah makna review.
+NORMALIZER_UDF = "NORMALIZE_REVIEW_TEXT"
+NORMALIZER_SQL = f"""
+CREATE OR REPLACE TEMPORARY FUNCTION {NORMALIZER_UDF}(T STRING)
+RETURNS STRING
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.10'
+HANDLER = 'normalize'
+AS $$
+import re
+_WS = re.compile(r"\\s+")
+_REPEAT = re.compile(r"([^\\W\\d])\\1{{2,}}")
+def normalize(t):
+    if t is None:
+        return None
+    return _REPEAT.sub(r"\\1\\1", _WS.sub(" ", t.strip().lower()))
+$$
+"""
+
+# Mode 'cascade': tier lokal (lexicon + STAR_SCORE) dulu, Cortex hanya untuk baris yang
+# confidence tier lokalnya di bawah threshold. Keyword dicocokkan per kata pada teks lowercase.
+TOPIC_LEXICON = {
+    'Network': ['sinyal', 'jaringan', 'internet', 'koneksi', 'lemot', 'lelet', 'lambat', 'gangguan',
+                '4g', '5g', 'no service', 'putus'],
+    'App': ['aplikasi', 'apk', 'app', 'update', 'login', 'otp', 'error', 'crash', 'force close',
+            'bug', 'loading', 'versi'],
+    'Payment/Billing': ['tagihan', 'bayar', 'pembayaran', 'terpotong', 'potong', 'saldo', 'refund',
+                        'billing', 'gopay', 'ovo', 'dana', 'shopeepay'],
+    'Recharge/Sales': ['pulsa', 'kuota', 'paket', 'isi ulang', 'beli', 'promo', 'harga', 'mahal',
+                       'murah', 'voucher', 'poin'],
+    'Customer Service': ['cs', 'customer service', 'pelayanan', 'operator', 'komplain', 'keluhan',
+                         'call center', 'veronika', 'grapari', 'respon'],
+}
+POSITIVE_WORDS = ['mantap', 'bagus', 'puas', 'lancar', 'cepat', 'keren', 'terima kasih', 'makasih',
+                  'membantu', 'mudah', 'good', 'oke', 'top', 'stabil', 'recommended']
+NEGATIVE_WORDS = ['lemot', 'lelet', 'lambat', 'jelek', 'buruk', 'kecewa', 'parah', 'hilang', 'error',
+                  'gagal', 'susah', 'tidak bisa', 'gak bisa', 'ga bisa', 'rugi', 'penipu', 'nipu',
+                  'mahal', 'ribet', 'payah', 'zonk']
+NO_TOPIC_CONFIDENCE = 0.5       # tidak ada keyword topik -> 'Other' dengan confidence rendah
+DEFAULT_CASCADE_THRESHOLD = 0.7
+
+def parse_mode(mode: str):
+    """
+    'full' / 'incremental' / 'evaluate', opsional diikuti strategi:
+    'full:dedup', 'incremental:cascade=0.8', 'full:dedup+cascade', ...
+    Return (refresh, dict opsi -> nilai atau None).
+    """
+    head, _, opts = (mode or "incremental").lower().partition(":")
+    if head.startswith("full"):
+        refresh = "full"
+    elif head.startswith("eval"):
+        refresh = "evaluate"
+    else:
+        refresh = "incremental"
+    options = {}
+    for opt in opts.replace("+", ",").split(","):
+        name, _, value = opt.strip().partition("=")
+        if name:
+            options[name] = value or None
+    return refresh, options
+
+def cascade_threshold(options):
+    """Threshold confidence tier lokal; None kalau mode cascade tidak aktif."""
+    if not options or "cascade" not in options:
+        return None
+    return float(options["cascade"] or DEFAULT_CASCADE_THRESHOLD)
 
 def ensure_table_exists(session):
     session.sql("""
@@ -21,9 +152,16 @@ def ensure_table_exists(session):
         CAST(NULL AS STRING)        AS SATISFACTION_TEXT,
         CAST(NULL AS STRING)        AS SENTIMENT_BUCKET,
         CAST(NULL AS STRING)        AS SATISFACTION_LABEL,
-        CAST(NULL AS NUMBER)        AS REPLY_LATENCY_MIN
+        CAST(NULL AS NUMBER)        AS REPLY_LATENCY_MIN,
+        CAST(NULL AS STRING)        AS ENRICH_SOURCE,
+        CAST(NULL AS FLOAT)         AS ENRICH_CONFIDENCE
       FROM TELCO.RAW.TB_R_REVIEW WHERE 1=2
     """).collect()
+    # Asal label/skor: 'LOCAL' (tier lexicon, mode cascade) atau 'CORTEX'; confidence hanya untuk LOCAL
+    for column, dtype in (("ENRICH_SOURCE", "STRING"), ("ENRICH_CONFIDENCE", "FLOAT")):
+        session.sql(f"""
+          ALTER TABLE TELCO.DATAMART.TB_F_REVIEWS_ENRICHED ADD COLUMN IF NOT EXISTS {column} {dtype}
+        """).collect()
 
     pk_exists = session.sql("""
       SELECT COUNT(*)
@@ -39,7 +177,271 @@ def ensure_table_exists(session):
           ADD PRIMARY KEY (_FIVETRAN_ID) RELY
         """).collect()
 
-def build_frame_from_raw(session, source_df):
+    # Cache hasil Cortex per hash (CONTENT_CLEAN + versi enrichment)
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+        CONTENT_HASH      STRING PRIMARY KEY RELY,
+        ENRICH_VERSION    STRING,
+        TOPIC_CLASS       STRING,
+        SENTIMENT_SCORE   FLOAT,
+        SATISFACTION_TEXT STRING,
+        CREATED_AT        TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+      )
+    """).collect()
+    # Label kepuasan langsung dari model (mode single); NULL untuk entry jalur tiga fungsi
+    session.sql(f"""
+      ALTER TABLE {CACHE_TABLE} ADD COLUMN IF NOT EXISTS SATISFACTION_LABEL STRING
+    """).collect()
+
+def ensure_batch_tables(session):
+    """Staging delta + progress per batch untuk mode micro (DDL -> di luar transaksi)."""
+    columns = ",\n        ".join(f"{name:<16}{dtype}" for name, dtype in DELTA_STAGE_COLUMNS)
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {DELTA_STAGE_TABLE} (
+        {columns},
+        ACTION          STRING,
+        RUN_ID          STRING,
+        BATCH_ID        NUMBER
+      )
+    """).collect()
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {BATCH_PROGRESS_TABLE} (
+        RUN_ID        STRING,
+        BATCH_ID      NUMBER,
+        ROWS_CNT      NUMBER,
+        STATUS        STRING,          -- PENDING / RUNNING / RETRY / DONE / FAILED / SUPERSEDED
+        ATTEMPTS      NUMBER,
+        CORTEX_CALLS  NUMBER,
+        LAST_ERROR    STRING,
+        STARTED_AT    TIMESTAMP_NTZ,
+        FINISHED_AT   TIMESTAMP_NTZ
+      )
+    """).collect()
+    # Run yang sedang memegang batch (claim_batches)
+    session.sql(f"""
+      ALTER TABLE {BATCH_PROGRESS_TABLE} ADD COLUMN IF NOT EXISTS CLAIM_ID STRING
+    """).collect()
+
+def _sql_list(values):
+    return ", ".join("'" + v.replace("'", "''") + "'" for v in values)
+
+def _sql_const(value):
+    """dict/list/str/angka Python -> konstanta OBJECT/ARRAY Snowflake ({'k': v}, [...])."""
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{_sql_list([k])}: {_sql_const(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_sql_const(v) for v in value) + "]"
+    if isinstance(value, str):
+        return _sql_list([value])
+    return json.dumps(value)
+
+def _word_pattern(words):
+    """Regex 'salah satu kata' dengan batas non-alfanumerik (REGEXP_COUNT Snowflake)."""
+    return _sql_list(["(^|[^a-z0-9])(" + "|".join(words) + ")([^a-z0-9]|$)"])
+
+def bucket_expr(score: str):
+    return (f"CASE WHEN {score} > {SENTIMENT_THRESHOLD} THEN 'POSITIVE' "
+            f"WHEN {score} < -{SENTIMENT_THRESHOLD} THEN 'NEGATIVE' ELSE 'NEUTRAL' END")
+
+def score_label_expr(score: str):
+    return (f"CASE WHEN {score} > {SENTIMENT_THRESHOLD} THEN 'PUAS' "
+            f"WHEN {score} < -{SENTIMENT_THRESHOLD} THEN 'TIDAK_PUAS' ELSE 'NETRAL' END")
+
+def text_label_expr(text: str):
+    """Label kepuasan dari jawaban bebas EXTRACT_ANSWER (jalur tiga fungsi)."""
+    return (f"CASE WHEN {text} ILIKE '%puas%' AND {text} NOT ILIKE '%tidak%' THEN 'PUAS' "
+            f"WHEN {text} ILIKE '%tidak puas%' OR {text} ILIKE '%gak puas%' THEN 'TIDAK_PUAS' "
+            f"ELSE 'NETRAL' END")
+
+def local_tier(df):
+    """
+    Tier 1 lokal (tanpa LLM), dievaluasi kolumnar di warehouse:
+    - LOCAL_TOPIC : topik dengan hit keyword terbanyak ('Other' kalau tidak ada hit)
+    - LOCAL_SCORE : skor sentimen [-1, 1] dari STAR_SCORE (0.6) + polaritas lexicon (0.4)
+    - LOCAL_CONF  : min(confidence topik, confidence sentimen)
+    """
+    text = "LOWER(COALESCE(CONTENT_CLEAN, ''))"
+    n = len(TOPIC_LEXICON)
+    df = df.select(
+        "*",
+        *[sql_expr(f"REGEXP_COUNT({text}, {_word_pattern(words)})").alias(f"HIT_{i}")
+          for i, words in enumerate(TOPIC_LEXICON.values())],
+        sql_expr(f"REGEXP_COUNT({text}, {_word_pattern(POSITIVE_WORDS)})").alias("POS_HITS"),
+        sql_expr(f"REGEXP_COUNT({text}, {_word_pattern(NEGATIVE_WORDS)})").alias("NEG_HITS"),
+    )
+
+    top = f"GREATEST({', '.join(f'HIT_{i}' for i in range(n))})"
+    total = " + ".join(f"HIT_{i}" for i in range(n))
+    topic = ("CASE WHEN " + top + " = 0 THEN 'Other' "
+             + " ".join(f"WHEN HIT_{i} = {top} THEN '{name}'" for i, name in enumerate(TOPIC_LEXICON))
+             + " END")
+    topic_conf = f"IFF({top} = 0, {NO_TOPIC_CONFIDENCE}, {top} / ({total}))"
+    star = "COALESCE((STAR_SCORE - 3) / 2, 0)"
+    lex = "IFF(POS_HITS + NEG_HITS = 0, NULL, (POS_HITS - NEG_HITS) / (POS_HITS + NEG_HITS))"
+    score = f"IFF({lex} IS NULL, {star}, 0.6 * {star} + 0.4 * {lex})"
+    sent_conf = f"IFF({lex} IS NULL, 0.8 * ABS({star}), ABS({score}))"
+
+    return df.select(
+        "*",
+        sql_expr(topic).alias("LOCAL_TOPIC"),
+        sql_expr(score).alias("LOCAL_SCORE"),
+        sql_expr(f"LEAST({topic_conf}, {sent_conf})").alias("LOCAL_CONF"),
+    )
+
+def enrich_version(options=None):
+    return SINGLE_PASS_VERSION if options and "single" in options else ENRICH_VERSION
+
+def content_hash_expr(text_expr: str = "CONTENT_CLEAN", version: str = ENRICH_VERSION):
+    """Key cache: SHA2 dari teks + versi enrichment."""
+    return f"SHA2(COALESCE({text_expr}, '') || '|{version}', 256)"
+
+def _three_call_columns(text: str = "ENRICH_TEXT"):
+    """Jalur asli: tiga fungsi Cortex terpisah per teks."""
+    return [
+        sql_expr(f"""(SNOWFLAKE.CORTEX.CLASSIFY_TEXT(
+                       {text}, ARRAY_CONSTRUCT({_sql_list(TOPIC_LABELS)})
+                    ):"label")::STRING""").alias("TOPIC_CLASS"),
+        sql_expr(f"SNOWFLAKE.CORTEX.SENTIMENT({text})").alias("SENTIMENT_SCORE"),
+        sql_expr(f"""TO_VARCHAR(SNOWFLAKE.CORTEX.EXTRACT_ANSWER(
+                      {text}, {_sql_list([SATISFACTION_QUESTION])}
+                    ))""").alias("SATISFACTION_TEXT"),
+    ]
+
+def _single_pass_columns(text: str = "ENRICH_TEXT"):
+    """
+    Satu panggilan COMPLETE (structured output) per teks, lalu validasi ketat:
+    topic harus salah satu TOPIC_LABELS, sentiment angka di [-1, 1], satisfaction salah satu
+    SATISFACTION_LABELS. Field yang tidak valid jadi NULL (di-enrich ulang lewat jalur tiga fungsi).
+    """
+    options = {'temperature': 0, 'max_tokens': 100,
+               'response_format': {'type': 'json', 'schema': SINGLE_PASS_SCHEMA}}
+    raw = f"""TRY_PARSE_JSON(SNOWFLAKE.CORTEX.COMPLETE(
+                '{SINGLE_PASS_MODEL}',
+                [{{'role': 'user', 'content': {_sql_list([SINGLE_PASS_PROMPT])} || COALESCE({text}, '')}}],
+                {_sql_const(options)}
+              )):structured_output[0]:raw_message"""
+    return [
+        sql_expr(raw).alias("RAW"),
+    ], [
+        sql_expr(f"""IFF(RAW:topic::STRING IN ({_sql_list(TOPIC_LABELS)}),
+                         RAW:topic::STRING, NULL)""").alias("TOPIC_CLASS"),
+        sql_expr("""IFF(TRY_TO_DOUBLE(RAW:sentiment::STRING) BETWEEN -1 AND 1,
+                        TRY_TO_DOUBLE(RAW:sentiment::STRING), NULL)""").alias("SENTIMENT_SCORE"),
+        sql_expr("TO_VARCHAR(RAW)").alias("SATISFACTION_TEXT"),
+        sql_expr(f"""IFF(UPPER(RAW:satisfaction::STRING) IN ({_sql_list(SATISFACTION_LABELS)}),
+                         UPPER(RAW:satisfaction::STRING), NULL)""").alias("SATISFACTION_LABEL"),
+    ]
+
+def fill_enrichment_cache(session, df, options=None, materialize=False):
+    """
+    Jalankan Cortex hanya untuk CONTENT_HASH yang belum ada di cache (cache miss),
+    lalu simpan hasilnya. MERGE (bukan append) supaya aman kalau dua run jalan bersamaan.
+    Pakai Table.merge/update (murni DML, tanpa temp view) supaya bisa jalan di dalam transaksi.
+    Cortex dijalankan atas ENRICH_TEXT (CONTENT_CLEAN, atau versi ternormalisasi di mode dedup);
+    baris yang sudah ditangani tier lokal (mode cascade) dilewati.
+    materialize=True: hasil Cortex ditulis dulu ke temp table (SELECT, tanpa lock) lalu di-MERGE,
+    supaya beberapa batch paralel tidak antre di lock tabel cache selama inferensi.
+    Hanya di luar transaksi (temp table = DDL).
+    Return counter: cortex_calls (teks yang di-enrich), llm_invocations (panggilan fungsi Cortex),
+    structured_fallbacks (mode single: output yang gagal validasi).
+    """
+    cache = session.table(CACHE_TABLE)
+    texts = (
+        df.filter(~col("LOCAL_TIER"))
+          .select(col("CONTENT_HASH"), col("ENRICH_TEXT"))
+          .drop_duplicates("CONTENT_HASH")
+    )
+    misses = texts.join(cache.select("CONTENT_HASH"), on="CONTENT_HASH", how="leftanti")
+    single = options is not None and "single" in options
+    if single:
+        raw_cols, parsed_cols = _single_pass_columns()
+        misses = misses.select(col("CONTENT_HASH"), *raw_cols).select(col("CONTENT_HASH"), *parsed_cols)
+    else:
+        misses = misses.select(col("CONTENT_HASH"), *_three_call_columns(),
+                               lit(None).cast("string").alias("SATISFACTION_LABEL"))
+    if materialize:
+        misses = misses.cache_result()
+
+    result = cache.merge(
+        misses,
+        cache["CONTENT_HASH"] == misses["CONTENT_HASH"],
+        [when_not_matched().insert({
+            "CONTENT_HASH": misses["CONTENT_HASH"],
+            "ENRICH_VERSION": lit(enrich_version(options)),
+            "TOPIC_CLASS": misses["TOPIC_CLASS"],
+            "SENTIMENT_SCORE": misses["SENTIMENT_SCORE"],
+            "SATISFACTION_TEXT": misses["SATISFACTION_TEXT"],
+            "SATISFACTION_LABEL": misses["SATISFACTION_LABEL"],
+        })],
+    )
+    counters = {"cortex_calls": result.rows_inserted,
+                "llm_invocations": result.rows_inserted * (1 if single else 3)}
+    if not single:
+        return counters
+
+    # Output structured yang tidak lolos validasi: enrich ulang entry tsb lewat jalur tiga fungsi.
+    # ENRICH_VERSION ikut diganti ke versi tiga fungsi (asal hasilnya) supaya tidak terpilih lagi;
+    # SATISFACTION_LABEL NULL -> diturunkan dari SATISFACTION_TEXT seperti jalur asli.
+    fallback = texts.select(col("CONTENT_HASH").alias("FB_HASH"), col("ENRICH_TEXT").alias("FB_TEXT"))
+    topic, score, answer = _three_call_columns("FB_TEXT")
+    updated = cache.update(
+        {
+            "ENRICH_VERSION": lit(ENRICH_VERSION),
+            "TOPIC_CLASS": topic,
+            "SENTIMENT_SCORE": score,
+            "SATISFACTION_TEXT": answer,
+            "SATISFACTION_LABEL": lit(None).cast("string"),
+        },
+        (cache["CONTENT_HASH"] == fallback["FB_HASH"])
+        & (cache["ENRICH_VERSION"] == lit(SINGLE_PASS_VERSION))
+        & (cache["TOPIC_CLASS"].is_null() | cache["SENTIMENT_SCORE"].is_null()
+           | cache["SATISFACTION_LABEL"].is_null()),
+        source=fallback,
+    )
+    counters["structured_fallbacks"] = updated.rows_updated
+    counters["llm_invocations"] += updated.rows_updated * 3
+    return counters
+
+def enrichment_stats(df, counters: dict):
+    """
+    Rasio dedup: berapa baris yang cukup diwakili satu teks unik (= pengurangan panggilan LLM).
+    local_tier_rows: baris yang diselesaikan tier lokal (mode cascade) tanpa Cortex.
+    """
+    row = df.select(
+        count(lit(1)).alias("N"),
+        count_distinct(col("CONTENT_HASH")).alias("D"),
+        sum_(col("LOCAL_TIER").cast("int")).alias("L"),
+    ).collect()[0]
+    rows, distinct = row["N"], row["D"]
+    return {
+        "rows": rows,
+        "distinct_texts": distinct,
+        "dedup_ratio": round(1 - distinct / rows, 4) if rows else 0.0,
+        "local_tier_rows": row["L"] or 0,
+        **counters,
+    }
+
+def format_stats(status: str, stats: dict):
+    return status + " " + " ".join(f"{k}={v}" for k, v in stats.items())
+
+def purge_stale_cache(session):
+    """
+    Hapus entry cache dari versi enrichment lama (tidak akan pernah kena hit lagi).
+    Entry jalur tiga fungsi dan single-pass sama-sama dipertahankan supaya kedua mode bisa dibandingkan.
+    """
+    session.sql(f"""
+      DELETE FROM {CACHE_TABLE}
+      WHERE ENRICH_VERSION NOT IN ('{ENRICH_VERSION}', '{SINGLE_PASS_VERSION}')
+    """).collect()
+
+def prepare_source(session, source_df, options=None):
+    """
+    Kolom dasar review + ENRICH_TEXT (teks yang dikirim ke Cortex) + CONTENT_HASH (key cache).
+    Mode dedup: ENRICH_TEXT = teks ternormalisasi (butuh register_normalizer sebelumnya).
+    Mode cascade: + kolom tier lokal dan flag LOCAL_TIER (confidence >= threshold -> tanpa Cortex).
+    """
+    options = options or {}
+    enrich_text = f"{NORMALIZER_UDF}(CONTENT_CLEAN)" if "dedup" in options else "CONTENT_CLEAN"
     df = source_df.select(
         col("_FIVETRAN_ID"),
         col("REVIEW_ID"), col("APP_ID"), col("COUNTRY"), col("LANG"),
@@ -49,38 +451,70 @@ def build_frame_from_raw(session, source_df):
         sql_expr("TRY_TO_TIMESTAMP_TZ(REVIEWED_AT::STRING)  AS REVIEWED_TS_TZ"),
         sql_expr("TRY_TO_TIMESTAMP_TZ(NULLIF(REPLIED_AT::STRING,'')) AS REPLIED_TS_TZ"),
         sql_expr("IFF(NULLIF(REPLIED_AT::STRING,'') IS NOT NULL, 1, 0) AS IS_REPLIED"),
+        sql_expr(f"{enrich_text} AS ENRICH_TEXT"),
+        sql_expr(f"{content_hash_expr(enrich_text, enrich_version(options))} AS CONTENT_HASH"),
+        # METADATA$ACTION dari stream (incremental) ikut dibawa untuk MERGE
+        *([col("ACTION")] if "ACTION" in source_df.columns else []),
     )
 
-    df_en = df.select(
-        "*",
+    threshold = cascade_threshold(options)
+    if threshold is None:
+        return df.select("*", lit(False).alias("LOCAL_TIER"))
+    return local_tier(df).select("*", sql_expr(f"LOCAL_CONF >= {threshold}").alias("LOCAL_TIER"))
+
+def register_normalizer(session):
+    """Temp UDF normalisasi teks (DDL -> panggil sebelum membuka transaksi)."""
+    session.sql(NORMALIZER_SQL).collect()
+
+def build_frame_from_raw(session, source_df, options=None):
+    """
+    Frame hasil enrichment (lazy). Hasil Cortex diambil dari cache, jadi panggil
+    fill_enrichment_cache() lebih dulu untuk source yang sama.
+    """
+    df = prepare_source(session, source_df, options)
+    cache = session.table(CACHE_TABLE).select(
+        "CONTENT_HASH", "TOPIC_CLASS", "SENTIMENT_SCORE", "SATISFACTION_TEXT",
+        col("SATISFACTION_LABEL").alias("MODEL_LABEL"),
+    )
+
+    df_en = df.join(cache, on="CONTENT_HASH", how="left").select(
+        col("_FIVETRAN_ID"),
+        col("REVIEW_ID"), col("APP_ID"), col("COUNTRY"), col("LANG"),
+        col("APP_VERSION"), col("USER_NAME"),
+        col("CONTENT_CLEAN"), col("THUMBS_UP_COUNT"), col("STAR_SCORE"),
+        col("REVIEWED_TS_TZ"), col("REPLIED_TS_TZ"), col("IS_REPLIED"),
+        *([col("ACTION")] if "ACTION" in df.columns else []),
         sql_expr("CAST(REVIEWED_TS_TZ AS TIMESTAMP_NTZ) AS REVIEWED_TS"),
         sql_expr("CAST(REPLIED_TS_TZ  AS TIMESTAMP_NTZ) AS REPLIED_TS"),
-        sql_expr("""(SNOWFLAKE.CORTEX.CLASSIFY_TEXT(
-                       CONTENT_CLEAN,
-                       ARRAY_CONSTRUCT('Network','App','Payment/Billing','Recharge/Sales','Customer Service','Other')
-                    ):"label")::STRING""").alias("TOPIC_CLASS"),
-        sql_expr("SNOWFLAKE.CORTEX.SENTIMENT(CONTENT_CLEAN)").alias("SENTIMENT_SCORE"),
-        sql_expr("""TO_VARCHAR(SNOWFLAKE.CORTEX.EXTRACT_ANSWER(
-                      CONTENT_CLEAN,
-                      'Apakah pelanggan puas? Jawab dengan salah satu: Puas / Tidak Puas / Netral.'
-                    ))""").alias("SATISFACTION_TEXT"),
+        # Baris tier lokal (mode cascade): label lokal, SATISFACTION_TEXT dibiarkan NULL
+        sql_expr("IFF(LOCAL_TIER, LOCAL_TOPIC, TOPIC_CLASS)" if "LOCAL_TOPIC" in df.columns else "TOPIC_CLASS").alias("TOPIC_CLASS"),
+        sql_expr("IFF(LOCAL_TIER, LOCAL_SCORE, SENTIMENT_SCORE)" if "LOCAL_SCORE" in df.columns else "SENTIMENT_SCORE").alias("SENTIMENT_SCORE"),
+        # Skor lexicon dan skor Cortex punya skala/kalibrasi beda -> asal + confidence ikut disimpan
+        sql_expr("CASE WHEN LOCAL_TIER THEN 'LOCAL' WHEN SENTIMENT_SCORE IS NOT NULL THEN 'CORTEX' END").alias("ENRICH_SOURCE"),
+        sql_expr("IFF(LOCAL_TIER, LOCAL_CONF, NULL)" if "LOCAL_CONF" in df.columns else "CAST(NULL AS FLOAT)").alias("ENRICH_CONFIDENCE"),
+        sql_expr("IFF(LOCAL_TIER, NULL, SATISFACTION_TEXT)").alias("SATISFACTION_TEXT"),
+        col("LOCAL_TIER"), col("MODEL_LABEL"),
     ).select(
         "*",
-        when(col("SENTIMENT_SCORE") > lit(0.2), lit("POSITIVE"))
-          .when(col("SENTIMENT_SCORE") < lit(-0.2), lit("NEGATIVE"))
-          .otherwise(lit("NEUTRAL")).alias("SENTIMENT_BUCKET"),
-        when(sql_expr("SATISFACTION_TEXT ILIKE '%puas%' AND SATISFACTION_TEXT NOT ILIKE '%tidak%'"), lit("PUAS"))
-          .when(sql_expr("SATISFACTION_TEXT ILIKE '%tidak puas%' OR SATISFACTION_TEXT ILIKE '%gak puas%'"), lit("TIDAK_PUAS"))
-          .otherwise(lit("NETRAL")).alias("SATISFACTION_LABEL"),
+        sql_expr(bucket_expr("SENTIMENT_SCORE")).alias("SENTIMENT_BUCKET"),
+        # Label: tier lokal -> dari skor; mode single -> label tervalidasi dari model;
+        # jalur tiga fungsi -> diturunkan dari jawaban EXTRACT_ANSWER
+        when(col("LOCAL_TIER"), sql_expr(score_label_expr("SENTIMENT_SCORE")))
+          .when(col("MODEL_LABEL").is_not_null(), col("MODEL_LABEL"))
+          .otherwise(sql_expr(text_label_expr("SATISFACTION_TEXT"))).alias("SATISFACTION_LABEL"),
         sql_expr("""CASE WHEN REPLIED_TS_TZ IS NOT NULL
                           THEN DATEDIFF('minute', REVIEWED_TS_TZ, REPLIED_TS_TZ)
                           ELSE NULL END""").alias("REPLY_LATENCY_MIN")
-    )
+    ).drop("LOCAL_TIER", "MODEL_LABEL")
     return df_en
 
-def full_refresh(session):
+def full_refresh(session, options=None):
+    purge_stale_cache(session)
     src = session.table("TELCO.RAW.TB_R_REVIEW")
-    df_en = build_frame_from_raw(session, src)
+    # Cortex hanya untuk teks yang belum pernah di-enrich; sisanya diambil dari cache
+    prepared = prepare_source(session, src, options)
+    stats = enrichment_stats(prepared, fill_enrichment_cache(session, prepared, options))
+    df_en = build_frame_from_raw(session, src, options)
 
     # Tulis ke staging
     df_en.write.save_as_table("TELCO.DATAMART.TB_F_REVIEWS_ENRICHED__STG", mode="overwrite")
@@ -100,19 +534,35 @@ def full_refresh(session):
       DROP TABLE IF EXISTS TELCO.DATAMART.TB_F_REVIEWS_ENRICHED__STG
     """).collect()
 
-    return "FULL_REFRESH_DONE"
+    return format_stats("FULL_REFRESH_DONE", stats)
 
-def incremental_merge(session):
+def incremental_merge(session, options=None):
     src = session.table("TELCO.RAW.TB_R_REVIEW_STM_DM")
     if src.count() == 0:
         return "NO_DELTA"
 
-    df_en = build_frame_from_raw(session, src.select("*", sql_expr("METADATA$ACTION AS ACTION")))
-    df_en.create_or_replace_temp_view("ENRICH_DELTA")
+    delta = src.select("*", sql_expr("METADATA$ACTION AS ACTION"))
+    # Temp view (DDL) dibuat sebelum BEGIN: DDL di Snowflake meng-commit transaksi yang terbuka
+    build_frame_from_raw(session, delta, options).create_or_replace_temp_view("ENRICH_DELTA")
 
-    session.sql("""
+    # Stream dibaca dua kali (isi cache + MERGE). Dalam satu transaksi keduanya melihat delta
+    # yang sama dan offset stream baru maju saat COMMIT.
+    session.sql("BEGIN").collect()
+    try:
+        prepared = prepare_source(session, delta, options)
+        stats = enrichment_stats(prepared, fill_enrichment_cache(session, prepared, options))
+        _merge_delta(session)
+        session.sql("COMMIT").collect()
+    except Exception:
+        session.sql("ROLLBACK").collect()
+        raise
+
+    return format_stats("INCREMENTAL_MERGE_DONE", stats)
+
+def _merge_delta(session, view: str = "ENRICH_DELTA"):
+    session.sql(f"""
       MERGE INTO TELCO.DATAMART.TB_F_REVIEWS_ENRICHED t
-      USING ENRICH_DELTA d
+      USING {view} d
       ON t._FIVETRAN_ID = d._FIVETRAN_ID
 
       WHEN MATCHED AND d.ACTION = 'DELETE' THEN
@@ -128,28 +578,283 @@ def incremental_merge(session):
           SATISFACTION_TEXT=d.SATISFACTION_TEXT, REVIEWED_TS_TZ=d.REVIEWED_TS_TZ,
           REPLIED_TS_TZ=d.REPLIED_TS_TZ, IS_REPLIED=d.IS_REPLIED,
           SENTIMENT_BUCKET=d.SENTIMENT_BUCKET, SATISFACTION_LABEL=d.SATISFACTION_LABEL,
-          REPLY_LATENCY_MIN=d.REPLY_LATENCY_MIN
+          REPLY_LATENCY_MIN=d.REPLY_LATENCY_MIN,
+          ENRICH_SOURCE=d.ENRICH_SOURCE, ENRICH_CONFIDENCE=d.ENRICH_CONFIDENCE
 
       WHEN NOT MATCHED AND d.ACTION <> 'DELETE' THEN
         INSERT (
           _FIVETRAN_ID,REVIEW_ID,APP_ID,COUNTRY,LANG,APP_VERSION,USER_NAME,
           CONTENT_CLEAN,THUMBS_UP_COUNT,STAR_SCORE,REVIEWED_TS,REPLIED_TS,
           TOPIC_CLASS,SENTIMENT_SCORE,SATISFACTION_TEXT,REVIEWED_TS_TZ,REPLIED_TS_TZ,IS_REPLIED,
-          SENTIMENT_BUCKET,SATISFACTION_LABEL,REPLY_LATENCY_MIN
+          SENTIMENT_BUCKET,SATISFACTION_LABEL,REPLY_LATENCY_MIN,
+          ENRICH_SOURCE,ENRICH_CONFIDENCE
         )
         VALUES (
           d._FIVETRAN_ID,d.REVIEW_ID,d.APP_ID,d.COUNTRY,d.LANG,d.APP_VERSION,d.USER_NAME,
           d.CONTENT_CLEAN,d.THUMBS_UP_COUNT,d.STAR_SCORE,d.REVIEWED_TS,d.REPLIED_TS,
           d.TOPIC_CLASS,d.SENTIMENT_SCORE,d.SATISFACTION_TEXT,d.REVIEWED_TS_TZ,d.REPLIED_TS_TZ,d.IS_REPLIED,
-          d.SENTIMENT_BUCKET,d.SATISFACTION_LABEL,d.REPLY_LATENCY_MIN
+          d.SENTIMENT_BUCKET,d.SATISFACTION_LABEL,d.REPLY_LATENCY_MIN,
+          d.ENRICH_SOURCE,d.ENRICH_CONFIDENCE
         )
     """).collect()
 
-    return "INCREMENTAL_MERGE_DONE"
+# -----------------------------
+# Mode micro-batch
+# -----------------------------
+def stage_delta(session, batch_size: int):
+    """
+    Pindahkan delta stream ke staging dengan RUN_ID + BATCH_ID (DML -> offset stream maju).
+    Batch dibentuk dari urutan REVIEWED_AT terbaru dulu, masing-masing maksimal batch_size baris,
+    sehingga review baru tetap diproses duluan walau ada catch-up besar.
+    Pasangan DELETE dari UPDATE (METADATA$ISUPDATE) dibuang: baris INSERT-nya sudah membawa nilai baru.
+    Return (run_id, jumlah baris yang di-stage).
+    """
+    run_id = uuid.uuid4().hex[:16]
+    names = [name for name, _ in DELTA_STAGE_COLUMNS]
+    values = [f"s.{name}::STRING" if dtype == "STRING" else f"s.{name}" for name, dtype in DELTA_STAGE_COLUMNS]
+    # INSERT, DELETE baris lama dan penutupan progress batch lama dalam satu transaksi
+    session.sql("BEGIN").collect()
+    try:
+        staged = session.sql(f"""
+          INSERT INTO {DELTA_STAGE_TABLE} ({", ".join(names)}, ACTION, RUN_ID, BATCH_ID)
+          SELECT
+            {", ".join(values)},
+            s.METADATA$ACTION,
+            '{run_id}',
+            FLOOR((ROW_NUMBER() OVER (
+              ORDER BY TRY_TO_TIMESTAMP_TZ(s.REVIEWED_AT::STRING) DESC NULLS LAST, s._FIVETRAN_ID
+            ) - 1) / {int(batch_size)})
+          FROM TELCO.RAW.TB_R_REVIEW_STM_DM s
+          WHERE NOT (s.METADATA$ACTION = 'DELETE' AND s.METADATA$ISUPDATE)
+        """).collect()[0][0]
+
+        # Perubahan lebih baru untuk _FIVETRAN_ID yang sama menggantikan baris staging lama
+        # (mis. batch gagal dari run sebelumnya), jadi urutan antar batch tidak berpengaruh.
+        session.sql(f"""
+          DELETE FROM {DELTA_STAGE_TABLE} o
+          USING (SELECT DISTINCT _FIVETRAN_ID FROM {DELTA_STAGE_TABLE} WHERE RUN_ID = '{run_id}') n
+          WHERE o._FIVETRAN_ID = n._FIVETRAN_ID AND o.RUN_ID <> '{run_id}'
+        """).collect()
+
+        # Batch lama yang semua barisnya tergantikan tidak punya apa-apa lagi untuk diproses:
+        # tutup progress-nya, jangan biarkan PENDING / FAILED selamanya
+        session.sql(f"""
+          UPDATE {BATCH_PROGRESS_TABLE} p
+          SET STATUS = 'SUPERSEDED', CLAIM_ID = NULL, FINISHED_AT = CURRENT_TIMESTAMP()
+          WHERE p.RUN_ID <> '{run_id}'
+            AND {_claimable("p")}
+            AND NOT EXISTS (
+              SELECT 1 FROM {DELTA_STAGE_TABLE} s
+              WHERE s.RUN_ID = p.RUN_ID AND s.BATCH_ID = p.BATCH_ID
+            )
+        """).collect()
+        session.sql("COMMIT").collect()
+    except Exception:
+        session.sql("ROLLBACK").collect()
+        raise
+    return run_id, staged
+
+def _claimable(alias: str = "p") -> str:
+    """Batch belum dipegang run mana pun: baru / gagal, atau claim lama yang sudah kedaluwarsa."""
+    return (f"({alias}.STATUS IN ('PENDING', 'FAILED') OR ({alias}.STATUS IN ('RUNNING', 'RETRY') "
+            f"AND {alias}.STARTED_AT < DATEADD(minute, -{CLAIM_TIMEOUT_MINUTES}, CURRENT_TIMESTAMP())))")
+
+def register_batches(session):
+    """Progress PENDING untuk batch staging yang belum tercatat (batch baru / sisa versi lama)."""
+    session.sql(f"""
+      MERGE INTO {BATCH_PROGRESS_TABLE} p
+      USING (
+        SELECT RUN_ID, BATCH_ID, COUNT(*) AS ROWS_CNT
+        FROM {DELTA_STAGE_TABLE}
+        GROUP BY RUN_ID, BATCH_ID
+      ) s
+      ON p.RUN_ID = s.RUN_ID AND p.BATCH_ID = s.BATCH_ID
+      WHEN NOT MATCHED THEN INSERT (RUN_ID, BATCH_ID, ROWS_CNT, STATUS, ATTEMPTS)
+        VALUES (s.RUN_ID, s.BATCH_ID, s.ROWS_CNT, 'PENDING', 0)
+    """).collect()
+
+def claim_batches(session, claim_id: str, limit: int = 0):
+    """
+    Ambil alih batch staging (baru atau gagal sebelumnya) untuk run claim_id, review terbaru dulu.
+    Claim = satu UPDATE yang mengecek ulang status di WHERE-nya: UPDATE di tabel yang sama
+    diserialkan Snowflake, jadi run yang berjalan bersamaan tidak memproses batch yang sama dua kali.
+    Return batch yang berhasil di-claim (RUN_ID, BATCH_ID, ROWS_CNT).
+    """
+    order = "MAX(TRY_TO_TIMESTAMP_TZ(s.REVIEWED_AT::STRING)) DESC NULLS LAST, s.RUN_ID, s.BATCH_ID"
+    session.sql(f"""
+      UPDATE {BATCH_PROGRESS_TABLE} p
+      SET STATUS = 'RUNNING', CLAIM_ID = '{claim_id}', STARTED_AT = CURRENT_TIMESTAMP()
+      FROM (
+        SELECT s.RUN_ID, s.BATCH_ID
+        FROM {DELTA_STAGE_TABLE} s
+        JOIN {BATCH_PROGRESS_TABLE} q
+          ON q.RUN_ID = s.RUN_ID AND q.BATCH_ID = s.BATCH_ID
+        WHERE {_claimable("q")}
+        GROUP BY s.RUN_ID, s.BATCH_ID
+        ORDER BY {order}
+        {f"LIMIT {int(limit)}" if limit else ""}
+      ) c
+      WHERE p.RUN_ID = c.RUN_ID AND p.BATCH_ID = c.BATCH_ID
+        AND {_claimable("p")}
+    """).collect()
+    return session.sql(f"""
+      SELECT s.RUN_ID, s.BATCH_ID, COUNT(*) AS ROWS_CNT
+      FROM {DELTA_STAGE_TABLE} s
+      JOIN {BATCH_PROGRESS_TABLE} p
+        ON p.RUN_ID = s.RUN_ID AND p.BATCH_ID = s.BATCH_ID
+      WHERE p.CLAIM_ID = '{claim_id}' AND p.STATUS = 'RUNNING'
+      GROUP BY s.RUN_ID, s.BATCH_ID
+      ORDER BY {order}
+    """).collect()
+
+def _record_batch(session, run_id, batch_id, status, rows_cnt=None, cortex_calls=None, error=None):
+    finished = "CURRENT_TIMESTAMP()" if status != "RUNNING" else "NULL"
+    session.sql(f"""
+      MERGE INTO {BATCH_PROGRESS_TABLE} p
+      USING (SELECT '{run_id}' AS RUN_ID, {int(batch_id)} AS BATCH_ID) b
+      ON p.RUN_ID = b.RUN_ID AND p.BATCH_ID = b.BATCH_ID
+      WHEN MATCHED THEN UPDATE SET
+        STATUS = '{status}',
+        ATTEMPTS = p.ATTEMPTS + IFF('{status}' = 'RUNNING', 1, 0),
+        ROWS_CNT = COALESCE({rows_cnt if rows_cnt is not None else "NULL"}, p.ROWS_CNT),
+        CORTEX_CALLS = COALESCE({cortex_calls if cortex_calls is not None else "NULL"}, p.CORTEX_CALLS),
+        LAST_ERROR = {_sql_list([error[:4000]]) if error else "NULL"},
+        STARTED_AT = IFF('{status}' = 'RUNNING', CURRENT_TIMESTAMP(), p.STARTED_AT),
+        FINISHED_AT = {finished}
+      WHEN NOT MATCHED THEN INSERT (RUN_ID, BATCH_ID, ROWS_CNT, STATUS, ATTEMPTS, STARTED_AT)
+        VALUES (b.RUN_ID, b.BATCH_ID, {rows_cnt if rows_cnt is not None else "NULL"},
+                '{status}', 1, CURRENT_TIMESTAMP())
+    """).collect()
+
+def process_batch(session, run_id, batch_id, rows_cnt, options=None):
+    """
+    Enrich + MERGE satu batch staging, lalu hapus barisnya dari staging.
+    Tanpa transaksi eksplisit (transaksi berlaku per session, sedangkan batch jalan paralel):
+    semua langkah idempotent, jadi batch yang gagal di tengah aman diulang utuh.
+    """
+    _record_batch(session, run_id, batch_id, "RUNNING", rows_cnt=rows_cnt)
+    batch = (
+        session.table(DELTA_STAGE_TABLE)
+               .filter((col("RUN_ID") == lit(run_id)) & (col("BATCH_ID") == lit(batch_id)))
+               .drop("RUN_ID", "BATCH_ID")
+    )
+    prepared = prepare_source(session, batch, options)
+    counters = fill_enrichment_cache(session, prepared, options, materialize=True)
+
+    view = f"ENRICH_DELTA_{run_id}_{int(batch_id)}"
+    build_frame_from_raw(session, batch, options).create_or_replace_temp_view(view)
+    _merge_delta(session, view)
+    session.sql(f"""
+      DELETE FROM {DELTA_STAGE_TABLE} WHERE RUN_ID = '{run_id}' AND BATCH_ID = {int(batch_id)}
+    """).collect()
+    session.sql(f"DROP VIEW IF EXISTS {view}").collect()
+    _record_batch(session, run_id, batch_id, "DONE", cortex_calls=counters["cortex_calls"])
+    return counters
+
+def _run_batch_with_retry(session, batch, options, retries):
+    for attempt in range(retries + 1):
+        try:
+            return process_batch(session, batch["RUN_ID"], batch["BATCH_ID"], batch["ROWS_CNT"], options)
+        except Exception as e:
+            # RETRY (bukan FAILED) selama masih akan diulang: FAILED bisa langsung di-claim run lain
+            status = "FAILED" if attempt == retries else "RETRY"
+            _record_batch(session, batch["RUN_ID"], batch["BATCH_ID"], status, error=str(e))
+            if attempt == retries:
+                return None
+
+def micro_batch_merge(session, options=None):
+    """
+    incremental_merge versi micro-batch: stage delta -> batch paralel -> progress per batch.
+    Opsi mode: batch=<baris per batch>, parallel=<batch bersamaan>, retries=<ulang per batch>,
+    max_batches=<batas batch per pemanggilan; sisanya lanjut di run berikutnya>.
+    Batch yang tetap gagal tertinggal di staging dan diambil lagi pada pemanggilan berikutnya.
+    Batch di-claim dulu (claim_batches) sehingga pemanggilan yang tumpang tindih membagi batch, bukan mengulangnya.
+    """
+    options = options or {}
+    batch_size = int(options.get("batch") or DEFAULT_BATCH_SIZE)
+    parallelism = int(options.get("parallel") or DEFAULT_PARALLELISM)
+    retries = int(options.get("retries") or DEFAULT_BATCH_RETRIES)
+    max_batches = int(options.get("max_batches") or 0)
+
+    ensure_batch_tables(session)
+    run_id, staged = stage_delta(session, batch_size)
+    register_batches(session)
+    batches = claim_batches(session, run_id, max_batches)
+    if not batches:
+        return "NO_DELTA"
+
+    # Session Snowpark thread-safe untuk eksekusi query; tiap batch punya temp view sendiri
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        results = list(pool.map(lambda b: _run_batch_with_retry(session, b, options, retries), batches))
+
+    done = [r for r in results if r is not None]
+    stats = {
+        "rows_staged": staged,
+        "batches": len(batches),
+        "batches_done": len(done),
+        "batches_failed": len(batches) - len(done),
+        "rows_merged": sum(b["ROWS_CNT"] for b, r in zip(batches, results) if r is not None),
+    }
+    for key in ("cortex_calls", "llm_invocations", "structured_fallbacks"):
+        if any(key in r for r in done):
+            stats[key] = sum(r.get(key, 0) for r in done)
+    return format_stats("MICRO_BATCH_DONE", stats)
+
+def evaluate_cascade(session, thresholds=(0.5, 0.6, 0.7, 0.8, 0.9)):
+    """
+    Evaluasi offline tier lokal terhadap baris yang sudah di-enrich Cortex
+    (SATISFACTION_TEXT tidak NULL). Per threshold: coverage (porsi baris yang tidak perlu
+    Cortex) dan akurasi TOPIC_CLASS / SENTIMENT_BUCKET / SATISFACTION_LABEL di baris tersebut.
+    """
+    enriched = (
+        session.table("TELCO.DATAMART.TB_F_REVIEWS_ENRICHED")
+               .filter(col("SATISFACTION_TEXT").is_not_null())
+               .select("CONTENT_CLEAN", "STAR_SCORE", "TOPIC_CLASS", "SENTIMENT_BUCKET", "SATISFACTION_LABEL")
+    )
+    local_tier(enriched).create_or_replace_temp_view("CASCADE_EVAL")
+
+    hit = "IFF(e.LOCAL_CONF >= t.THRESHOLD, IFF({pred} = {actual}, 1, 0), NULL)"
+    rows = session.sql(f"""
+      SELECT
+        t.THRESHOLD,
+        COUNT(*)                                          AS N_ROWS,
+        COUNT_IF(e.LOCAL_CONF >= t.THRESHOLD) / COUNT(*)  AS COVERAGE,
+        AVG({hit.format(pred="e.LOCAL_TOPIC", actual="e.TOPIC_CLASS")})                        AS TOPIC_ACC,
+        AVG({hit.format(pred=bucket_expr("e.LOCAL_SCORE"), actual="e.SENTIMENT_BUCKET")})      AS BUCKET_ACC,
+        AVG({hit.format(pred=score_label_expr("e.LOCAL_SCORE"), actual="e.SATISFACTION_LABEL")}) AS LABEL_ACC
+      FROM CASCADE_EVAL e
+      CROSS JOIN (
+        SELECT VALUE::FLOAT AS THRESHOLD
+        FROM TABLE(FLATTEN(INPUT => ARRAY_CONSTRUCT({", ".join(str(float(x)) for x in thresholds)})))
+      ) t
+      GROUP BY t.THRESHOLD
+      ORDER BY t.THRESHOLD
+    """).collect()
+
+    return json.dumps([
+        {k.lower(): (round(float(v), 4) if v is not None and k != "N_ROWS" else v) for k, v in r.as_dict().items()}
+        for r in rows
+    ])
 
 def main(mode: str = "incremental"):
+    """
+    mode: 'full' | 'incremental' | 'evaluate', opsional diikuti strategi:
+    - ':dedup'            normalisasi + dedup teks sebelum Cortex (mis. 'full:dedup')
+    - ':cascade[=0.7]'    tier lokal dulu, Cortex hanya untuk confidence < threshold
+    - ':single'           satu panggilan COMPLETE structured output per teks (vs tiga fungsi)
+    - ':micro[+batch=5000+parallel=4]'  incremental per batch paralel dengan progress per batch
+    - 'evaluate[:0.6,0.7,0.8]'  evaluasi offline tier lokal vs hasil Cortex sebelumnya
+    """
     session = get_active_session()
     ensure_table_exists(session)
-    if mode and mode.lower().startswith("full"):
-        return full_refresh(session)
-    return incremental_merge(session)
+    refresh, options = parse_mode(mode)
+    if refresh == "evaluate":
+        thresholds = [float(t) for t in options] if options else None
+        return evaluate_cascade(session, *([thresholds] if thresholds else []))
+    if "dedup" in options:
+        register_normalizer(session)
+    if refresh == "full":
+        return full_refresh(session, options)
+    if "micro" in options:
+        return micro_batch_merge(session, options)
+    return incremental_merge(session, options)
@@ -0,0 +1,329 @@
+# benchmark.py
+# ============================================
+# Offline benchmark untuk connector.py
+# google_play_scraper.reviews & fivetran_connector_sdk.Operations diganti fake lokal,
+# jadi throughput update() bisa diukur tanpa hit Google Play.
+#
+# Contoh:
+#   python FIVETRAN/benchmark.py                              # preset 1k / 10k / 100k
+#   python FIVETRAN/benchmark.py --reviews 1000000 --targets 4 --page-latency-ms 80
+#   python FIVETRAN/benchmark.py --failure-rate 0.05 --config rate_per_sec=5
+# ============================================
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SEED_CSV = os.path.join(HERE, "..", "data_googleplay_scraping.csv")
+
+FALLBACK_TEXTS = [
+    "mantap", "jaringan lemot", "sinyal hilang terus", "aplikasi sering force close",
+    "paket data cepat habis", "cs responsif, terima kasih", "gagal bayar pakai e-wallet",
+    "kuota tidak masuk padahal pulsa terpotong", "👍👍👍", "update terbaru bikin lambat",
+]
+
+# -----------------------------
+# Shim modul (hanya kalau SDK belum ter-install)
+# -----------------------------
+def install_shims():
+    """Sediakan modul minimal supaya connector.py bisa di-import di mesin tanpa SDK."""
+    try:
+        import fivetran_connector_sdk  # noqa: F401
+    except ImportError:
+        sdk = types.ModuleType("fivetran_connector_sdk")
+
+        class Connector:
+            def __init__(self, update=None, schema=None):
+                self.update = update
+
+        class Operations:
+            @staticmethod
+            def upsert(table, data):
+                pass
+
+            @staticmethod
+            def checkpoint(state):
+                pass
+
+        sdk.Connector, sdk.Operations = Connector, Operations
+        sys.modules["fivetran_connector_sdk"] = sdk
+
+    try:
+        import google_play_scraper.features.reviews  # noqa: F401
+    except ImportError:
+        from enum import Enum
+
+        class Sort(int, Enum):
+            MOST_RELEVANT = 1
+            NEWEST = 2
+            RATING = 3
+
+        class _ContinuationToken:
+            __slots__ = ("token", "lang", "country", "sort", "count", "filter_score_with", "filter_device_with")
+
+            def __init__(self, token, lang, country, sort, count, filter_score_with, filter_device_with):
+                self.token, self.lang, self.country, self.sort = token, lang, country, sort
+                self.count, self.filter_score_with, self.filter_device_with = count, filter_score_with, filter_device_with
+
+        gps = types.ModuleType("google_play_scraper")
+        features = types.ModuleType("google_play_scraper.features")
+        rv = types.ModuleType("google_play_scraper.features.reviews")
+        rv._ContinuationToken = _ContinuationToken
+        gps.Sort, gps.reviews, gps.features = Sort, None, features
+        features.reviews = rv
+        sys.modules.update({
+            "google_play_scraper": gps,
+            "google_play_scraper.features": features,
+            "google_play_scraper.features.reviews": rv,
+        })
+
+# -----------------------------
+# Seed text
+# -----------------------------
+def load_seed_texts(path: str, limit: int = 5000):
+    """
+    Ambil teks contoh dari CSV: kolom 'content' kalau ada (hasil scraping asli),
+    kalau tidak pakai kolom teks bebas 'CHURN_REASON'. Fallback ke FALLBACK_TEXTS.
+    """
+    texts = []
+    if path and os.path.exists(path):
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            field = next((c for c in ("content", "CONTENT", "CHURN_REASON") if c in (reader.fieldnames or [])), None)
+            if field:
+                for row in reader:
+                    if row.get(field):
+                        texts.append(row[field])
+                    if len(texts) >= limit:
+                        break
+    return texts or list(FALLBACK_TEXTS)
+
+# -----------------------------
+# Fakes
+# -----------------------------
+class PhaseTimer:
+    """Akumulasi durasi per fase (thread-safe; fetch jalan di worker thread)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = {"fetch_reviews": 0.0, "map_record": 0.0, "upsert": 0.0}
+        self.calls = {"fetch_reviews": 0, "map_record": 0, "upsert": 0}
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self.seconds[phase] += seconds
+            self.calls[phase] += 1
+
+class FakePlayStore:
+    """
+    Pengganti google_play_scraper.reviews: `total` review per app/locale dengan
+    timestamp menurun (urut NEWEST), latency per halaman dan kegagalan yang bisa diatur.
+    """
+    def __init__(self, total: int, texts: list, latency_ms: float, jitter_ms: float,
+                 failure_rate: float, swallowed_rate: float, timer: PhaseTimer, seed: int = 0):
+        from google_play_scraper.features.reviews import _ContinuationToken
+        self._token_cls = _ContinuationToken
+        self.total = total
+        self.texts = texts
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.swallowed_rate = swallowed_rate
+        self.timer = timer
+        self.base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _roll(self):
+        with self._lock:
+            return self._rng.random(), self._rng.uniform(-1, 1)
+
+    def __call__(self, app_id, lang="en", country="us", sort=None, count=100,
+                 filter_score_with=None, filter_device_with=None, continuation_token=None):
+        started = time.perf_counter()
+        try:
+            roll, jitter = self._roll()
+            time.sleep(max(0.0, self.latency_ms + jitter * self.jitter_ms) / 1000)
+            if roll < self.failure_rate:
+                raise ConnectionError("injected failure")
+
+            if continuation_token is not None:
+                if continuation_token.token is None:
+                    return [], continuation_token
+                lang, country = continuation_token.lang, continuation_token.country
+                sort, count = continuation_token.sort, continuation_token.count
+            offset = int(continuation_token.token) if continuation_token is not None else 0
+
+            if roll < self.failure_rate + self.swallowed_rate:
+                # perilaku asli library: error HTTP ditelan -> halaman kosong, token habis
+                return [], self._token_cls(None, lang, country, sort, count, None, None)
+
+            n = max(0, min(count, self.total - offset))
+            page = []
+            for i in range(offset, offset + n):
+                at = self.base - timedelta(minutes=i)
+                page.append({
+                    "reviewId": f"gp:{app_id}:{lang}:{country}:{i:08d}",
+                    "userName": f"user{i % 9973}",
+                    "userImage": "",
+                    "content": self.texts[i % len(self.texts)],
+                    "score": 1 + i % 5,
+                    "thumbsUpCount": i % 17,
+                    "reviewCreatedVersion": "8.1.0",
+                    "at": at.replace(tzinfo=None),
+                    "replyContent": "Mohon maaf atas kendalanya" if i % 7 == 0 else None,
+                    "repliedAt": (at + timedelta(hours=3)).replace(tzinfo=None) if i % 7 == 0 else None,
+                    "appVersion": "8.1.0",
+                })
+            nxt = str(offset + n) if offset + n < self.total else None
+            return page, self._token_cls(nxt, lang, country, sort, count, None, None)
+        finally:
+            self.timer.add("fetch_reviews", time.perf_counter() - started)
+
+class FakeOperations:
+    """Pengganti fivetran_connector_sdk.Operations: hitung row & catat waktu upsert pertama."""
+    timer = None
+    rows = 0
+    checkpoints = 0
+    first_upsert_at = None
+
+    @classmethod
+    def upsert(cls, table, data):
+        started = time.perf_counter()
+        if cls.first_upsert_at is None:
+            cls.first_upsert_at = started
+        json.dumps(data)  # kira-kira biaya serialisasi SDK
+        cls.rows += 1
+        cls.timer.add("upsert", time.perf_counter() - started)
+
+    @classmethod
+    def checkpoint(cls, state):
+        json.dumps(state)
+        cls.checkpoints += 1
+
+# -----------------------------
+# Runner
+# -----------------------------
+def run_scenario(scenario: dict):
+    """Jalankan satu skenario di proses ini (dipanggil di child process -> peak RSS terpisah)."""
+    install_shims()
+    sys.path.insert(0, HERE)
+    import connector
+
+    timer = PhaseTimer()
+    texts = load_seed_texts(scenario["seed_csv"])
+    connector.reviews = FakePlayStore(
+        scenario["reviews"], texts, scenario["page_latency_ms"], scenario["latency_jitter_ms"],
+        scenario["failure_rate"], scenario["swallowed_rate"], timer, scenario["seed"],
+    )
+    FakeOperations.timer = timer
+    connector.op = FakeOperations
+
+    real_map = connector.map_record
+
+    def timed_map(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return real_map(*args, **kwargs)
+        finally:
+            timer.add("map_record", time.perf_counter() - started)
+
+    connector.map_record = timed_map
+    connector.logger.setLevel("WARNING")
+
+    targets = [{"app_id": f"com.bench.app{i}", "lang": "id", "country": "id"} for i in range(scenario["targets"])]
+    configuration = {
+        "targets": json.dumps(targets),
+        "count": str(scenario["reviews"]),
+        "sort": "NEWEST",
+        # default benchmark: limiter longgar supaya yang terukur pipeline-nya, bukan throttle
+        "rate_per_sec": "1000",
+        "max_rate_per_sec": "1000",
+        "backoff_base_seconds": "0.05",
+    }
+    configuration.update(scenario["config"])
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    state = connector.update(configuration, {})
+    elapsed = time.perf_counter() - started
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    rows = FakeOperations.rows
+    return {
+        "reviews_per_target": scenario["reviews"],
+        "targets": scenario["targets"],
+        "rows": rows,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "time_to_first_upsert_s": round(FakeOperations.first_upsert_at - started, 3) if FakeOperations.first_upsert_at else None,
+        "peak_rss_mb": round(rss_peak / 1024, 1),  # Linux: ru_maxrss dalam KB
+        "rss_growth_mb": round((rss_peak - rss_before) / 1024, 1),
+        "phase_seconds": {k: round(v, 3) for k, v in timer.seconds.items()},
+        "phase_calls": dict(timer.calls),
+        "checkpoints": FakeOperations.checkpoints,
+        "fetch_stats": state.get("_fetch_stats"),
+    }
+
+def print_report(results: list):
+    header = f"{'reviews':>9} {'tgt':>3} {'rows':>9} {'sec':>8} {'rows/s':>9} {'ttfu s':>7} {'rss MB':>7} {'fetch s':>8} {'map s':>7} {'upsert s':>8} {'retries':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        ph = r["phase_seconds"]
+        print(f"{r['reviews_per_target']:>9} {r['targets']:>3} {r['rows']:>9} {r['elapsed_s']:>8} {r['rows_per_sec']:>9} "
+              f"{r['time_to_first_upsert_s']!s:>7} {r['peak_rss_mb']:>7} {ph['fetch_reviews']:>8} {ph['map_record']:>7} "
+              f"{ph['upsert']:>8} {(r['fetch_stats'] or {}).get('retries', 0):>7}")
+    print("fetch s = total waktu di fake reviews() (dijumlah lintas worker thread, termasuk latency).")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark connector Play Store (tanpa network).")
+    parser.add_argument("--reviews", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="jumlah review per target, satu skenario per nilai")
+    parser.add_argument("--targets", type=int, default=1)
+    parser.add_argument("--page-latency-ms", type=float, default=20.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="peluang reviews() raise exception")
+    parser.add_argument("--swallowed-rate", type=float, default=0.0,
+                        help="peluang halaman kosong + token habis (error yang ditelan library)")
+    parser.add_argument("--seed-csv", default=DEFAULT_SEED_CSV)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", action="append", default=[], metavar="KEY=VALUE",
+                        help="override configuration connector, mis. max_workers=8")
+    parser.add_argument("--json", dest="json_out", help="tulis hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    overrides = dict(kv.split("=", 1) for kv in args.config)
+    results = []
+    for n in args.reviews:
+        scenario = {
+            "reviews": n,
+            "targets": args.targets,
+            "page_latency_ms": args.page_latency_ms,
+            "latency_jitter_ms": args.latency_jitter_ms,
+            "failure_rate": args.failure_rate,
+            "swallowed_rate": args.swallowed_rate,
+            "seed_csv": args.seed_csv,
+            "seed": args.seed,
+            "config": overrides,
+        }
+        # proses baru per skenario -> peak RSS tidak tercampur skenario sebelumnya
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(run_scenario, scenario).result())
+
+    print_report(results)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    main()
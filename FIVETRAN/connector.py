@@ -1,8 +1,19 @@
 # connector.py
+import base64
+import hashlib
+import json
 import logging
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime, timezone
 from fivetran_connector_sdk import Connector, Operations as op
 from google_play_scraper import reviews, Sort
+from google_play_scraper.features.reviews import _ContinuationToken
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -49,50 +60,254 @@ def resolve_sort(name: str):
         return getattr(Sort, "HELPFUL", getattr(Sort, "MOST_RELEVANT", Sort.NEWEST))
     return getattr(Sort, "NEWEST", Sort.NEWEST)
 
+def is_time_ordered(name: str):
+    """Hanya sort NEWEST yang urut waktu -> cutoff incremental berbasis timestamp valid."""
+    return resolve_sort(name) == getattr(Sort, "NEWEST", None)
+
+def dump_token(token):
+    """Serialisasi continuation token google-play-scraper ke dict (JSON-able) untuk state."""
+    if token is None:
+        return None
+    return {k: getattr(token, k) for k in _ContinuationToken.__slots__}
+
+def load_token(data):
+    """Kebalikan dump_token: dict dari state -> continuation token."""
+    if not isinstance(data, dict):
+        return None
+    return _ContinuationToken(**{k: data.get(k) for k in _ContinuationToken.__slots__})
+
+# -----------------------------
+# Rate limiting & retry
+# -----------------------------
+class AdaptiveRateLimiter:
+    """
+    Token bucket bersama untuk semua request ke Play Store (lintas target/thread).
+    Rate naik pelan (additive) selama respons sehat dan turun cepat (multiplicative)
+    saat error / respons lambat, jadi throughput mendekati batas toleransi source.
+    """
+    def __init__(self, rate: float, min_rate: float, max_rate: float, slow_seconds: float, burst: float = 2.0):
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.slow_seconds = slow_seconds
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttle_waits = 0
+        self.throttle_wait_s = 0.0
+        self.retries = 0
+        self.pages = 0
+
+    def acquire(self):
+        """Tunggu sampai ada token untuk satu request."""
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                if not waited:
+                    self.throttle_waits += 1
+                    waited = True
+                self.throttle_wait_s += wait
+            time.sleep(wait)
+
+    def success(self, latency: float):
+        with self._lock:
+            self.pages += 1
+            if latency > self.slow_seconds:
+                self.rate = max(self.min_rate, self.rate * 0.7)
+            else:
+                self.rate = min(self.max_rate, self.rate + max(0.1, self.rate * 0.05))
+
+    def failure(self):
+        with self._lock:
+            self.retries += 1
+            self.rate = max(self.min_rate, self.rate * 0.5)
+
+    def stats(self, elapsed: float):
+        return {
+            "rate_per_sec": round(self.rate, 3),
+            "pages": self.pages,
+            "pages_per_sec": round(self.pages / elapsed, 3) if elapsed > 0 else None,
+            "retries": self.retries,
+            "throttle_waits": self.throttle_waits,
+            "throttle_wait_s": round(self.throttle_wait_s, 3),
+        }
+
+def build_retry(configuration):
+    """Kebijakan retry per halaman dari config (semua STRING)."""
+    return {
+        "max_retries": max(0, int(configuration.get("max_retries", "5"))),
+        "backoff_base_s": float(configuration.get("backoff_base_seconds", "1")),
+        "backoff_max_s": float(configuration.get("backoff_max_seconds", "60")),
+        "empty_page_retries": max(0, int(configuration.get("empty_page_retries", "1"))),
+    }
+
+def fetch_page(app_id: str, lang: str, country: str, sort_enum, count: int, token,
+               gate=None, limiter=None, retry=None, stats=None, expect_rows: bool = False):
+    """
+    Satu panggilan reviews() dengan rate limit + retry exponential backoff (full jitter).
+    Retry selalu memakai continuation_token yang sama, jadi tidak ada halaman yang terlewat.
+    Catatan: google-play-scraper menelan error HTTP dan mengembalikan halaman kosong dengan
+    token.token None; halaman kosong di tengah paging (token sebelumnya masih ada) dianggap
+    mencurigakan dan di-retry `empty_page_retries` kali sebelum diterima sebagai akhir data.
+    Halaman pertama (token None) yang kosong juga begitu kalau `expect_rows` (sync sebelumnya
+    target ini pernah dapat review): di sini library juga mengembalikan ([], None) saat throttled.
+    """
+    retry = retry or build_retry({})
+    attempt, empty_seen = 0, 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        started = time.monotonic()
+        try:
+            with gate or nullcontext():
+                batch, new_token = reviews(
+                    app_id,
+                    lang=lang,
+                    country=country,
+                    sort=sort_enum,
+                    count=count,
+                    continuation_token=token
+                )
+        except Exception as e:
+            if attempt >= retry["max_retries"]:
+                raise
+            logger.warning(f"reviews() gagal untuk app_id={app_id} (attempt {attempt + 1}): {e}")
+        else:
+            ended = new_token is None or new_token.token is None
+            if token is None:
+                suspect = not batch and ended and expect_rows
+            else:
+                suspect = not batch and ended and token.token is not None
+            if not suspect or empty_seen >= retry["empty_page_retries"]:
+                if limiter is not None:
+                    limiter.success(time.monotonic() - started)
+                return batch, new_token
+            empty_seen += 1
+
+        if limiter is not None:
+            limiter.failure()
+        if stats is not None:
+            stats["retries"] = stats.get("retries", 0) + 1
+        time.sleep(random.uniform(0, min(retry["backoff_max_s"], retry["backoff_base_s"] * 2 ** attempt)))
+        attempt += 1
+
 # -----------------------------
 # Fetcher
 # -----------------------------
-def fetch_reviews(app_id: str, lang: str, country: str, sort: str, max_count: int, since_iso: str = None):
+def iter_review_pages(app_id: str, lang: str, country: str, sort: str, max_count: int, since_iso: str = None,
+                      gate=None, token=None, fetched: int = 0, limiter=None, retry=None, stats=None,
+                      expect_rows: bool = False):
     """
-    Ambil ulasan dengan paging (continuation_token), stop kalau sudah mencapai max_count
-    atau (opsional) bertemu review dengan timestamp <= since_iso (incremental).
+    Generator: ambil ulasan per halaman (continuation_token) dan yield (list review, token)
+    per halaman. Stop kalau sudah mencapai max_count atau (opsional, hanya sort NEWEST)
+    bertemu review dengan timestamp <= since_iso (incremental).
+    `gate` (opsional) = semaphore yang membatasi request paralel per app_id.
+    `token`/`fetched` = lanjutkan dari checkpoint (continuation token + jumlah yang sudah diambil).
+    `limiter`/`retry`/`stats` = rate limiter bersama, kebijakan retry, dan counter per target (lihat fetch_page).
+    `expect_rows` = target pernah punya review -> halaman pertama kosong di-retry dulu (lihat fetch_page).
     """
-    logger.info(f"Fetching reviews for app_id={app_id} lang={lang} country={country} sort={sort} max={max_count}")
+    logger.info(f"Fetching reviews for app_id={app_id} lang={lang} country={country} sort={sort} max={max_count}"
+                f"{' (resume)' if token is not None else ''}")
     sort_enum = resolve_sort(sort)
 
-    token = None
-    out = []
-    since_dt = parse_iso_utc(since_iso)
+    since_dt = parse_iso_utc(since_iso) if is_time_ordered(sort) else None
     if since_dt:
         logger.info(f"Incremental cutoff (since): {since_dt.isoformat()}")
 
     while True:
-        remaining = max_count - len(out)
+        remaining = max_count - fetched
         if remaining <= 0:
             break
 
-        batch, token = reviews(
-            app_id,
-            lang=lang,
-            country=country,
-            sort=sort_enum,
-            count=min(200, remaining),  # lib limit ~200 per call
-            continuation_token=token
+        batch, token = fetch_page(
+            app_id, lang, country, sort_enum,
+            min(200, remaining),  # lib limit ~200 per call
+            token, gate=gate, limiter=limiter, retry=retry, stats=stats, expect_rows=expect_rows
         )
 
+        page = []
         stop_incremental = False
         for r in batch:
             r_at_utc = to_aware_utc(r.get("at"))
             if since_dt is not None and r_at_utc is not None and r_at_utc <= since_dt:
                 stop_incremental = True
                 break
-            out.append(r)
+            page.append(r)
 
-        if stop_incremental or token is None:
+        if page:
+            fetched += len(page)
+            yield page, token
+
+        # google-play-scraper selalu mengembalikan objek token; habis = token.token None
+        if stop_incremental or not batch or token is None or token.token is None:
             break
 
-    logger.info(f"Fetched {len(out)} rows.")
-    return out
+    logger.info(f"Fetched {fetched} rows for app_id={app_id} lang={lang} country={country}.")
+
+def fetch_reviews(app_id: str, lang: str, country: str, sort: str, max_count: int, since_iso: str = None, gate=None):
+    """Versi list dari iter_review_pages (semua hasil di memory; untuk pemakaian ad-hoc)."""
+    return [r for page, _ in iter_review_pages(app_id, lang, country, sort, max_count, since_iso, gate) for r in page]
+
+_END = object()
+
+def prefetch(pages, pool, depth: int = 1, stop=None, notify=None):
+    """
+    Jalankan generator `pages` di worker `pool` dan yield hasilnya di thread pemanggil.
+    Buffer maksimal `depth` halaman, jadi halaman berikutnya di-fetch selama halaman
+    sekarang diproses, tapi memory tetap terbatas beberapa halaman saja.
+    `notify()` dipanggil setiap satu item (halaman / akhir / error) masuk buffer, jadi
+    pemanggil tahu next() berikutnya tidak akan blocking.
+    `stop` (threading.Event) melepas producer dari luar: close() pada generator yang belum
+    pernah di-next() tidak menjalankan finally-nya, jadi pemanggil harus set() sendiri saat gagal.
+    """
+    buf = queue.Queue(maxsize=max(1, depth))
+    stop = stop if stop is not None else threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buf.put(item, timeout=0.5)
+                if notify is not None:
+                    notify()
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+            put(_END)
+        except BaseException as e:  # diteruskan ke consumer
+            put(e)
+        finally:
+            pages.close()
+
+    def consume():
+        try:
+            while True:
+                item = buf.get()
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()  # consumer berhenti lebih awal -> lepas producer
+
+    # producer langsung jalan (bukan menunggu next() pertama)
+    pool.submit(produce)
+    return consume()
 
 # -----------------------------
 # Mapping
@@ -127,65 +342,335 @@ def map_record(r: dict, lang: str, country: str, app_id: str):
         "_fivetran_synced": datetime.utcnow().replace(tzinfo=timezone.utc).isoformat(),
     }
 
+# -----------------------------
+# Change detection
+# -----------------------------
+# Field yang bisa berubah setelah review dibuat; kalau semuanya sama, upsert di-skip.
+MUTABLE_FIELDS = ("content", "score", "thumbs_up_count", "reply_content", "replied_at")
+
+KEY_BYTES, FINGERPRINT_BYTES = 8, 6
+DEFAULT_FINGERPRINT_CACHE_SIZE = 5000  # = count default per sync; tiap entry ~19 byte di state
+
+def _short_hash(text: str, size: int):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=size).hexdigest()
+
+def fingerprint(rec: dict):
+    """Hash pendek dari field mutable sebuah record hasil map_record."""
+    return _short_hash(json.dumps([rec.get(k) for k in MUTABLE_FIELDS], default=str), FINGERPRINT_BYTES)
+
+class FingerprintCache:
+    """
+    LRU review_id -> fingerprint, disimpan di state per target. Entry paling lama tidak
+    terlihat di-evict begitu jumlahnya melewati max_size.
+    State ditulis di setiap checkpoint, jadi dump() mengemas semua entry jadi satu string
+    base64 (key + fingerprint biner, urutan LRU) alih-alih dict JSON hex (~1.8x lebih kecil).
+    State lama berbentuk dict tetap bisa dibaca.
+    """
+    RECORD_BYTES = KEY_BYTES + FINGERPRINT_BYTES
+
+    def __init__(self, data=None, max_size: int = DEFAULT_FINGERPRINT_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict(self._load(data))
+        self._evict()
+
+    @classmethod
+    def _load(cls, data):
+        if not data:
+            return {}
+        if isinstance(data, dict):
+            return data
+        try:
+            raw = base64.b64decode(data, validate=True)
+        except (ValueError, TypeError):
+            logger.warning("Fingerprint cache di state tidak valid, mulai kosong")
+            return {}
+        n = cls.RECORD_BYTES
+        return [(raw[i:i + KEY_BYTES].hex(), raw[i + KEY_BYTES:i + n].hex())
+                for i in range(0, len(raw) - n + 1, n)]
+
+    def _evict(self):
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def unchanged(self, rec: dict):
+        """True kalau review ini sudah pernah di-upsert dengan isi yang sama."""
+        key = _short_hash(str(rec.get("review_id")), KEY_BYTES)
+        if self._items.get(key) == fingerprint(rec):
+            self._items.move_to_end(key)
+            return True
+        return False
+
+    def remember(self, rec: dict):
+        key = _short_hash(str(rec.get("review_id")), KEY_BYTES)
+        self._items[key] = fingerprint(rec)
+        self._items.move_to_end(key)
+        self._evict()
+
+    def dump(self):
+        return base64.b64encode(b"".join(
+            bytes.fromhex(k) + bytes.fromhex(v) for k, v in self._items.items()
+        )).decode("ascii")
+
+# -----------------------------
+# Targets
+# -----------------------------
+def parse_targets(configuration):
+    """
+    Baca daftar target dari configuration['targets'] (JSON string: list objek
+    app_id/lang/country/sort/count). Field yang kosong ambil default dari config level atas.
+    Tanpa 'targets', fallback ke satu target dari app_id/lang/country/sort/count.
+    """
+    defaults = {
+        "app_id":  configuration.get("app_id", "com.telkomsel.telkomselcm"),
+        "lang":    configuration.get("lang", "id"),
+        "country": configuration.get("country", "id"),
+        "sort":    configuration.get("sort", "NEWEST"),  # NEWEST | RATING | HELPFUL | MOST_RELEVANT
+        "count":   configuration.get("count", "100"),
+    }
+    raw = configuration.get("targets")
+    items = json.loads(raw) if raw else [{}]
+
+    targets, seen = [], set()
+    for item in items:
+        t = {k: str(item.get(k) or v) for k, v in defaults.items()}
+        t["count"] = int(t["count"])
+        t["state_key"] = f"{t['app_id']}|{t['lang']}|{t['country']}|{t['sort']}"
+        if t["state_key"] in seen:
+            logger.warning(f"Duplicate target skipped: {t['state_key']}")
+            continue
+        seen.add(t["state_key"])
+        targets.append(t)
+    if not targets:
+        # targets='[]' -> tidak ada yang bisa di-sync (dan pool worker tidak bisa dibuat dengan 0 thread)
+        raise ValueError("Configuration 'targets' kosong: isi minimal satu target atau hapus key 'targets'")
+    return targets
+
+def open_target(target: dict, state: dict, pool, gates: dict, depth: int, cache_size: int, limiter=None, retry=None, ready=None):
+    """
+    Siapkan context sync satu target + mulai prefetch halamannya di pool.
+    Kalau state punya 'cursor' (sync sebelumnya terputus), lanjutkan dari continuation
+    token + counter di checkpoint itu, bukan dari halaman pertama.
+    `ready` (queue.Queue) menerima state_key target setiap ada halaman siap diproses.
+    """
+    prev = state.get(target["state_key"])
+    prev = prev if isinstance(prev, dict) else {}
+    last_at_iso = prev.get("last_at_iso")
+    cursor = prev.get("cursor") if isinstance(prev.get("cursor"), dict) else {}
+    token = load_token(cursor.get("token"))
+    if cursor:
+        logger.info(f"[{target['state_key']}] Resume dari checkpoint: pages={cursor.get('pages')} processed={cursor.get('processed')}")
+
+    fetch_stats = {"retries": 0}  # diisi worker thread
+    stop = threading.Event()
+    pages = iter_review_pages(
+        target["app_id"], target["lang"], target["country"], target["sort"], target["count"],
+        since_iso=last_at_iso, gate=gates.get(target["app_id"]),
+        token=token, fetched=int(cursor.get("fetched", 0)) if token is not None else 0,
+        limiter=limiter, retry=retry, stats=fetch_stats,
+        expect_rows=bool(last_at_iso or prev.get("processed") or prev.get("fingerprints"))
+    )
+    ctx = {
+        "target": target,
+        "pages": prefetch(pages, pool, depth, stop,
+                          notify=(lambda: ready.put(target["state_key"])) if ready is not None else None),
+        "stop": stop,
+        "last_at_iso": last_at_iso,
+        "newest_iso": last_at_iso,  # track newest for state
+        "token": None,
+        "fetched": 0,
+        "pages_done": 0,
+        "processed": 0,
+        "skipped": 0,
+        "errors": 0,
+        "fingerprints": FingerprintCache(prev.get("fingerprints"), cache_size),
+        "fetch_stats": fetch_stats,
+    }
+    if token is not None:
+        ctx.update(
+            token=token,
+            fetched=int(cursor.get("fetched", 0)),
+            pages_done=int(cursor.get("pages", 0)),
+            processed=int(cursor.get("processed", 0)),
+            skipped=int(cursor.get("skipped", 0)),
+            errors=int(cursor.get("errors", 0)),
+            newest_iso=cursor.get("newest_iso") or last_at_iso,
+        )
+    return ctx
+
+def target_state(ctx: dict, done: bool):
+    """
+    Entry state untuk satu target.
+    - done=True : sync selesai -> majukan last_at_iso, hapus cursor.
+    - done=False: checkpoint tengah jalan -> last_at_iso tetap (watermark lama),
+      cursor menyimpan continuation token, newest sementara & counter.
+    """
+    entry = {
+        "last_at_iso": (ctx["newest_iso"] or ctx["last_at_iso"]) if done else ctx["last_at_iso"],
+        "last_run_utc": datetime.utcnow().replace(tzinfo=timezone.utc).isoformat(),
+        "processed": ctx["processed"],
+        "skipped": ctx["skipped"],
+        "errors": ctx["errors"],
+        "retries": ctx["fetch_stats"]["retries"],
+        "fingerprints": ctx["fingerprints"].dump(),
+    }
+    if not done and ctx["token"] is not None:
+        entry["cursor"] = {
+            "token": dump_token(ctx["token"]),
+            "newest_iso": ctx["newest_iso"],
+            "fetched": ctx["fetched"],
+            "pages": ctx["pages_done"],
+            "processed": ctx["processed"],
+            "skipped": ctx["skipped"],
+            "errors": ctx["errors"],
+        }
+    return entry
+
+def emit_page(ctx: dict, page: list, token):
+    """
+    Map + upsert satu halaman review milik target `ctx`, lalu catat posisi token-nya.
+    Review yang fingerprint field mutable-nya tidak berubah di-skip (tidak di-upsert).
+    """
+    t = ctx["target"]
+    for r in page:
+        try:
+            rec = map_record(r, t["lang"], t["country"], t["app_id"])
+            if ctx["fingerprints"].unchanged(rec):
+                ctx["skipped"] += 1
+                continue
+            op.upsert(table="playstore_reviews", data=rec)
+            ctx["fingerprints"].remember(rec)
+            ctx["processed"] += 1
+
+            # Track newest timestamp (ISO string) - gunakan 'reviewed_at' bukan 'at'
+            if rec.get("reviewed_at"):
+                if ctx["newest_iso"] is None or rec["reviewed_at"] > ctx["newest_iso"]:
+                    ctx["newest_iso"] = rec["reviewed_at"]
+        except Exception as e:
+            ctx["errors"] += 1
+            logger.exception(f"Failed upsert for review_id={r.get('reviewId')}: {e}")
+
+    ctx["token"] = token
+    ctx["fetched"] += len(page)
+    ctx["pages_done"] += 1
+
 # -----------------------------
 # Entry point untuk Fivetran
 # -----------------------------
 def update(configuration, state):
     """
-    - Baca config (app_id, lang, country, count, sort) -> SEMUA STRING di configuration.json.
-    - Incremental: gunakan state['...']['last_at_iso'] untuk stop di batch berikutnya.
-    - Upsert ke table 'playstore_reviews'.
+    - Baca config -> SEMUA STRING di configuration.json:
+      targets (JSON list app_id/lang/country/sort/count) atau app_id/lang/country/count/sort tunggal,
+      max_workers (worker paralel total), max_concurrency_per_app (request paralel per app_id),
+      prefetch_pages (jumlah halaman yang di-buffer per target),
+      checkpoint_pages / checkpoint_seconds (interval checkpoint state tengah sync),
+      fingerprint_cache_size (jumlah fingerprint review yang disimpan per target),
+      rate_per_sec / min_rate_per_sec / max_rate_per_sec / slow_response_seconds (rate limiter adaptif),
+      max_retries / backoff_base_seconds / backoff_max_seconds / empty_page_retries (retry per halaman).
+    - Fetch semua target paralel dan streaming per halaman: halaman berikutnya di-fetch selama
+      halaman sekarang di-map & upsert. Halaman diproses sesuai urutan siap (target lambat tidak
+      menahan target lain); urutan halaman dalam satu target tetap terjaga.
+    - Target yang gagal fetch tidak menghentikan target lain; setelah semua selesai state
+      di-checkpoint lalu sync di-raise gagal supaya error tidak tertutup status sukses.
+    - Incremental: gunakan state['<state_key>']['last_at_iso'] untuk stop di batch berikutnya (sort NEWEST).
+    - Checkpoint berkala (op.checkpoint) menyimpan continuation token per target di
+      state['<state_key>']['cursor']; sync yang terputus lanjut dari halaman terakhir yang sudah di-upsert.
+    - Upsert ke table 'playstore_reviews', hanya untuk review baru / yang isinya berubah.
+    - Counter rate limiter (retries, throttle waits, pages/sec) ditulis ke state['_fetch_stats'].
     """
     logger.info("=== START FIVETRAN SYNC (Play Store Reviews) ===")
     logger.info(f"Incoming state: {state}")
     logger.info(f"Configuration keys: {list(configuration.keys())}")
 
     # --- Read config (semua STRING) ---
-    app_id  = configuration.get("app_id", "com.telkomsel.telkomselcm")
-    lang    = configuration.get("lang", "id")
-    country = configuration.get("country", "id")
-    count   = int(configuration.get("count", "100"))
-    sort    = configuration.get("sort", "NEWEST")  # NEWEST | RATING | HELPFUL | MOST_RELEVANT
+    targets = parse_targets(configuration)
+    max_workers = max(1, int(configuration.get("max_workers", "4")))
+    per_app = max(1, int(configuration.get("max_concurrency_per_app", "2")))
+    gates = {t["app_id"]: threading.BoundedSemaphore(per_app) for t in targets}
+    depth = max(1, int(configuration.get("prefetch_pages", "1")))
+    ckpt_pages = max(1, int(configuration.get("checkpoint_pages", "25")))
+    ckpt_seconds = float(configuration.get("checkpoint_seconds", "60"))
+    cache_size = max(0, int(configuration.get("fingerprint_cache_size", str(DEFAULT_FINGERPRINT_CACHE_SIZE))))
+    limiter = AdaptiveRateLimiter(
+        rate=float(configuration.get("rate_per_sec", "2")),
+        min_rate=float(configuration.get("min_rate_per_sec", "0.2")),
+        max_rate=float(configuration.get("max_rate_per_sec", "10")),
+        slow_seconds=float(configuration.get("slow_response_seconds", "5")),
+    )
+    retry = build_retry(configuration)
+    sync_started = time.monotonic()
+    logger.info(f"Targets={len(targets)} max_workers={max_workers} max_concurrency_per_app={per_app} prefetch_pages={depth}")
 
-    # Incremental marker per app/locale key
     state = state or {}
-    state_key = f"{app_id}|{lang}|{country}|{sort}"
-    last_at_iso = None
-    if isinstance(state.get(state_key), dict):
-        last_at_iso = state[state_key].get("last_at_iso")
-
-    # --- Fetch ---
-    rows = fetch_reviews(app_id, lang, country, sort, count, since_iso=last_at_iso)
-
-    # --- Upsert per row ---
-    processed, errors = 0, 0
-    newest_iso = last_at_iso  # track newest for state
-    for r in rows:
+    new_state = dict(state)
+
+    # --- Fetch -> map -> upsert (streaming per halaman) ---
+    # Maksimal max_workers target aktif; tiap target di-prefetch di worker dan memberi
+    # tahu lewat `ready` setiap halamannya siap -> halaman diambil dari target mana pun yang
+    # siap duluan, bukan round-robin (round-robin membuat target cepat menunggu target lambat).
+    pending = list(targets)
+    active = []
+    ready = queue.Queue()
+    failed = []  # (state_key, exception)
+
+    def checkpoint():
+        snapshot = dict(new_state)
+        for c in active:
+            snapshot[c["target"]["state_key"]] = target_state(c, done=False)
+        snapshot["_fetch_stats"] = limiter.stats(time.monotonic() - sync_started)
+        op.checkpoint(state=snapshot)
+
+    pages_since_ckpt, last_ckpt = 0, time.monotonic()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(targets))) as pool:
         try:
-            rec = map_record(r, lang, country, app_id)
-            op.upsert(table="playstore_reviews", data=rec)
-            processed += 1
+            while pending or active:
+                while pending and len(active) < max_workers:
+                    active.append(open_target(pending.pop(0), state, pool, gates, depth, cache_size, limiter, retry, ready))
 
-            # Track newest timestamp (ISO string) - gunakan 'reviewed_at' bukan 'at'
-            if rec.get("reviewed_at"):
-                if newest_iso is None or rec["reviewed_at"] > newest_iso:
-                    newest_iso = rec["reviewed_at"]
-        except Exception as e:
-            errors += 1
-            logger.exception(f"Failed upsert for review_id={r.get('reviewId')}: {e}")
+                # satu notifikasi = satu item di buffer target itu -> next() di bawah tidak blocking
+                state_key = ready.get()
+                ctx = next(c for c in active if c["target"]["state_key"] == state_key)
+                try:
+                    page = next(ctx["pages"])
+                except StopIteration:
+                    active.remove(ctx)
+                    logger.info(f"[{state_key}] Processed={ctx['processed']}, Skipped={ctx['skipped']}, Errors={ctx['errors']}")
 
-    logger.info(f"Processed={processed}, Errors={errors}")
+                    # --- Update state (incremental) ---
+                    new_state[state_key] = target_state(ctx, done=True)
+                    continue
+                except Exception as e:
+                    # simpan posisi terakhir yang sudah di-upsert (kalau ada), target lain tetap jalan
+                    active.remove(ctx)
+                    if ctx["token"] is not None:
+                        new_state[state_key] = target_state(ctx, done=False)
+                    logger.exception(f"Fetch failed for {state_key}: {e}")
+                    failed.append((state_key, e))
+                    continue
 
-    # --- Update state (incremental) ---
-    new_state = dict(state)
-    new_state[state_key] = {
-        "last_at_iso": newest_iso or last_at_iso,
-        "last_run_utc": datetime.utcnow().replace(tzinfo=timezone.utc).isoformat(),
-        "processed": processed,
-        "errors": errors
-    }
+                page, token = page
+                emit_page(ctx, page, token)
 
+                # --- Checkpoint berkala (tiap N halaman / N detik) ---
+                pages_since_ckpt += 1
+                if pages_since_ckpt >= ckpt_pages or time.monotonic() - last_ckpt >= ckpt_seconds:
+                    checkpoint()
+                    pages_since_ckpt, last_ckpt = 0, time.monotonic()
+        finally:
+            # exception di loop (checkpoint / emit_page) -> lepas producer dulu; kalau tidak,
+            # shutdown(wait=True) pool menunggu worker yang terus mencoba put() selamanya
+            for ctx in active:
+                ctx["stop"].set()
+
+    new_state["_fetch_stats"] = limiter.stats(time.monotonic() - sync_started)
+    logger.info(f"Fetch stats: {new_state['_fetch_stats']}")
     logger.info(f"New state: {new_state}")
+    op.checkpoint(state=new_state)
+
+    # state target yang sukses sudah tersimpan; yang gagal resume dari cursor di sync berikutnya
+    if failed:
+        keys = ", ".join(k for k, _ in failed)
+        raise RuntimeError(f"Fetch failed for {len(failed)}/{len(targets)} target(s): {keys}") from failed[0][1]
+
     logger.info("=== END FIVETRAN SYNC ===")
     return new_state
 
@@ -0,0 +1,439 @@
+# benchmark_rag.py
+# ============================================
+# Offline load-test untuk jalur RAG di sigma.py
+# snowflake.core.Root (Cortex Search), snowflake.cortex.complete & embed_text_768 diganti
+# fake lokal dengan latency / token rate yang bisa diatur, lalu N sesi analis disimulasikan
+# bersamaan lewat RAG.query_stream (atau cached_query_stream).
+#
+# Contoh:
+#   python INTELEGENT/benchmark_rag.py                                  # preset sesi 1/8/32
+#   python INTELEGENT/benchmark_rag.py --sessions 16 --k 4 10 20 --context-budget 500 2000
+#   python INTELEGENT/benchmark_rag.py --path cached --repeat-rate 0.5 --json hasil.json
+# ============================================
+import argparse
+import csv
+import functools
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import resource
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SEED_CSV = os.path.join(HERE, "..", "data_googleplay_scraping.csv")
+
+FALLBACK_TEXTS = [
+    "Competitor had better devices", "Competitor made better offer", "Attitude of support person",
+    "Network reliability", "Price too high", "Product dissatisfaction", "Long distance charges",
+    "Service dissatisfaction", "Lack of self-service on Website", "Limited range of services",
+]
+QUESTIONS = [
+    "apa alasan churn terbesar?",
+    "bandingkan churn dan sentimen per kota",
+    "kenapa pelanggan pindah ke kompetitor?",
+    "bagaimana pengaruh harga terhadap churn?",
+    "apa keluhan utama soal jaringan?",
+    "bandingkan support dan jaringan per segmen",
+    "apa yang bikin pelanggan tidak puas dengan layanan?",
+    "seberapa sering keluhan biaya tambahan muncul?",
+]
+
+# -----------------------------
+# Shim modul (hanya kalau dependency belum ter-install)
+# -----------------------------
+class _Chain:
+    """Objek dummy: atribut apa pun mengembalikan string path-nya (untuk SpanAttributes)."""
+    def __init__(self, path="x"):
+        self._path = path
+
+    def __getattr__(self, name):
+        return _Chain(f"{self._path}.{name}")
+
+    def __str__(self):
+        return self._path
+
+    __repr__ = __str__
+
+    def __hash__(self):
+        return hash(self._path)
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+
+def _module(name, **attrs):
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    sys.modules[name] = mod
+    return mod
+
+
+def install_shims():
+    """Sediakan modul minimal supaya sigma.py bisa di-import di mesin tanpa Streamlit/Snowflake/TruLens."""
+    try:
+        import streamlit  # noqa: F401
+    except ImportError:
+        def _cache(func=None, **_kwargs):
+            # Semantik seperti st.cache_resource: satu objek per kombinasi argumen, lintas sesi
+            if func is None:
+                return _cache
+            return functools.lru_cache(maxsize=None)(func)
+
+        _module("streamlit", cache_resource=_cache, cache_data=_cache)
+
+    try:
+        import snowflake.snowpark.context  # noqa: F401
+    except ImportError:
+        _module("snowflake")
+        _module("snowflake.snowpark")
+        _module("snowflake.snowpark.context", get_active_session=lambda: FakeSession())
+        _module("snowflake.snowpark.session", Session=object)
+
+    try:
+        import snowflake.core  # noqa: F401
+    except ImportError:
+        _module("snowflake.core", Root=None)
+
+    try:
+        import snowflake.cortex  # noqa: F401
+    except ImportError:
+        _module("snowflake.cortex", complete=None, embed_text_768=None)
+
+    try:
+        import trulens.core.otel.instrument  # noqa: F401
+        import trulens.otel.semconv.trace  # noqa: F401
+    except ImportError:
+        def instrument(*_args, **_kwargs):
+            return lambda func: func
+
+        _module("trulens")
+        _module("trulens.core")
+        _module("trulens.core.otel")
+        _module("trulens.core.otel.instrument", instrument=instrument)
+        _module("trulens.otel")
+        _module("trulens.otel.semconv")
+        _module("trulens.otel.semconv.trace", SpanAttributes=_Chain("SpanAttributes"))
+
+# -----------------------------
+# Korpus
+# -----------------------------
+def load_corpus(path: str, files: int, chunk_size: int = 100, overlap: int = 25):
+    """
+    Dokumen sintetis dari teks bebas CSV (CHURN_REASON / content), dipotong seperti
+    SPLIT_TEXT_RECURSIVE_CHARACTER(…, 100, 25) di setup_rag_cortex_search.sql.
+    Return list dict {file_name, chunk_index, chunk}.
+    """
+    texts = []
+    if path and os.path.exists(path):
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            field = next((c for c in ("content", "CONTENT", "CHURN_REASON") if c in (reader.fieldnames or [])), None)
+            if field:
+                texts = [row[field] for row in reader if row.get(field)]
+    texts = texts or list(FALLBACK_TEXTS)
+
+    rng = random.Random(0)
+    chunks = []
+    for i in range(files):
+        doc = ". ".join(rng.choice(texts) for _ in range(60)) + "."
+        step = chunk_size - overlap
+        for j, start in enumerate(range(0, max(len(doc) - overlap, 1), step)):
+            chunks.append({"file_name": f"doc_{i:03d}.pdf", "chunk_index": j, "chunk": doc[start:start + chunk_size]})
+    return chunks
+
+# -----------------------------
+# Fakes
+# -----------------------------
+class Counters:
+    """Hitungan panggilan backend (thread-safe)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {"root_built": 0, "search": 0, "complete": 0, "embed": 0, "prompt_tokens": 0}
+
+    def add(self, key, n=1):
+        with self._lock:
+            self.values[key] += n
+
+
+def _words(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+class FakeSearchService:
+    """Pengganti cortex_search_services[...]: ranking overlap kata + latency per search."""
+    def __init__(self, corpus, latency_ms, jitter_ms, counters, seed=0):
+        self._corpus = [(row, _words(row["chunk"])) for row in corpus]
+        self._latency_ms = latency_ms
+        self._jitter_ms = jitter_ms
+        self._counters = counters
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def search(self, query, columns, limit):
+        with self._lock:
+            jitter = self._rng.uniform(-1, 1)
+        time.sleep(max(0.0, self._latency_ms + jitter * self._jitter_ms) / 1000)
+        self._counters.add("search")
+        q = _words(query)
+        ranked = sorted(self._corpus, key=lambda rw: (-len(q & rw[1]), rw[0]["file_name"], rw[0]["chunk_index"]))
+        results = [{c: row.get(c) for c in columns} for row, _ in ranked[:limit]]
+        return types.SimpleNamespace(results=results)
+
+
+class _Index(dict):
+    def __init__(self, factory):
+        super().__init__()
+        self._factory = factory
+
+    def __missing__(self, key):
+        value = self[key] = self._factory(key)
+        return value
+
+
+class FakeRoot:
+    """Pengganti snowflake.core.Root: databases[db].schemas[schema].cortex_search_services[name]."""
+    service = None
+    counters = None
+
+    def __init__(self, session):
+        FakeRoot.counters.add("root_built")
+        self.databases = _Index(lambda db: types.SimpleNamespace(
+            schemas=_Index(lambda schema: types.SimpleNamespace(
+                cortex_search_services=_Index(lambda name: FakeRoot.service)))))
+
+
+class FakeSession:
+    def sql(self, query):
+        # DESCRIBE CORTEX SEARCH SERVICE -> target_lag / data_timestamp / columns
+        row = types.SimpleNamespace(as_dict=lambda: {
+            "target_lag": "1 hour", "data_timestamp": "2025-01-01 00:00:00",
+            "columns": "file_name,chunk_index,chunk",
+        })
+        return types.SimpleNamespace(collect=lambda: [row])
+
+
+def make_complete(ttft_ms, prefill_ms_per_1k, tokens_per_s, answer_tokens, counters, chars_per_token=4):
+    """
+    Pengganti snowflake.cortex.complete(stream=True): TTFT = ttft_ms + prefill per 1k token prompt,
+    lalu answer_tokens token dengan laju tokens_per_s.
+    """
+    def complete(model, prompt, stream=False, **_kwargs):
+        prompt_tokens = len(prompt) // chars_per_token
+        counters.add("complete")
+        counters.add("prompt_tokens", prompt_tokens)
+
+        def gen():
+            time.sleep((ttft_ms + prefill_ms_per_1k * prompt_tokens / 1000) / 1000)
+            interval = 1.0 / tokens_per_s if tokens_per_s > 0 else 0.0
+            for i in range(answer_tokens):
+                if i and interval:
+                    time.sleep(interval)
+                yield {"response": f"tok{i} "}
+
+        return gen() if stream else "".join(t["response"] for t in gen())
+
+    return complete
+
+
+def make_embed(latency_ms, counters, dim=768):
+    """Pengganti embed_text_768: bag-of-words di-hash ke vektor (pertanyaan mirip -> cosine tinggi)."""
+    def embed_text_768(model, text, session=None):
+        time.sleep(latency_ms / 1000)
+        counters.add("embed")
+        vec = [0.0] * dim
+        for w in re.findall(r"\w+", text.lower()):
+            vec[int(hashlib.md5(w.encode("utf-8")).hexdigest(), 16) % dim] += 1.0
+        return vec
+
+    return embed_text_768
+
+# -----------------------------
+# Runner
+# -----------------------------
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    lo, hi = int(pos), min(int(pos) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def run_scenario(scenario: dict):
+    """Jalankan satu skenario di proses ini (dipanggil di child process -> peak RSS terpisah)."""
+    install_shims()
+    sys.path.insert(0, HERE)
+    import sigma
+
+    counters = Counters()
+    FakeRoot.counters = counters
+    FakeRoot.service = FakeSearchService(
+        load_corpus(scenario["seed_csv"], scenario["files"]),
+        scenario["search_latency_ms"], scenario["search_jitter_ms"], counters, scenario["seed"],
+    )
+    sigma.Root = FakeRoot
+    sigma.get_active_session = lambda: FakeSession()
+    sigma.complete = make_complete(
+        scenario["ttft_ms"], scenario["prefill_ms_per_1k"], scenario["tokens_per_s"],
+        scenario["answer_tokens"], counters,
+    )
+    sigma.embed_text_768 = make_embed(scenario["embed_latency_ms"], counters)
+    sigma.LATENCY_LOG_PATH = os.devnull
+
+    rng = random.Random(scenario["seed"])
+    workload = []
+    for s in range(scenario["sessions"]):
+        qs = []
+        for r in range(scenario["requests"]):
+            if qs and rng.random() < scenario["repeat_rate"]:
+                qs.append(rng.choice(QUESTIONS))                      # pertanyaan populer
+            else:
+                qs.append(f"{rng.choice(QUESTIONS)} (sesi {s} #{r})")  # pertanyaan unik
+        workload.append(qs)
+
+    def session_worker(questions):
+        records = []
+        for q in questions:
+            rag = sigma.build_rag(
+                sigma.DEFAULT_DB, sigma.DEFAULT_SCHEMA, sigma.DEFAULT_SERVICE,
+                sigma.get_search_columns(sigma.DEFAULT_DB, sigma.DEFAULT_SCHEMA, sigma.DEFAULT_SERVICE),
+                scenario["k"], sigma.DEFAULT_MODEL,
+                use_semantic_cache=scenario["path"] == "cached",
+                context_budget=scenario["context_budget"] or None,
+                multi_query=scenario["multi_query"],
+            )
+            started = time.perf_counter()
+            if scenario["path"] == "cached":
+                ctx, stream, _ = rag.cached_query_stream(q)
+            else:
+                ctx, stream = rag.query_stream(q)
+            first, tokens = None, 0
+            for _ in stream:
+                if first is None:
+                    first = time.perf_counter()
+                tokens += 1
+            done = time.perf_counter()
+            records.append({
+                "retrieval_s": rag.timings.get("retrieval_s"),
+                "ttft_s": (first - started) if first else None,
+                "total_s": done - started,
+                "tokens": tokens,
+                "contexts": len(ctx),
+                "context_chars": sum(len(c) for c in ctx),
+            })
+        return records
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=scenario["sessions"]) as pool:
+        records = list(itertools.chain.from_iterable(pool.map(session_worker, workload)))
+    elapsed = time.perf_counter() - started
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def pct(key, q):
+        v = _percentile([r[key] for r in records if r[key] is not None], q)
+        return round(v, 3) if v is not None else None
+
+    return {
+        "sessions": scenario["sessions"],
+        "k": scenario["k"],
+        "context_budget": scenario["context_budget"],
+        "path": scenario["path"],
+        "multi_query": scenario["multi_query"],
+        "requests": len(records),
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(len(records) / elapsed, 2) if elapsed > 0 else None,
+        "retrieval_p50_s": pct("retrieval_s", 50),
+        "retrieval_p95_s": pct("retrieval_s", 95),
+        "ttft_p50_s": pct("ttft_s", 50),
+        "ttft_p95_s": pct("ttft_s", 95),
+        "total_p50_s": pct("total_s", 50),
+        "total_p95_s": pct("total_s", 95),
+        "avg_context_chars": round(sum(r["context_chars"] for r in records) / max(len(records), 1)),
+        "avg_prompt_tokens": round(counters.values["prompt_tokens"] / max(counters.values["complete"], 1)),
+        "peak_rss_mb": round(rss_peak / 1024, 1),  # Linux: ru_maxrss dalam KB
+        "rss_per_session_kb": round((rss_peak - rss_before) / scenario["sessions"], 1),
+        "backend_calls": dict(counters.values),
+    }
+
+
+def print_report(results: list):
+    header = (f"{'sess':>4} {'k':>3} {'budget':>6} {'path':>6} {'req':>5} {'req/s':>7} {'retr p50':>8} {'retr p95':>8} "
+              f"{'ttft p50':>8} {'ttft p95':>8} {'tot p50':>8} {'tot p95':>8} {'prompt tok':>10} {'KB/sess':>8} "
+              f"{'search':>6} {'gen':>5}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        calls = r["backend_calls"]
+        print(f"{r['sessions']:>4} {r['k']:>3} {r['context_budget'] or '-':>6} {r['path']:>6} {r['requests']:>5} "
+              f"{r['req_per_s']:>7} {r['retrieval_p50_s']!s:>8} {r['retrieval_p95_s']!s:>8} "
+              f"{r['ttft_p50_s']!s:>8} {r['ttft_p95_s']!s:>8} {r['total_p50_s']!s:>8} {r['total_p95_s']!s:>8} "
+              f"{r['avg_prompt_tokens']:>10} {r['rss_per_session_kb']:>8} {calls['search']:>6} {calls['complete']:>5}")
+    print("KB/sess = pertumbuhan peak RSS proses dibagi jumlah sesi; search/gen = panggilan backend fake.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load-test jalur RAG sigma.py (tanpa Snowflake).")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32], help="sesi analis bersamaan")
+    parser.add_argument("--requests", type=int, default=5, help="pertanyaan per sesi")
+    parser.add_argument("--k", type=int, nargs="+", default=[4], help="Top-K retrieval")
+    parser.add_argument("--context-budget", type=int, nargs="+", default=[1000],
+                        help="budget token konteks (0 = tanpa packing)")
+    parser.add_argument("--path", choices=["plain", "cached"], default="plain",
+                        help="plain = RAG.query_stream, cached = cached_query_stream (cache jawaban semantik)")
+    parser.add_argument("--multi-query", action="store_true")
+    parser.add_argument("--repeat-rate", type=float, default=0.3, help="porsi pertanyaan populer yang berulang")
+    parser.add_argument("--files", type=int, default=50, help="jumlah dokumen sintetis di korpus")
+    parser.add_argument("--search-latency-ms", type=float, default=120.0)
+    parser.add_argument("--search-jitter-ms", type=float, default=40.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=60.0)
+    parser.add_argument("--ttft-ms", type=float, default=400.0, help="TTFT dasar complete()")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=150.0, help="tambahan TTFT per 1k token prompt")
+    parser.add_argument("--tokens-per-s", type=float, default=60.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--seed-csv", default=DEFAULT_SEED_CSV)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_out", help="tulis hasil ke file JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for sessions, k, budget in itertools.product(args.sessions, args.k, args.context_budget):
+        scenario = {
+            "sessions": sessions,
+            "requests": args.requests,
+            "k": k,
+            "context_budget": budget,
+            "path": args.path,
+            "multi_query": args.multi_query,
+            "repeat_rate": args.repeat_rate,
+            "files": args.files,
+            "search_latency_ms": args.search_latency_ms,
+            "search_jitter_ms": args.search_jitter_ms,
+            "embed_latency_ms": args.embed_latency_ms,
+            "ttft_ms": args.ttft_ms,
+            "prefill_ms_per_1k": args.prefill_ms_per_1k,
+            "tokens_per_s": args.tokens_per_s,
+            "answer_tokens": args.answer_tokens,
+            "seed_csv": args.seed_csv,
+            "seed": args.seed,
+        }
+        # proses baru per skenario -> cache & peak RSS tidak tercampur skenario sebelumnya
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(run_scenario, scenario).result())
+
+    print_report(results)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
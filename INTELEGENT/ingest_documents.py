@@ -0,0 +1,216 @@
+# ingest_documents.py
+# ============================================
+# Ingest incremental dokumen RAG (stage @TELCO.DATAMART.fomc)
+# Manifest file stage (path, size, md5, last_modified) dibandingkan dengan DIRECTORY():
+# hanya file baru/berubah yang di-PARSE_DOCUMENT + di-chunk ulang, chunk file yang
+# dihapus dari stage ikut dibuang. Cortex Search Service (TARGET_LAG) lalu hanya
+# meng-embed ulang baris chunk yang berubah.
+# ============================================
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# -----------------------------
+# Konfigurasi
+# -----------------------------
+STAGE = "@TELCO.DATAMART.fomc"
+STAGE_NAME = "TELCO.DATAMART.fomc"
+FILE_PATTERN = "%.pdf"
+PARSE_MODE = "LAYOUT"
+CHUNK_FORMAT = "markdown"
+CHUNK_SIZE = 100      # samakan dengan setup_rag_cortex_search.sql
+CHUNK_OVERLAP = 25
+
+MANIFEST_TABLE = "TELCO.DATAMART.TB_C_FOMC_MANIFEST"
+PARSED_TABLE = "TELCO.DATAMART.TB_R_PARSED_FOMC_CONTENT"
+CHUNK_TABLE = "TELCO.DATAMART.TB_F_CHUNKED_FOMC_CONTENT"
+
+DEFAULT_BATCH_FILES = 20
+DEFAULT_PARALLELISM = 4
+
+def _sql_list(values):
+    return ", ".join("'" + str(v).replace("'", "''") + "'" for v in values)
+
+def ensure_tables(session):
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {PARSED_TABLE} (
+        RELATIVE_PATH VARCHAR,
+        PARSED_TEXT   VARCHAR
+      )
+    """).collect()
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {CHUNK_TABLE} (
+        FILE_NAME   VARCHAR,
+        CHUNK_INDEX NUMBER,
+        CHUNK       VARCHAR
+      )
+    """).collect()
+    session.sql(f"""
+      CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+        RELATIVE_PATH VARCHAR PRIMARY KEY RELY,
+        SIZE          NUMBER,
+        MD5           VARCHAR,
+        LAST_MODIFIED TIMESTAMP_TZ,
+        STATUS        VARCHAR,        -- DONE / FAILED
+        CHUNKS        NUMBER,
+        LAST_ERROR    VARCHAR,
+        INGESTED_AT   TIMESTAMP_NTZ
+      )
+    """).collect()
+
+# -----------------------------
+# Manifest & delta
+# -----------------------------
+def stage_delta(session):
+    """
+    Bandingkan DIRECTORY(stage) dengan manifest.
+    Return (to_ingest: list path baru/berubah/gagal sebelumnya, removed: list path hilang dari stage,
+            is_new: set path yang belum pernah ada di manifest).
+    """
+    # Directory table stage perlu di-refresh supaya file yang baru di-PUT ikut terlihat
+    session.sql(f"ALTER STAGE {STAGE_NAME} REFRESH").collect()
+
+    rows = session.sql(f"""
+      SELECT d.RELATIVE_PATH, m.RELATIVE_PATH IS NULL AS IS_NEW
+      FROM DIRECTORY({STAGE}) d
+      LEFT JOIN {MANIFEST_TABLE} m
+        ON m.RELATIVE_PATH = d.RELATIVE_PATH
+      WHERE d.RELATIVE_PATH LIKE '{FILE_PATTERN}'
+        AND (m.RELATIVE_PATH IS NULL
+             OR m.STATUS <> 'DONE'
+             OR m.SIZE <> d.SIZE
+             OR COALESCE(m.MD5, '') <> COALESCE(d.MD5, '')
+             OR m.LAST_MODIFIED <> d.LAST_MODIFIED)
+      ORDER BY d.LAST_MODIFIED DESC
+    """).collect()
+    to_ingest = [r["RELATIVE_PATH"] for r in rows]
+    is_new = {r["RELATIVE_PATH"] for r in rows if r["IS_NEW"]}
+
+    removed = [r["RELATIVE_PATH"] for r in session.sql(f"""
+      SELECT m.RELATIVE_PATH
+      FROM {MANIFEST_TABLE} m
+      LEFT JOIN (SELECT RELATIVE_PATH FROM DIRECTORY({STAGE})) d
+        ON d.RELATIVE_PATH = m.RELATIVE_PATH
+      WHERE d.RELATIVE_PATH IS NULL
+    """).collect()]
+    return to_ingest, removed, is_new
+
+def remove_files(session, paths):
+    """Buang hasil parse, chunk dan entry manifest untuk file yang sudah tidak ada di stage."""
+    if not paths:
+        return
+    in_list = _sql_list(paths)
+    session.sql(f"DELETE FROM {CHUNK_TABLE} WHERE FILE_NAME IN ({in_list})").collect()
+    session.sql(f"DELETE FROM {PARSED_TABLE} WHERE RELATIVE_PATH IN ({in_list})").collect()
+    session.sql(f"DELETE FROM {MANIFEST_TABLE} WHERE RELATIVE_PATH IN ({in_list})").collect()
+
+# -----------------------------
+# Parse + chunk per batch
+# -----------------------------
+def ingest_batch(session, paths):
+    """
+    PARSE_DOCUMENT + chunk untuk satu batch file, lalu catat di manifest.
+    Tiap langkah = delete + insert per path (idempotent), tanpa transaksi eksplisit karena
+    batch jalan paralel di session yang sama; batch yang gagal cukup diulang di run berikutnya.
+    Return jumlah chunk yang ditulis.
+    """
+    in_list = _sql_list(paths)
+    # Parse ke temp table dulu: hasil lama tetap utuh kalau PARSE_DOCUMENT gagal di tengah
+    tmp = f"TMP_FOMC_PARSED_{uuid.uuid4().hex[:12]}"
+    session.sql(f"""
+      CREATE TEMPORARY TABLE {tmp} AS
+      SELECT
+        relative_path AS RELATIVE_PATH,
+        TO_VARCHAR(
+          SNOWFLAKE.CORTEX.PARSE_DOCUMENT({STAGE}, relative_path, {{'mode': '{PARSE_MODE}'}}):content
+        ) AS PARSED_TEXT
+      FROM DIRECTORY({STAGE})
+      WHERE relative_path IN ({in_list})
+    """).collect()
+    try:
+        session.sql(f"DELETE FROM {PARSED_TABLE} WHERE RELATIVE_PATH IN ({in_list})").collect()
+        session.sql(f"INSERT INTO {PARSED_TABLE} (RELATIVE_PATH, PARSED_TEXT) SELECT * FROM {tmp}").collect()
+
+        session.sql(f"DELETE FROM {CHUNK_TABLE} WHERE FILE_NAME IN ({in_list})").collect()
+        chunks = session.sql(f"""
+          INSERT INTO {CHUNK_TABLE} (FILE_NAME, CHUNK_INDEX, CHUNK)
+          SELECT
+            p.RELATIVE_PATH,
+            c.index,
+            c.value
+          FROM {tmp} p,
+            LATERAL FLATTEN(input => SNOWFLAKE.CORTEX.SPLIT_TEXT_RECURSIVE_CHARACTER(
+              p.PARSED_TEXT, '{CHUNK_FORMAT}', {CHUNK_SIZE}, {CHUNK_OVERLAP}
+            )) c
+        """).collect()[0][0]
+
+        session.sql(f"""
+          MERGE INTO {MANIFEST_TABLE} m
+          USING (
+            SELECT
+              d.RELATIVE_PATH, d.SIZE, d.MD5, d.LAST_MODIFIED,
+              (SELECT COUNT(*) FROM {CHUNK_TABLE} c WHERE c.FILE_NAME = d.RELATIVE_PATH) AS CHUNKS
+            FROM DIRECTORY({STAGE}) d
+            WHERE d.RELATIVE_PATH IN ({in_list})
+          ) s
+          ON m.RELATIVE_PATH = s.RELATIVE_PATH
+          WHEN MATCHED THEN UPDATE SET
+            SIZE = s.SIZE, MD5 = s.MD5, LAST_MODIFIED = s.LAST_MODIFIED, STATUS = 'DONE',
+            CHUNKS = s.CHUNKS, LAST_ERROR = NULL, INGESTED_AT = CURRENT_TIMESTAMP()
+          WHEN NOT MATCHED THEN INSERT
+            (RELATIVE_PATH, SIZE, MD5, LAST_MODIFIED, STATUS, CHUNKS, INGESTED_AT)
+            VALUES (s.RELATIVE_PATH, s.SIZE, s.MD5, s.LAST_MODIFIED, 'DONE', s.CHUNKS, CURRENT_TIMESTAMP())
+        """).collect()
+        return chunks
+    finally:
+        session.sql(f"DROP TABLE IF EXISTS {tmp}").collect()
+
+def mark_failed(session, paths, error: str):
+    session.sql(f"""
+      MERGE INTO {MANIFEST_TABLE} m
+      USING (
+        SELECT d.RELATIVE_PATH, d.SIZE, d.MD5, d.LAST_MODIFIED
+        FROM DIRECTORY({STAGE}) d
+        WHERE d.RELATIVE_PATH IN ({_sql_list(paths)})
+      ) s
+      ON m.RELATIVE_PATH = s.RELATIVE_PATH
+      WHEN MATCHED THEN UPDATE SET STATUS = 'FAILED', LAST_ERROR = {_sql_list([error[:4000]])}
+      WHEN NOT MATCHED THEN INSERT (RELATIVE_PATH, SIZE, MD5, LAST_MODIFIED, STATUS, LAST_ERROR)
+        VALUES (s.RELATIVE_PATH, s.SIZE, s.MD5, s.LAST_MODIFIED, 'FAILED', {_sql_list([error[:4000]])})
+    """).collect()
+
+def _batches(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def ingest(session, batch_files: int = DEFAULT_BATCH_FILES, parallelism: int = DEFAULT_PARALLELISM):
+    batch_files = int(batch_files or DEFAULT_BATCH_FILES)
+    parallelism = int(parallelism or DEFAULT_PARALLELISM)
+    ensure_tables(session)
+    to_ingest, removed, is_new = stage_delta(session)
+    remove_files(session, removed)
+    if not to_ingest:
+        return f"NO_CHANGES removed={len(removed)}"
+
+    def run(paths):
+        try:
+            return paths, ingest_batch(session, paths), None
+        except Exception as e:
+            mark_failed(session, paths, str(e))
+            return paths, 0, e
+
+    # PARSE_DOCUMENT per batch sudah paralel di warehouse; beberapa batch jalan bersamaan
+    # supaya batch besar tidak menahan yang lain, dan kegagalan terisolasi per batch
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        results = list(pool.map(run, _batches(to_ingest, batch_files)))
+
+    failed = [p for paths, _, err in results if err is not None for p in paths]
+    stats = {
+        "new": len(is_new),
+        "changed": len(to_ingest) - len(is_new),
+        "removed": len(removed),
+        "chunks": sum(n for _, n, _ in results),
+        "failed_files": len(failed),
+    }
+    return "INGEST_DONE " + " ".join(f"{k}={v}" for k, v in stats.items())
@@ -0,0 +1,625 @@
+# semantic_rollups.py
+# ============================================
+# Rollup TB_RPT_* untuk semantic model Cortex Analyst (telco_datamart.yml)
+# Verified query di YAML dulu selalu scan + join fact penuh (TB_F_CHURN_PREDICTION bertambah tiap hari).
+# Sekarang tiap verified query agregat dijawab dari rollup kecil yang dipartisi per tanggal / bulan:
+# - generator (CLI, lokal) : baca tables + relationships + verified_queries dari YAML, validasi spec rollup
+#                            (kolom & join harus ada di YAML), lalu tulis ulang YAML: tabel logis rollup
+#                            ditambahkan dan SQL verified query diarahkan ke rollup
+# - refresh (SP_REFRESH_REVIEW_MARTS_DWH_TELCO) : stream per (rollup, tabel sumber) -> partisi yang berubah
+#                            saja yang di-DELETE + INSERT ulang; stream hilang / stale / tabel sumber di-SWAP atau
+#                            di-recreate -> rebuild (task harian SP_ENRICH_REVIEWS('full') men-SWAP
+#                            TB_F_REVIEWS_ENRICHED, jadi rollup review dihitung ulang penuh setelah tiap full enrich)
+#
+# Contoh:
+#   python INTELEGENT/semantic_rollups.py           # tulis ulang telco_datamart.yml
+#   python INTELEGENT/semantic_rollups.py --check   # exit 1 kalau YAML belum sinkron dengan spec
+# ============================================
+import argparse
+import os
+import re
+import sys
+import uuid
+
+# -----------------------------
+# Konfigurasi
+# -----------------------------
+DATABASE = "TELCO"
+SCHEMA = "DATAMART"
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "telco_datamart.yml")
+
+DEFAULT_MODE = "incremental"
+# mart lama yang dari dulu dibuat SP_REFRESH_REVIEW_MARTS_DWH_TELCO; tetap dibuat sama persis tiap run
+LEGACY_MARTS_SQL = [
+    f"CREATE OR REPLACE TABLE {DATABASE}.{SCHEMA}.TB_RPT_REVIEWS_YEARLY_NEG_DWH_TELCO AS SELECT 1",
+]
+# partisi untuk baris dengan tanggal NULL (tetap ikut dihitung seperti di query fact)
+NULL_PARTITION = "TO_DATE('1900-01-01')"
+
+# Spec rollup. Asumsi grain (sama dengan SP yang mengisi tabelnya): TB_R_CUSTOMER & TB_R_DATE unik per key,
+# TB_F_REVENUE & TB_F_CUSTOMER_CLUSTER satu baris per customer -> LEFT JOIN tidak menggandakan baris fact,
+# dan flag HAS_* mengembalikan hasil INNER JOIN verified query aslinya.
+# "on" ditulis eksplisit supaya SP tidak butuh YAML; generator mengecek tiap join ke relationships YAML.
+# "streams": tabel yang perubahannya menandai partisi kotor. Sumber dan semua tabel yang di-join ikut di-stream,
+# jadi perubahan dimensi (mis. segmen / kontrak customer) menghitung ulang semua partisi yang memakai baris itu
+# dan rollup tetap sama dengan query fact.
+ROLLUPS = [
+    {
+        "name": "TB_RPT_CHURN_DAILY",
+        "description": ("Daily churn predictions by segment, contract, payment method, tenure bucket and gender. "
+                        "Segment/contract/gender reflect the current customer dimensions. Churn rate = SUM(CHURNED) / SUM(PREDICTIONS); "
+                        "HAS_* flags mark rows that join to revenue/cluster/customer."),
+        "source": ("TB_F_CHURN_PREDICTION", "p"),
+        "joins": [
+            ("TB_F_REVENUE", "r", "LEFT", "p.CUSTOMER_ID = r.CUSTOMER_ID"),
+            ("TB_F_CUSTOMER_CLUSTER", "c", "LEFT", "p.CUSTOMER_ID = c.CUSTOMER_ID"),
+            ("TB_R_CUSTOMER", "cu", "LEFT", "p.CUSTOMER_ID = cu.CUSTOMER_ID"),
+        ],
+        "partition": ("PREDICTION_DATE", "p.PREDICTION_DATE"),
+        "dimensions": [
+            ("CUSTOMER_SEGMENTATION", "c.CUSTOMER_SEGMENTATION", "VARCHAR(100)"),
+            ("CONTRACT_TYPE", "r.CONTRACT_TYPE", "VARCHAR(30)"),
+            ("PAYMENT_METHOD", "r.PAYMENT_METHOD", "VARCHAR(40)"),
+            ("TENURE_BUCKET", """CASE
+                   WHEN r.TENURE_MONTHS < 12 THEN 'Under 1 Year'
+                   WHEN r.TENURE_MONTHS BETWEEN 12 AND 24 THEN '1-2 Years'
+                   WHEN r.TENURE_MONTHS BETWEEN 25 AND 48 THEN '2-4 Years'
+                   ELSE '4+ Years'
+                 END""", "VARCHAR(20)"),
+            ("GENDER", "cu.GENDER", "VARCHAR(10)"),
+            ("HAS_REVENUE", "r.CUSTOMER_ID IS NOT NULL", "BOOLEAN"),
+            ("HAS_CLUSTER", "c.CUSTOMER_ID IS NOT NULL", "BOOLEAN"),
+            ("HAS_CUSTOMER", "cu.CUSTOMER_ID IS NOT NULL", "BOOLEAN"),
+        ],
+        "measures": [
+            ("PREDICTIONS", "COUNT(*)", "NUMBER(18,0)"),
+            ("CHURNED", "SUM(CASE WHEN p.PREDICTION_RESULTS = 'Yes' THEN 1 ELSE 0 END)", "NUMBER(18,0)"),
+            ("CLTV_SUM", "SUM(r.CLTV)", "FLOAT"),
+            ("CLTV_COUNT", "COUNT(r.CLTV)", "NUMBER(18,0)"),
+        ],
+        "streams": ["TB_F_CHURN_PREDICTION", "TB_F_REVENUE", "TB_F_CUSTOMER_CLUSTER", "TB_R_CUSTOMER"],
+    },
+    {
+        "name": "TB_RPT_REVENUE_MONTHLY",
+        "description": ("Revenue and CLTV by month joined and customer segment. Average CLTV = SUM(CLTV_SUM) / SUM(CLTV_COUNT); "
+                        "YEAR/MONTH_NAME come from TB_R_DATE (HAS_DATE)."),
+        "source": ("TB_F_REVENUE", "r"),
+        "joins": [
+            ("TB_F_CUSTOMER_CLUSTER", "c", "LEFT", "r.CUSTOMER_ID = c.CUSTOMER_ID"),
+            # TB_R_DATE tidak punya relationship di YAML (key-nya DATE_ID, bukan CUSTOMER_ID)
+            ("TB_R_DATE", "d", "LEFT", "r.DATE_JOINED = d.DATE_ID"),
+        ],
+        "partition": ("JOIN_MONTH", "DATE_TRUNC('MONTH', r.DATE_JOINED)"),
+        "dimensions": [
+            ("CUSTOMER_SEGMENTATION", "c.CUSTOMER_SEGMENTATION", "VARCHAR(100)"),
+            ("YEAR", "d.YEAR", "NUMBER(4,0)"),
+            ("MONTH_NAME", "d.MONTH_NAME", "VARCHAR(20)"),
+            ("HAS_CLUSTER", "c.CUSTOMER_ID IS NOT NULL", "BOOLEAN"),
+            ("HAS_DATE", "d.DATE_ID IS NOT NULL", "BOOLEAN"),
+        ],
+        "measures": [
+            ("REVENUE_ROWS", "COUNT(*)", "NUMBER(18,0)"),
+            ("CUSTOMERS", "COUNT(DISTINCT r.CUSTOMER_ID)", "NUMBER(18,0)"),
+            ("TOTAL_CHARGES_SUM", "SUM(r.TOTAL_CHARGES)", "FLOAT"),
+            ("CLTV_SUM", "SUM(r.CLTV)", "FLOAT"),
+            ("CLTV_COUNT", "COUNT(r.CLTV)", "NUMBER(18,0)"),
+        ],
+        "streams": ["TB_F_REVENUE", "TB_F_CUSTOMER_CLUSTER", "TB_R_DATE"],
+    },
+    {
+        "name": "TB_RPT_REVENUE_GEO_MONTHLY",
+        "description": "Revenue rows and total charges by month joined and customer state, city and country code.",
+        "source": ("TB_F_REVENUE", "r"),
+        "joins": [
+            ("TB_R_CUSTOMER", "cu", "INNER", "r.CUSTOMER_ID = cu.CUSTOMER_ID"),
+        ],
+        "partition": ("JOIN_MONTH", "DATE_TRUNC('MONTH', r.DATE_JOINED)"),
+        "dimensions": [
+            ("STATE", "cu.STATE", "VARCHAR(50)"),
+            ("CITY", "cu.CITY", "VARCHAR(50)"),
+            ("COUNTRY_CODE", "cu.COUNTRY_CODE", "VARCHAR(10)"),
+        ],
+        "measures": [
+            ("REVENUE_ROWS", "COUNT(*)", "NUMBER(18,0)"),
+            ("TOTAL_CHARGES_SUM", "SUM(r.TOTAL_CHARGES)", "FLOAT"),
+        ],
+        "streams": ["TB_F_REVENUE", "TB_R_CUSTOMER"],
+    },
+    {
+        "name": "TB_RPT_REVIEW_COUNTRY_MONTHLY",
+        "description": ("Review count and sentiment totals by review month and country. "
+                        "Average sentiment = SUM(SENTIMENT_SUM) / SUM(SENTIMENT_COUNT)."),
+        "source": ("TB_F_REVIEWS_ENRICHED", "rv"),
+        "joins": [],
+        "partition": ("REVIEW_MONTH", "DATE_TRUNC('MONTH', TO_DATE(rv.REVIEWED_TS))"),
+        "dimensions": [
+            ("COUNTRY", "rv.COUNTRY", "VARCHAR(256)"),
+        ],
+        "measures": [
+            ("REVIEWS", "COUNT(*)", "NUMBER(18,0)"),
+            ("SENTIMENT_SUM", "SUM(rv.SENTIMENT_SCORE)", "FLOAT"),
+            ("SENTIMENT_COUNT", "COUNT(rv.SENTIMENT_SCORE)", "NUMBER(18,0)"),
+        ],
+        "streams": ["TB_F_REVIEWS_ENRICHED"],
+    },
+]
+
+# Verified query yang dijawab dari rollup (hasil sama dengan SQL lama atas fact; lihat asumsi grain di atas).
+# Query yang tidak ada di sini (cross_sell_opportunities: level baris) tetap ke tabel fact.
+CHURN_RATE_SQL = "ROUND(SUM(churned) * 100.0 / SUM(predictions), 2)"
+ROLLUP_QUERIES = {
+    "churn_by_segment": f"""
+SELECT customer_segmentation,
+       contract_type,
+       {CHURN_RATE_SQL} AS churn_rate
+FROM TB_RPT_CHURN_DAILY
+WHERE has_customer AND has_revenue AND has_cluster
+GROUP BY customer_segmentation, contract_type
+ORDER BY churn_rate DESC
+""",
+    # AVG sentiment & SUM revenue di join review x customer per country = kombinasi bobot dua rollup kecil:
+    # tiap baris revenue dikali jumlah review di country-nya, tiap review dikali jumlah baris revenue
+    "sentiment_vs_revenue": """
+WITH rv AS (
+  SELECT country,
+         SUM(reviews) AS reviews,
+         SUM(sentiment_sum) AS sentiment_sum,
+         SUM(sentiment_count) AS sentiment_count
+  FROM TB_RPT_REVIEW_COUNTRY_MONTHLY
+  GROUP BY country
+), g AS (
+  SELECT state, city, country_code,
+         SUM(revenue_rows) AS revenue_rows,
+         SUM(total_charges_sum) AS total_charges
+  FROM TB_RPT_REVENUE_GEO_MONTHLY
+  GROUP BY state, city, country_code
+)
+SELECT g.state, g.city,
+       ROUND(SUM(g.revenue_rows * rv.sentiment_sum) / NULLIF(SUM(g.revenue_rows * rv.sentiment_count), 0), 2) AS avg_sentiment,
+       ROUND(SUM(g.total_charges * rv.reviews), 2) AS total_revenue
+FROM g
+JOIN rv ON rv.country = g.country_code
+GROUP BY g.state, g.city
+ORDER BY avg_sentiment DESC
+""",
+    "cltv_and_churn": f"""
+SELECT customer_segmentation,
+       ROUND(SUM(cltv_sum) / NULLIF(SUM(cltv_count), 0), 2) AS avg_cltv,
+       {CHURN_RATE_SQL} AS churn_rate
+FROM TB_RPT_CHURN_DAILY
+WHERE has_revenue AND has_cluster
+GROUP BY customer_segmentation
+ORDER BY churn_rate DESC
+""",
+    "top_revenue_segments": """
+SELECT customer_segmentation,
+       ROUND(SUM(total_charges_sum), 2) AS total_revenue
+FROM TB_RPT_REVENUE_MONTHLY
+WHERE has_cluster
+GROUP BY customer_segmentation
+ORDER BY total_revenue DESC
+LIMIT 10
+""",
+    "churn_rate_by_payment_method": f"""
+SELECT payment_method,
+       {CHURN_RATE_SQL} AS churn_rate
+FROM TB_RPT_CHURN_DAILY
+WHERE has_revenue
+GROUP BY payment_method
+ORDER BY churn_rate DESC
+""",
+    "tenure_vs_churn": f"""
+SELECT tenure_bucket,
+       {CHURN_RATE_SQL} AS churn_rate
+FROM TB_RPT_CHURN_DAILY
+WHERE has_revenue
+GROUP BY tenure_bucket
+ORDER BY churn_rate DESC
+""",
+    # COUNT(DISTINCT) aman dijumlah antar partisi: satu customer hanya punya satu bulan date_joined
+    "customer_lifetime_value_distribution": """
+SELECT customer_segmentation,
+       ROUND(SUM(cltv_sum) / NULLIF(SUM(cltv_count), 0), 2) AS avg_cltv,
+       SUM(customers) AS customer_count
+FROM TB_RPT_REVENUE_MONTHLY
+WHERE has_cluster
+GROUP BY customer_segmentation
+ORDER BY avg_cltv DESC
+""",
+    "contract_type_churn_analysis": f"""
+SELECT contract_type,
+       {CHURN_RATE_SQL} AS churn_rate,
+       SUM(predictions) AS total_customers
+FROM TB_RPT_CHURN_DAILY
+WHERE has_revenue
+GROUP BY contract_type
+ORDER BY churn_rate DESC
+""",
+    "monthly_revenue_trend": """
+SELECT year,
+       month_name,
+       ROUND(SUM(total_charges_sum), 2) AS total_revenue
+FROM TB_RPT_REVENUE_MONTHLY
+WHERE has_date
+  AND year = YEAR(CURRENT_DATE)
+GROUP BY year, month_name
+""",
+    "gender_based_churn": f"""
+SELECT gender,
+       {CHURN_RATE_SQL} AS churn_rate
+FROM TB_RPT_CHURN_DAILY
+WHERE has_customer
+GROUP BY gender
+ORDER BY churn_rate DESC
+""",
+}
+
+# -----------------------------
+# SQL rollup
+# -----------------------------
+def fq(table: str) -> str:
+    return f"{DATABASE}.{SCHEMA}.{table}"
+
+def stream_name(rollup: dict, table: str) -> str:
+    # pola sama dengan TB_R_REVIEW_STM_DM: <tabel sumber>_STM_<konsumen>
+    return f"{table}_STM_{rollup['name'][len('TB_RPT_'):]}"
+
+def partition_expr(rollup: dict) -> str:
+    return f"COALESCE({rollup['partition'][1]}, {NULL_PARTITION})"
+
+def columns(rollup: dict):
+    """(nama, tipe) kolom fisik rollup: partisi, dimensi, measure."""
+    return ([(rollup["partition"][0], "DATE")]
+            + [(name, dtype) for name, _, dtype in rollup["dimensions"]]
+            + [(name, dtype) for name, _, dtype in rollup["measures"]])
+
+def create_sql(rollup: dict, replace: bool = False) -> str:
+    head = "CREATE OR REPLACE TABLE" if replace else "CREATE TABLE IF NOT EXISTS"
+    body = ",\n        ".join(f"{name} {dtype}" for name, dtype in columns(rollup))
+    return f"""
+      {head} {fq(rollup["name"])} (
+        {body}
+      )
+    """
+
+def from_sql(rollup: dict) -> str:
+    table, alias = rollup["source"]
+    joins = "".join(f"\n      {kind} JOIN {fq(t)} {a} ON {on}" for t, a, kind, on in rollup["joins"])
+    return f"FROM {fq(table)} {alias}{joins}"
+
+def select_sql(rollup: dict, partitions: str = None) -> str:
+    """SELECT agregat rollup; partitions = subquery PART_DATE untuk membatasi ke partisi kotor saja."""
+    exprs = ([f"{partition_expr(rollup)} AS {rollup['partition'][0]}"]
+             + [f"{expr} AS {name}" for name, expr, _ in rollup["dimensions"]]
+             + [f"{expr} AS {name}" for name, expr, _ in rollup["measures"]])
+    sep = ",\n        "
+    where = f"\n      WHERE {partition_expr(rollup)} IN ({partitions})" if partitions else ""
+    group = ", ".join(str(i) for i in range(1, len(rollup["dimensions"]) + 2))
+    return f"""
+      SELECT
+        {sep.join(exprs)}
+      {from_sql(rollup)}{where}
+      GROUP BY {group}
+    """
+
+def dirty_partitions_sql(rollup: dict) -> str:
+    """
+    Partisi yang disentuh stream (baris INSERT = nilai baru, DELETE = nilai lama). Stream tabel dimensi
+    di-join balik ke sumber untuk mencari partisi baris fact yang memakai baris dimensi tersebut.
+    """
+    table, alias = rollup["source"]
+    joins = {t: (a, on) for t, a, _, on in rollup["joins"]}
+    parts = []
+    for t in rollup["streams"]:
+        stream = fq(stream_name(rollup, t))
+        if t == table:
+            parts.append(f"SELECT {partition_expr(rollup)} AS PART_DATE FROM {stream} {alias}")
+        else:
+            a, on = joins[t]
+            parts.append(f"SELECT {partition_expr(rollup)} AS PART_DATE FROM {stream} {a} JOIN {fq(table)} {alias} ON {on}")
+    union = "\n        UNION ALL\n        ".join(parts)
+    return f"""
+      SELECT DISTINCT PART_DATE FROM (
+        {union}
+      )
+    """
+
+# -----------------------------
+# Refresh (Snowflake)
+# -----------------------------
+def create_streams(session, rollup: dict):
+    """CREATE OR REPLACE -> offset mulai dari sekarang; dipakai bersamaan dengan rebuild penuh."""
+    for t in rollup["streams"]:
+        session.sql(f"CREATE OR REPLACE STREAM {fq(stream_name(rollup, t))} ON TABLE {fq(t)}").collect()
+
+def streams_healthy(session, rollup: dict) -> bool:
+    """
+    Stream harus ada, belum stale, dan masih menempel ke tabel sumbernya. CREATE OR REPLACE / SWAP
+    (full enrich) memberi nama tabel itu objek baru yang dibuat setelah stream: stream lama ikut objek
+    lama (atau hilang bersamanya), jadi tabel sumber yang lebih baru dari stream-nya berarti rebuild.
+    """
+    for t in rollup["streams"]:
+        rows = session.sql(f"SHOW STREAMS LIKE '{stream_name(rollup, t)}' IN SCHEMA {DATABASE}.{SCHEMA}").collect()
+        if not rows:
+            return False
+        info = rows[0].as_dict()
+        if str(info.get("stale")).lower() == "true" or str(info.get("table_name")).upper() != fq(t):
+            return False
+        if str(info.get("invalid_reason") or "N/A").upper() != "N/A":
+            return False
+        tables = session.sql(f"SHOW TABLES LIKE '{t}' IN SCHEMA {DATABASE}.{SCHEMA}").collect()
+        if not tables or tables[0].as_dict()["created_on"] > info["created_on"]:
+            return False
+    return True
+
+def has_changes(session, rollup: dict) -> bool:
+    return any(
+        session.sql(f"SELECT SYSTEM$STREAM_HAS_DATA('{fq(stream_name(rollup, t))}')").collect()[0][0]
+        for t in rollup["streams"]
+    )
+
+def drop_streams(session, rollup: dict):
+    for t in rollup["streams"]:
+        session.sql(f"DROP STREAM IF EXISTS {fq(stream_name(rollup, t))}").collect()
+
+def rebuild(session, rollup: dict) -> dict:
+    """
+    Stream dibuat ulang (offset = sekarang) sebelum hitung ulang penuh, supaya perubahan selama rebuild
+    tetap tertangkap di run berikutnya. Kalau rebuild gagal, stream di-drop: run berikutnya melihat stream
+    hilang dan rebuild lagi, bukan menganggap rollup yang kosong / basi sudah sinkron.
+    """
+    create_streams(session, rollup)
+    session.sql("BEGIN").collect()
+    try:
+        session.sql(f"DELETE FROM {fq(rollup['name'])}").collect()
+        rows = session.sql(f"INSERT INTO {fq(rollup['name'])} {select_sql(rollup)}").collect()[0][0]
+        session.sql("COMMIT").collect()
+    except Exception:
+        session.sql("ROLLBACK").collect()
+        drop_streams(session, rollup)
+        raise
+    return {"kind": "rebuild", "partitions": None, "rows": rows}
+
+def refresh_partitions(session, rollup: dict) -> dict:
+    """
+    Baca stream ke temp table partisi, DELETE + INSERT ulang partisi itu saja. Semua dalam satu transaksi:
+    offset stream baru maju saat COMMIT, jadi refresh yang gagal mengulang partisi yang sama di run berikutnya.
+    """
+    tmp = f"TMP_RPT_PARTS_{uuid.uuid4().hex[:12]}"
+    # DDL di luar transaksi (DDL di Snowflake meng-commit transaksi yang terbuka)
+    session.sql(f"CREATE TEMPORARY TABLE {tmp} (PART_DATE DATE)").collect()
+    try:
+        session.sql("BEGIN").collect()
+        try:
+            parts = session.sql(f"INSERT INTO {tmp} (PART_DATE) {dirty_partitions_sql(rollup)}").collect()[0][0]
+            session.sql(f"""
+              DELETE FROM {fq(rollup['name'])}
+              WHERE {rollup['partition'][0]} IN (SELECT PART_DATE FROM {tmp})
+            """).collect()
+            rows = session.sql(
+                f"INSERT INTO {fq(rollup['name'])} {select_sql(rollup, f'SELECT PART_DATE FROM {tmp}')}"
+            ).collect()[0][0]
+            session.sql("COMMIT").collect()
+        except Exception:
+            session.sql("ROLLBACK").collect()
+            raise
+    finally:
+        session.sql(f"DROP TABLE IF EXISTS {tmp}").collect()
+    return {"kind": "partitions", "partitions": parts, "rows": rows}
+
+def refresh(session, rollup: dict, full: bool = False) -> dict:
+    session.sql(create_sql(rollup, replace=full)).collect()
+    if full or not streams_healthy(session, rollup):
+        return rebuild(session, rollup)
+    if not has_changes(session, rollup):
+        return {"kind": "none", "partitions": 0, "rows": 0}
+    try:
+        return refresh_partitions(session, rollup)
+    except Exception:
+        # stream tidak bisa dibaca (tabel sumber di-recreate / di-drop setelah SWAP) -> hitung ulang penuh;
+        # isi stream boleh dibuang karena rebuild menghitung semua partisi
+        return rebuild(session, rollup)
+
+# -----------------------------
+# Generator semantic model (lokal)
+# -----------------------------
+def load_model(path: str = MODEL_FILE) -> dict:
+    import yaml
+    with open(path, encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+def _model_columns(table: dict) -> set:
+    cols = set()
+    for kind in ("dimensions", "time_dimensions", "facts", "measures"):
+        for c in table.get(kind) or []:
+            cols.add(c["name"].upper())
+            cols.update(re.findall(r"[A-Z_][A-Z0-9_]*", str(c.get("expr", "")).upper()))
+    return cols
+
+def _join_pairs(on: str, left: str, right: str) -> set:
+    """'p.X = r.Y AND ...' -> {(kolom left, kolom right)}"""
+    pairs = set()
+    for eq in on.split(" AND "):
+        sides = dict(side.strip().split(".", 1) for side in eq.split("="))
+        pairs.add((sides[left].upper(), sides[right].upper()))
+    return pairs
+
+def _relationship_paths(model: dict) -> dict:
+    """
+    {(tabel kiri, tabel kanan): kolom join} dari relationships YAML, plus pasangan fact-fact yang
+    lewat dimensi yang sama (mis. TB_F_CHURN_PREDICTION -> TB_R_CUSTOMER <- TB_F_REVENUE).
+    """
+    edges = {}
+    for rel in model.get("relationships") or []:
+        cols = tuple((c["left_column"].upper(), c["right_column"].upper()) for c in rel["relationship_columns"])
+        edges[(rel["left_table"], rel["right_table"])] = [(l, r) for l, r in cols]
+        edges[(rel["right_table"], rel["left_table"])] = [(r, l) for l, r in cols]
+    paths = dict(edges)
+    for (a, via), cols_a in edges.items():
+        for (b, via_b), cols_b in edges.items():
+            if via == via_b and a != b and (a, b) not in paths:
+                ra = {r: l for l, r in cols_a}
+                rb = {r: l for l, r in cols_b}
+                shared = [(ra[k], rb[k]) for k in ra if k in rb]
+                if shared:
+                    paths[(a, b)] = shared
+    return paths
+
+def _aliases(rollup: dict) -> dict:
+    table, src_alias = rollup["source"]
+    aliases = {src_alias: table}
+    aliases.update({a: t for t, a, _, _ in rollup["joins"]})
+    return aliases
+
+def _column_refs(rollup: dict) -> list:
+    """[(alias, kolom)] yang dipakai partisi, dimensi, measure dan kondisi join."""
+    exprs = [rollup["partition"][1]] + [e for _, e, _ in rollup["dimensions"] + rollup["measures"]]
+    exprs += [on for _, _, _, on in rollup["joins"]]
+    return re.findall(r"\b([a-z]+)\.([A-Za-z_][A-Za-z0-9_]*)", " ".join(exprs))
+
+def validate(model: dict, rollups=ROLLUPS, queries=ROLLUP_QUERIES):
+    """Semua tabel, kolom, join dan verified query di spec harus cocok dengan semantic model."""
+    tables = {t["name"]: t for t in model["tables"]}
+    paths = _relationship_paths(model)
+    verified = {q["name"] for q in model.get("verified_queries") or []}
+    errors = []
+    for rollup in rollups:
+        table, src_alias = rollup["source"]
+        aliases = _aliases(rollup)
+        for alias, t in aliases.items():
+            if t not in tables:
+                errors.append(f"{rollup['name']}: tabel {t} tidak ada di semantic model")
+                continue
+            base = tables[t]["base_table"]
+            if (base["database"], base["schema"], base["table"]) != (DATABASE, SCHEMA, t):
+                errors.append(f"{rollup['name']}: {t} bukan {fq(t)}")
+        for alias, col in _column_refs(rollup):
+            if alias not in aliases:
+                errors.append(f"{rollup['name']}: alias {alias} tidak dikenal")
+            elif aliases[alias] in tables and col.upper() not in _model_columns(tables[aliases[alias]]):
+                errors.append(f"{rollup['name']}: kolom {aliases[alias]}.{col} tidak ada di semantic model")
+        for t, alias, _, on in rollup["joins"]:
+            expected = paths.get((table, t))
+            if expected is not None and set(expected) != _join_pairs(on, src_alias, alias):
+                errors.append(f"{rollup['name']}: join {table} -> {t} beda dengan relationships YAML {expected}")
+        for t in rollup["streams"]:
+            if t not in aliases.values():
+                errors.append(f"{rollup['name']}: stream {t} bukan tabel rollup ini")
+    names = {r["name"] for r in rollups}
+    for name, sql in queries.items():
+        if name not in verified:
+            errors.append(f"verified query {name} tidak ada di semantic model")
+        for ref in re.findall(r"\bTB_RPT_[A-Z0-9_]+", sql):
+            if ref not in names:
+                errors.append(f"verified query {name}: rollup {ref} tidak dikenal")
+    if errors:
+        raise ValueError("Spec rollup tidak cocok dengan semantic model:\n- " + "\n- ".join(errors))
+
+def check_sources(session, rollups=ROLLUPS):
+    """
+    validate() hanya membandingkan spec dengan YAML; ekspresi YAML bisa saja menunjuk kolom yang tidak
+    ada di tabel fisik. Sebelum rollup dibuat / di-refresh, tiap kolom spec dicek ke DESCRIBE TABLE sumbernya.
+    """
+    physical, errors = {}, []
+    for rollup in rollups:
+        aliases = _aliases(rollup)
+        for alias, col in _column_refs(rollup):
+            t = aliases.get(alias)
+            if t is None:
+                continue  # alias tidak dikenal sudah ditangkap validate()
+            if t not in physical:
+                try:
+                    physical[t] = {r["name"].upper() for r in session.sql(f"DESCRIBE TABLE {fq(t)}").collect()}
+                except Exception as e:
+                    physical[t] = None
+                    errors.append(f"{rollup['name']}: tabel {fq(t)} tidak bisa dibaca ({e})")
+            if physical[t] is not None and col.upper() not in physical[t]:
+                errors.append(f"{rollup['name']}: kolom {t}.{col} tidak ada di tabel fisik")
+    if errors:
+        raise ValueError("Spec rollup tidak cocok dengan tabel fisik:\n- " + "\n- ".join(dict.fromkeys(errors)))
+
+def semantic_table(rollup: dict) -> dict:
+    """Tabel logis rollup untuk YAML: partisi -> time_dimension, dimensi/flag -> dimensions, measure -> facts."""
+    part = rollup["partition"][0]
+    return {
+        "name": rollup["name"],
+        "description": rollup["description"],
+        "base_table": {"database": DATABASE, "schema": SCHEMA, "table": rollup["name"]},
+        "dimensions": [{"name": n, "expr": n, "data_type": t} for n, _, t in rollup["dimensions"]],
+        "time_dimensions": [{"name": part, "expr": part, "data_type": "DATE"}],
+        "facts": [{"name": n, "expr": n, "data_type": t} for n, _, t in rollup["measures"]],
+    }
+
+def rewrite_model(model: dict, rollups=ROLLUPS, queries=ROLLUP_QUERIES) -> dict:
+    """Idempotent: tabel rollup lama diganti, SQL verified query diganti dari ROLLUP_QUERIES."""
+    validate(model, rollups, queries)
+    names = {r["name"] for r in rollups}
+    model = dict(model)
+    model["tables"] = [t for t in model["tables"] if t["name"] not in names] + [semantic_table(r) for r in rollups]
+    # blok terakhir file (tanpa newline di akhir) terbaca tanpa "\n" -> disamakan supaya tetap ditulis "|"
+    model["verified_queries"] = [
+        dict(q, sql=queries[q["name"]].lstrip("\n") if q["name"] in queries else q["sql"].rstrip("\n") + "\n")
+        for q in model.get("verified_queries") or []
+    ]
+    return model
+
+def dump_model(model: dict) -> str:
+    """Format sama dengan file asli: indent list 2 spasi, teks multi-baris sebagai blok '|', urutan key tetap."""
+    import yaml
+
+    class Dumper(yaml.SafeDumper):
+        def increase_indent(self, flow=False, indentless=False):
+            return super().increase_indent(flow, False)
+
+    def represent_str(dumper, value):
+        return dumper.represent_scalar("tag:yaml.org,2002:str", value, style="|" if "\n" in value else None)
+
+    Dumper.add_representer(str, represent_str)
+    text = yaml.dump(model, Dumper=Dumper, sort_keys=False, allow_unicode=True, width=4096)
+    return text.rstrip("\n").replace("\n", "\r\n")
+
+def generate(path: str = MODEL_FILE, check: bool = False) -> bool:
+    """Tulis ulang YAML; return True kalau isinya berubah (mode check: tidak menulis apa-apa)."""
+    with open(path, encoding="utf-8", newline="") as f:
+        current = f.read()
+    rendered = dump_model(rewrite_model(load_model(path)))
+    changed = rendered != current
+    if changed and not check:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(rendered)
+    return changed
+
+# -----------------------------
+# Entry point
+# -----------------------------
+def main(session, mode: str = DEFAULT_MODE):
+    mode = (mode or DEFAULT_MODE).strip().lower()
+    if mode not in ("incremental", "full"):
+        raise ValueError(f"Unknown mode: {mode} (incremental | full)")
+    for sql in LEGACY_MARTS_SQL:
+        session.sql(sql).collect()
+    check_sources(session)
+    stats = {"rollups": 0, "partitions": 0, "rows": 0, "rebuilt": []}
+    for rollup in ROLLUPS:
+        result = refresh(session, rollup, full=(mode == "full"))
+        stats["rollups"] += 1
+        stats["partitions"] += result["partitions"] or 0
+        stats["rows"] += result["rows"]
+        if result["kind"] == "rebuild":
+            stats["rebuilt"].append(rollup["name"])
+    stats["rebuilt"] = ",".join(stats["rebuilt"]) or None
+    return f"MARTS_DONE mode={mode} " + " ".join(f"{k}={v}" for k, v in stats.items())
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Generate rollup TB_RPT_* di semantic model Cortex Analyst.")
+    parser.add_argument("--model", default=MODEL_FILE, help="file semantic model YAML")
+    parser.add_argument("--check", action="store_true", help="jangan tulis; exit 1 kalau YAML belum sinkron")
+    args = parser.parse_args(argv)
+    changed = generate(args.model, check=args.check)
+    for rollup in ROLLUPS:
+        print(f"{rollup['name']:<32} partisi={rollup['partition'][0]:<16} stream={','.join(rollup['streams'])}")
+    print(f"verified query ke rollup: {len(ROLLUP_QUERIES)}; YAML {'berubah' if changed else 'sudah sinkron'}")
+    return 1 if (args.check and changed) else 0
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -3,6 +3,8 @@ CREATE OR REPLACE STAGE telco.datamart.fomc
     ENCRYPTION = (TYPE = 'SNOWFLAKE_SSE');
     
 
+-- Setup awal (full). Refresh rutin setelah file baru di-PUT ke stage:
+--   CALL TELCO.DATAMART.SP_INGEST_FOMC_DOCUMENTS();  -- hanya parse/chunk file baru/berubah
 CREATE OR REPLACE TABLE TELCO.DATAMART.TB_R_PARSED_FOMC_CONTENT AS SELECT 
       relative_path,
       TO_VARCHAR(
@@ -18,12 +20,14 @@ CREATE OR REPLACE TABLE TELCO.DATAMART.TB_R_PARSED_FOMC_CONTENT AS SELECT
 
 CREATE OR REPLACE TABLE telco.datamart.TB_F_CHUNKED_FOMC_CONTENT (
     file_name VARCHAR,
+    CHUNK_INDEX NUMBER,   -- urutan chunk dalam file (dipakai app untuk menggabung chunk bertetangga)
     CHUNK VARCHAR
 );
 
-INSERT INTO telco.datamart.TB_F_CHUNKED_FOMC_CONTENT (file_name, CHUNK)
+INSERT INTO telco.datamart.TB_F_CHUNKED_FOMC_CONTENT (file_name, CHUNK_INDEX, CHUNK)
 SELECT
     relative_path,
+    c.index AS CHUNK_INDEX,
     c.value AS CHUNK
 FROM
     telco.datamart.TB_R_PARSED_FOMC_CONTENT,
@@ -42,6 +46,7 @@ CREATE OR REPLACE CORTEX SEARCH SERVICE TELCO.DATAMART.FOMC_SEARCH_SERVICE
     AS (
     SELECT
         file_name,
+        chunk_index,
         chunk
     FROM TELCO.DATAMART.TB_F_CHUNKED_FOMC_CONTENT
     );
\ No newline at end of file
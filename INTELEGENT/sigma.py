@@ -4,14 +4,22 @@
 # Layout: kolom kiri (Q/A), kolom kanan (Riwayat & Context)
 # ============================================
 
-from typing import List
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import numpy as np
 import streamlit as st
 
 # Snowflake SDKs
 from snowflake.snowpark.context import get_active_session
 from snowflake.snowpark.session import Session
 from snowflake.core import Root
-from snowflake.cortex import complete
+from snowflake.cortex import complete, embed_text_768
 
 # TruLens (opsional, sesuai skrip kamu)
 from trulens.core.otel.instrument import instrument
@@ -24,7 +32,7 @@ from trulens.otel.semconv.trace import SpanAttributes
 DEFAULT_DB = "TELCO"
 DEFAULT_SCHEMA = "DATAMART"
 DEFAULT_SERVICE = "FOMC_SEARCH_SERVICE"
-DEFAULT_COLUMNS = ["chunk"]     # contoh kolom hasil index (sesuaikan dengan punyamu)
+DEFAULT_COLUMNS = ["chunk", "file_name"]     # kolom hasil index (kolom teks di urutan pertama)
 DEFAULT_K = 4
 DEFAULT_MODEL = "mistral-large2"
 
@@ -32,6 +40,554 @@ AVAILABLE_MODELS = [
     "mistral-large2"
 ]
 
+RETRIEVAL_CACHE_SIZE = 512
+DEFAULT_RETRIEVAL_TTL_S = 3600   # dipakai kalau TARGET_LAG service tidak bisa dibaca
+
+# Cache jawaban semantik: pertanyaan dengan embedding mirip (cosine >= threshold)
+# dijawab ulang dari cache tanpa search + complete(). Default mati (opt-in di sidebar):
+# "churn Q3 2024" vs "churn Q4 2024" bisa lolos threshold, jadi hit juga mensyaratkan
+# angka / kode / nama yang diekstrak dari pertanyaan sama persis (SemanticAnswerCache.entities).
+EMBED_MODEL = "snowflake-arctic-embed-m-v1.5"
+SEMANTIC_THRESHOLD = 0.92
+SEMANTIC_CACHE_SIZE = 1000
+SEMANTIC_CACHE_MAX_AGE_S = 24 * 3600
+
+# Perakitan konteks: chunk bertetangga/overlap dari file yang sama digabung, near-duplicate
+# dibuang, lalu dikemas ke budget token (estimasi ~4 karakter per token)
+DEFAULT_CONTEXT_BUDGET = 1000
+CHARS_PER_TOKEN = 4
+CHUNK_MAX_OVERLAP = 50          # split_text_recursive_character overlap = 25 (lihat setup SQL)
+CHUNK_MIN_OVERLAP = 8
+NEAR_DUPLICATE_JACCARD = 0.8
+
+# Multi-query retrieval: pertanyaan dipecah jadi beberapa sub-query, dicari paralel,
+# hasilnya digabung dengan reciprocal-rank fusion (RRF)
+MAX_SUB_QUERIES = 4
+RRF_K = 60
+SEARCH_POOL_WORKERS = 8
+
+# Render stream: flush ke UI paling sering tiap RENDER_INTERVAL_S atau tiap RENDER_MIN_CHARS karakter
+RENDER_INTERVAL_S = 0.1
+RENDER_MIN_CHARS = 80
+
+# Latency per tahap request (JSONL lokal + ringkasan p50/p95 di sidebar)
+LATENCY_LOG_PATH = os.environ.get("SIGMA_LATENCY_LOG", "/tmp/sigma_latency.jsonl")
+LATENCY_LOG_SIZE = 2000
+LATENCY_STAGES = ["embed_s", "retrieval_s", "ttft_s", "tokens_per_s", "total_s"]
+
+
+# =========================
+# Handle Snowflake (dipakai ulang lintas rerun & user)
+# =========================
+@st.cache_resource(show_spinner=False)
+def get_session() -> Session:
+    # get_active_session hanya tersedia di Streamlit in Snowflake
+    return get_active_session()
+
+
+@st.cache_resource(show_spinner=False)
+def get_root() -> Root:
+    return Root(get_session())
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_service(db: str, schema: str, service: str):
+    return (
+        get_root()
+        .databases[db]
+        .schemas[schema]
+        .cortex_search_services[service]
+    )
+
+
+_LAG_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_target_lag(lag: str) -> Optional[int]:
+    """'1 hour' / '30 minutes' -> detik. None kalau format tidak dikenali (mis. 'DOWNSTREAM')."""
+    m = re.match(r"^\s*(\d+)\s*(second|minute|hour|day)s?\s*$", str(lag or ""), re.IGNORECASE)
+    if not m:
+        return None
+    return int(m.group(1)) * _LAG_UNITS[m.group(2).lower()]
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def describe_search_service(db: str, schema: str, service: str) -> dict:
+    """DESCRIBE CORTEX SEARCH SERVICE (target_lag, data_timestamp, ...); {} kalau gagal."""
+    try:
+        rows = get_session().sql(f"DESCRIBE CORTEX SEARCH SERVICE {db}.{schema}.{service}").collect()
+        return {k.lower(): v for k, v in rows[0].as_dict().items()} if rows else {}
+    except Exception:
+        return {}
+
+
+def get_target_lag_seconds(db: str, schema: str, service: str) -> int:
+    """
+    TTL cache retrieval = TARGET_LAG service: index paling cepat berubah sekali per lag,
+    jadi hasil search yang lebih muda dari itu tidak lebih basi dari index-nya sendiri.
+    """
+    lag = describe_search_service(db, schema, service).get("target_lag")
+    return parse_target_lag(lag) or DEFAULT_RETRIEVAL_TTL_S
+
+
+def get_service_version(db: str, schema: str, service: str) -> str:
+    """Penanda refresh index (data_timestamp); berubah -> jawaban cache untuk service ini basi."""
+    return str(describe_search_service(db, schema, service).get("data_timestamp") or "")
+
+
+def get_search_columns(db: str, schema: str, service: str) -> List[str]:
+    """DEFAULT_COLUMNS + chunk_index kalau service sudah dibuat ulang dengan kolom tsb."""
+    cols = str(describe_search_service(db, schema, service).get("columns") or "")
+    available = {c.strip().lower() for c in cols.split(",")}
+    return DEFAULT_COLUMNS + (["chunk_index"] if "chunk_index" in available else [])
+
+
+class RetrievalCache:
+    """LRU + TTL, thread-safe (satu instance dipakai bersama semua user)."""
+
+    def __init__(self, max_size: int = RETRIEVAL_CACHE_SIZE):
+        self._data = OrderedDict()
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return re.sub(r"\s+", " ", query.strip().lower()).rstrip(" ?!.")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, ttl_s: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+@st.cache_resource(show_spinner=False)
+def get_retrieval_cache() -> RetrievalCache:
+    return RetrievalCache()
+
+
+class LatencyLog:
+    """
+    Record latency per request: disimpan di memori (ringkasan) dan di-append ke JSONL.
+    File dipangkas ke max_records terakhir saat load dan setiap isinya mencapai 2x max_records,
+    jadi tidak tumbuh tanpa batas di app yang jalan lama.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_records: int = LATENCY_LOG_SIZE):
+        # path dibaca saat instansiasi (bukan saat import) supaya override sigma.LATENCY_LOG_PATH berlaku
+        path = path if path is not None else LATENCY_LOG_PATH
+        self._path = path
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._lines = 0   # jumlah baris di file sejak load / compact terakhir
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        self._records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        if self._lines > max_records:
+            self._compact()
+
+    def _compact(self):
+        """Tulis ulang file hanya dengan record di memori; via file tmp + os.replace supaya atomik."""
+        if not os.path.isfile(self._path):
+            return  # mis. os.devnull
+        tmp = f"{self._path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for record in self._records:
+                    f.write(json.dumps(record, default=str) + "\n")
+            os.replace(tmp, self._path)
+            self._lines = len(self._records)
+        except OSError:
+            pass
+
+    def append(self, record: dict):
+        with self._lock:
+            self._records.append(record)
+            try:
+                with open(self._path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+                self._lines += 1
+            except OSError:
+                pass  # log lokal best-effort, jangan ganggu jawaban
+            if self._lines >= 2 * self._records.maxlen:
+                self._compact()
+
+    def summary(self, stages: List[str] = LATENCY_STAGES) -> dict:
+        """stage -> (n, p50, p95) dari record yang punya nilai stage tsb."""
+        with self._lock:
+            records = list(self._records)
+        out = {}
+        for stage in stages:
+            values = [r[stage] for r in records if isinstance(r.get(stage), (int, float))]
+            if values:
+                out[stage] = (len(values), float(np.percentile(values, 50)), float(np.percentile(values, 95)))
+        return out
+
+
+@st.cache_resource(show_spinner=False)
+def get_latency_log() -> LatencyLog:
+    return LatencyLog()
+
+
+class RenderCoalescer:
+    """
+    Kumpulkan token stream dan render ke placeholder per interval waktu / ukuran,
+    bukan per token (render ulang seluruh jawaban tiap token = kuadratik + banjir websocket).
+    """
+
+    def __init__(self, placeholder, interval_s: float = RENDER_INTERVAL_S, min_chars: int = RENDER_MIN_CHARS):
+        self._placeholder = placeholder
+        self._interval_s = interval_s
+        self._min_chars = min_chars
+        self._parts = []
+        self._pending = 0
+        self._last_flush = time.perf_counter()
+        self.first_token_at = None
+        self.last_token_at = None
+        self.tokens = 0
+        self.renders = 0
+
+    def add(self, token: str):
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.last_token_at = now
+        self.tokens += 1
+        self._parts.append(token)
+        self._pending += len(token)
+        if self.renders == 0 or self._pending >= self._min_chars or now - self._last_flush >= self._interval_s:
+            self.flush()
+
+    def flush(self):
+        if self._pending or self.renders == 0:
+            self._placeholder.markdown("".join(self._parts))
+            self.renders += 1
+            self._pending = 0
+            self._last_flush = time.perf_counter()
+
+    def close(self) -> str:
+        self.flush()
+        return "".join(self._parts)
+
+    def tokens_per_s(self) -> Optional[float]:
+        if self.tokens < 2 or self.last_token_at <= self.first_token_at:
+            return None
+        return (self.tokens - 1) / (self.last_token_at - self.first_token_at)
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_pool() -> ThreadPoolExecutor:
+    # Satu pool untuk semua user: jumlah search paralel ke service tetap terbatas
+    return ThreadPoolExecutor(max_workers=SEARCH_POOL_WORKERS, thread_name_prefix="cortex-search")
+
+
+class SemanticAnswerCache:
+    """
+    Index vektor lokal kecil (matriks numpy ter-normalisasi, cosine = dot product).
+    Entry di-scope per (service, kolom, k, model) dan versi index service; eviction
+    berdasarkan umur (max_age_s) dan ukuran (entry tertua dibuang dulu).
+    Hit hanya kalau entities() pertanyaan sama dengan entry: embedding nyaris tidak
+    membedakan angka / periode / nama, padahal jawabannya berbeda.
+    """
+
+    def __init__(self, max_size: int = SEMANTIC_CACHE_SIZE, max_age_s: float = SEMANTIC_CACHE_MAX_AGE_S):
+        self._max_size = max_size
+        self._max_age_s = max_age_s
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._entries = []   # dict: scope, version, created, question, answer, contexts
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32).ravel()
+        n = np.linalg.norm(v)
+        return v / n if n else v
+
+    @staticmethod
+    def entities(question: str) -> frozenset:
+        """Angka, token alfanumerik (Q3, 5G, IM3), singkatan huruf besar, dan kata kapital selain kata pertama."""
+        found = set()
+        for i, tok in enumerate(re.findall(r"\w+(?:[.,]\d+)*", question or "")):
+            if any(ch.isdigit() for ch in tok) or (len(tok) > 1 and tok.isupper()) or (i > 0 and tok[:1].isupper()):
+                found.add(tok.lower())
+        return frozenset(found)
+
+    def _drop(self, keep: np.ndarray):
+        self._vectors = self._vectors[keep]
+        self._entries = [e for e, k in zip(self._entries, keep) if k]
+
+    def lookup(self, vec, scope, version: str, threshold: float = SEMANTIC_THRESHOLD, question: Optional[str] = None):
+        """
+        Return (entry, similarity) terbaik di atas threshold, atau (None, similarity terbaik).
+        Kalau question diberikan, hanya entry dengan entities() yang sama yang dipertimbangkan.
+        """
+        q = self._unit(vec)
+        ents = self.entities(question) if question is not None else None
+        with self._lock:
+            now = time.monotonic()
+            keep = np.array([now - e["created"] <= self._max_age_s for e in self._entries], dtype=bool)
+            if len(keep) and not keep.all():
+                self._drop(keep)
+            if not self._entries or self._vectors.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None, 0.0
+            sims = self._vectors @ q
+            mask = np.array([
+                e["scope"] == scope and e["version"] == version and (ents is None or e["entities"] == ents)
+                for e in self._entries
+            ], dtype=bool)
+            sims = np.where(mask, sims, -1.0)
+            best = int(np.argmax(sims))
+            if sims[best] >= threshold:
+                self.hits += 1
+                return self._entries[best], float(sims[best])
+            self.misses += 1
+            return None, float(max(sims[best], 0.0))
+
+    def put(self, vec, scope, version: str, question: str, answer: str, contexts: List[str]):
+        v = self._unit(vec)
+        with self._lock:
+            if self._entries and self._vectors.shape[1] != v.shape[0]:
+                self._vectors, self._entries = np.zeros((0, v.shape[0]), dtype=np.float32), []
+            if not self._entries:
+                self._vectors = np.zeros((0, v.shape[0]), dtype=np.float32)
+            self._vectors = np.vstack([self._vectors, v[None, :]])
+            self._entries.append({
+                "scope": scope, "version": version, "created": time.monotonic(),
+                "question": question, "entities": self.entities(question),
+                "answer": answer, "contexts": list(contexts),
+            })
+            if len(self._entries) > self._max_size:
+                keep = np.ones(len(self._entries), dtype=bool)
+                keep[: len(self._entries) - self._max_size] = False
+                self._drop(keep)
+
+    def invalidate(self, service: str, version: str):
+        """Buang entry service tsb yang dibuat dari versi index lain (service sudah refresh)."""
+        with self._lock:
+            keep = np.array([not (e["scope"][0] == service and e["version"] != version)
+                             for e in self._entries], dtype=bool)
+            if len(keep) and not keep.all():
+                self._drop(keep)
+
+    def clear(self):
+        with self._lock:
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache() -> SemanticAnswerCache:
+    return SemanticAnswerCache()
+
+
+def replay_stream(text: str, words_per_chunk: int = 8):
+    """Putar ulang jawaban cache sebagai stream supaya UI sama dengan jawaban baru."""
+    parts = re.split(r"(\s+)", text)
+    for i in range(0, len(parts), words_per_chunk * 2):
+        yield "".join(parts[i:i + words_per_chunk * 2])
+
+
+# =========================
+# Multi-query retrieval
+# =========================
+_COMPARE_PREFIX = re.compile(
+    r"^(?:tolong\s+)?(?:bandingkan|perbandingan|compare|bedakan|apa\s+(?:beda|perbedaan)(?:nya)?|jelaskan)\s+(?:antara\s+)?",
+    re.IGNORECASE,
+)
+_CONJUNCTION = re.compile(
+    r"\s*(?:[,;]\s*(?:(?:dan|serta|and|atau)\s)?|\s(?:dan|serta|vs\.?|versus|and|atau)\s)\s*", re.IGNORECASE
+)
+_QUALIFIER = re.compile(r"\s((?:per|di|pada|untuk|selama|by|in)\s.+)$", re.IGNORECASE)
+
+
+def rewrite_queries(query: str, max_queries: int = MAX_SUB_QUERIES) -> List[str]:
+    """
+    Pecah pertanyaan majemuk jadi sub-query (heuristik, tanpa panggilan LLM tambahan):
+    "bandingkan churn dan sentimen per kota" -> [asli, "churn per kota", "sentimen per kota"].
+    Kualifier di bagian terakhir (per/di/untuk ...) ditempelkan ke bagian lain yang belum punya.
+    Pertanyaan asli selalu ikut sebagai query pertama.
+    """
+    query = query.strip()
+    body = _COMPARE_PREFIX.sub("", query).strip(" ?.!")
+    parts = [p.strip() for p in _CONJUNCTION.split(body) if p and p.strip()]
+    if len(parts) > 1:
+        m = _QUALIFIER.search(parts[-1])
+        if m:
+            qualifier = m.group(1)
+            parts = [p if _QUALIFIER.search(p) else f"{p} {qualifier}" for p in parts]
+
+    out, seen = [], set()
+    for q in [query] + parts:
+        key = RetrievalCache.normalize_query(q)
+        if key and key not in seen:
+            seen.add(key)
+            out.append(q)
+    return out[:max_queries]
+
+
+def rrf_fuse(result_lists: List[List[dict]], k: int = RRF_K) -> List[dict]:
+    """Reciprocal-rank fusion: skor = sum 1 / (k + rank); baris identik digabung."""
+    scores, rows = {}, {}
+    for results in result_lists:
+        for rank, row in enumerate(results):
+            key = (row.get("file_name"), row.get("chunk_index"), row.get("chunk"))
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            rows.setdefault(key, row)
+    return [rows[key] for key in sorted(scores, key=lambda key: -scores[key])]
+
+
+# =========================
+# Perakitan konteks (antara retrieval dan prompt)
+# =========================
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def merge_overlap(a: str, b: str) -> Optional[str]:
+    """Gabung a + b kalau akhir a sama dengan awal b (overlap split); None kalau tidak nyambung."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    for n in range(min(len(a), len(b), CHUNK_MAX_OVERLAP), CHUNK_MIN_OVERLAP - 1, -1):
+        if a[-n:] == b[:n]:
+            return a + b[n:]
+    return None
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+
+def _merge_file_chunks(chunks: List[dict]) -> List[dict]:
+    """
+    Gabung chunk dari satu file. Dengan chunk_index: chunk berurutan (i, i+1) digabung.
+    Tanpa chunk_index: digabung kalau teksnya overlap.
+    chunk: {"text", "rank", "index"}; hasil membawa rank terbaik dari chunk penyusunnya.
+    """
+    if all(c["index"] is not None for c in chunks):
+        chunks = sorted(chunks, key=lambda c: c["index"])
+        out = [dict(chunks[0])]
+        for c in chunks[1:]:
+            last = out[-1]
+            if c["index"] <= last["index"] + 1:
+                last["text"] = merge_overlap(last["text"], c["text"]) or f"{last['text']} {c['text']}"
+                last["index"] = max(last["index"], c["index"])
+                last["rank"] = min(last["rank"], c["rank"])
+            else:
+                out.append(dict(c))
+        return out
+
+    out = [dict(c) for c in chunks]
+    changed = True
+    while changed and len(out) > 1:
+        changed = False
+        for i in range(len(out)):
+            for j in range(len(out)):
+                if i == j:
+                    continue
+                joined = merge_overlap(out[i]["text"], out[j]["text"])
+                if joined is not None:
+                    out[i]["text"] = joined
+                    out[i]["rank"] = min(out[i]["rank"], out[j]["rank"])
+                    del out[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return out
+
+
+def pack_context(
+    rows: List[dict],
+    budget_tokens: int = DEFAULT_CONTEXT_BUDGET,
+    text_col: str = "chunk",
+    file_col: str = "file_name",
+    index_col: str = "chunk_index",
+) -> List[str]:
+    """
+    Hasil search (urut relevansi) -> passage siap prompt:
+    1) gabung chunk bertetangga/overlap dari file yang sama,
+    2) buang passage near-duplicate (Jaccard shingle kata >= NEAR_DUPLICATE_JACCARD),
+    3) kemas sesuai urutan relevansi sampai budget token habis
+       (passage pertama dipotong kalau sendirian sudah melebihi budget).
+    """
+    by_file = OrderedDict()
+    for rank, row in enumerate(rows):
+        text = str(row.get(text_col) or "").strip()
+        if not text:
+            continue
+        idx = row.get(index_col)
+        by_file.setdefault(row.get(file_col), []).append({
+            "text": text,
+            "rank": rank,
+            "index": int(idx) if idx is not None and str(idx).lstrip("-").isdigit() else None,
+        })
+
+    passages = []
+    for file_name, chunks in by_file.items():
+        for p in _merge_file_chunks(chunks):
+            p["file"] = file_name
+            passages.append(p)
+    passages.sort(key=lambda p: p["rank"])
+
+    kept, kept_shingles = [], []
+    for p in passages:
+        sh = _shingles(p["text"])
+        if any(len(sh & o) / max(len(sh | o), 1) >= NEAR_DUPLICATE_JACCARD for o in kept_shingles):
+            continue
+        kept.append(p)
+        kept_shingles.append(sh)
+
+    packed, used = [], 0
+    for p in kept:
+        text = f"[{p['file']}]\n{p['text']}" if p["file"] else p["text"]
+        cost = estimate_tokens(text)
+        if used + cost > budget_tokens:
+            if not packed:
+                packed.append(text[: budget_tokens * CHARS_PER_TOKEN])
+                used = budget_tokens
+            continue
+        packed.append(text)
+        used += cost
+    return packed
+
 
 # =========================
 # Backend: Retriever & RAG
@@ -45,6 +601,9 @@ class CortexSearchRetriever:
         service: str,
         columns: List[str],
         limit_to_retrieve: int = 4,
+        search_service=None,
+        cache: Optional[RetrievalCache] = None,
+        cache_ttl_s: float = DEFAULT_RETRIEVAL_TTL_S,
     ):
         self._session = snowpark_session
         self._db = db
@@ -52,16 +611,60 @@ class CortexSearchRetriever:
         self._service = service
         self._columns = columns
         self._limit = limit_to_retrieve
+        self._search_service = search_service
+        self._cache = cache
+        self._cache_ttl_s = cache_ttl_s
+
+    def _service_handle(self):
+        if self._search_service is None:
+            self._search_service = (
+                Root(self._session)
+                .databases[self._db]
+                .schemas[self._schema]
+                .cortex_search_services[self._service]
+            )
+        return self._search_service
 
     def retrieve(self, query: str) -> List[str]:
-        root = Root(self._session)
-        search_service = (
-            root
-            .databases[self._db]
-            .schemas[self._schema]
-            .cortex_search_services[self._service]
+        rows = self.retrieve_rows(query)
+        # Jika hanya satu kolom (mis. "chunk"), balikan list[str]
+        if len(self._columns) == 1:
+            col = self._columns[0]
+            return [row.get(col, "") for row in rows]
+        # Jika banyak kolom, gabungkan jadi satu string per hasil
+        merged = []
+        for row in rows:
+            merged.append(" | ".join(str(row.get(c, "")) for c in self._columns))
+        return merged
+
+    def retrieve_rows(self, query: str) -> List[dict]:
+        if self._cache is None:
+            return self._search(query)
+        key = (
+            f"{self._db}.{self._schema}.{self._service}".upper(),
+            tuple(self._columns),
+            self._limit,
+            RetrievalCache.normalize_query(query),
         )
-        resp = search_service.search(
+        cached = self._cache.get(key)
+        if cached is not None:
+            return [dict(r) for r in cached]
+        result = self._search(query)
+        self._cache.put(key, tuple(dict(r) for r in result), self._cache_ttl_s)
+        return result
+
+    def retrieve_rows_multi(self, queries: List[str], pool: Optional[ThreadPoolExecutor] = None) -> List[dict]:
+        """Search semua sub-query bersamaan lalu gabung dengan RRF (wall-clock ~ satu search)."""
+        if len(queries) == 1:
+            return self.retrieve_rows(queries[0])
+        if pool is None:
+            results = [self.retrieve_rows(q) for q in queries]
+        else:
+            results = list(pool.map(self.retrieve_rows, queries))
+        return rrf_fuse(results)
+
+    def _search(self, query: str) -> List[dict]:
+        resp = self._service_handle().search(
             query=query,
             columns=self._columns,
             limit=self._limit
@@ -69,22 +672,31 @@ class CortexSearchRetriever:
 
         if not getattr(resp, "results", None):
             return []
-
-        # Jika hanya satu kolom (mis. "chunk"), balikan list[str]
-        if len(self._columns) == 1:
-            col = self._columns[0]
-            return [row.get(col, "") for row in resp.results]
-        # Jika banyak kolom, gabungkan jadi satu string per hasil
-        merged = []
-        for row in resp.results:
-            merged.append(" | ".join(str(row.get(c, "")) for c in self._columns))
-        return merged
+        return [dict(row) for row in resp.results]
 
 
 class RAG:
-    def __init__(self, retriever: CortexSearchRetriever, model_name: str):
+    def __init__(
+        self,
+        retriever: CortexSearchRetriever,
+        model_name: str,
+        semantic_cache: Optional[SemanticAnswerCache] = None,
+        cache_scope: tuple = (),
+        service_version: str = "",
+        context_budget: Optional[int] = DEFAULT_CONTEXT_BUDGET,
+        multi_query: bool = False,
+        search_pool: Optional[ThreadPoolExecutor] = None,
+    ):
         self.retriever = retriever
         self.model_name = model_name
+        self.context_budget = context_budget
+        self.multi_query = multi_query
+        self.search_pool = search_pool
+        # Timing per tahap request, diukur di batas yang sama dengan span TruLens
+        self.timings = {}
+        self.semantic_cache = semantic_cache
+        self.cache_scope = cache_scope
+        self.service_version = service_version
 
     @instrument(
         span_type=SpanAttributes.SpanType.RETRIEVAL,
@@ -94,7 +706,24 @@ class RAG:
         }
     )
     def retrieve_context(self, query: str) -> List[str]:
-        return self.retriever.retrieve(query)
+        t0 = time.perf_counter()
+        try:
+            return self._assemble_context(query)
+        finally:
+            self.timings["retrieval_s"] = time.perf_counter() - t0
+
+    def _assemble_context(self, query: str) -> List[str]:
+        # Konteks prompt selalu teks chunk saja (kolom pertama); kolom lain (file_name, chunk_index)
+        # hanya untuk dedup / urutan, jangan sampai "... | file.pdf" ikut masuk prompt
+        if self.multi_query:
+            rows = self.retriever.retrieve_rows_multi(rewrite_queries(query), self.search_pool)
+        else:
+            rows = self.retriever.retrieve_rows(query)
+        text_col = self.retriever._columns[0]
+        if not self.context_budget:
+            # Tanpa budget, jumlah konteks tetap dibatasi Top-K (sama dengan perilaku lama: chunk saja)
+            return [str(r.get(text_col, "")) for r in rows[: self.retriever._limit]]
+        return pack_context(rows, budget_tokens=self.context_budget, text_col=text_col)
 
     def _build_prompt(self, query: str, context_chunks: List[str]) -> str:
         context_str = "\n\n".join(context_chunks) if context_chunks else ""
@@ -119,6 +748,9 @@ Answer:
     @instrument(span_type=SpanAttributes.SpanType.GENERATION)
     def generate_completion_stream(self, query: str, context_chunks: List[str]):
         prompt = self._build_prompt(query, context_chunks)
+        self.timings["prompt_tokens_est"] = estimate_tokens(prompt)
+        t0 = time.perf_counter()
+        n_tokens = 0
         # Stream token-by-token. Bisa string atau dict per token tergantung environment.
         for upd in complete(self.model_name, prompt, stream=True):
             if isinstance(upd, dict):
@@ -126,7 +758,12 @@ Answer:
             else:
                 token = str(upd)
             if token:
+                if n_tokens == 0:
+                    self.timings["generation_ttft_s"] = time.perf_counter() - t0
+                n_tokens += 1
                 yield token
+        self.timings["generation_s"] = time.perf_counter() - t0
+        self.timings["tokens"] = n_tokens
 
     @instrument(
         span_type=SpanAttributes.SpanType.RECORD_ROOT,
@@ -139,6 +776,35 @@ Answer:
         ctx = self.retrieve_context(query)
         return ctx, self.generate_completion_stream(query, ctx)
 
+    def cached_query_stream(self, query: str):
+        """
+        query_stream dengan cache jawaban semantik di depannya.
+        Return (contexts, stream, info); info = {"cached": bool, "similarity": float}.
+        Jawaban baru masuk cache setelah stream selesai penuh.
+        """
+        if self.semantic_cache is None:
+            ctx, stream = self.query_stream(query)
+            return ctx, stream, {"cached": False, "similarity": 0.0}
+
+        t0 = time.perf_counter()
+        vec = embed_text_768(EMBED_MODEL, query, session=self.retriever._session)
+        self.timings["embed_s"] = time.perf_counter() - t0
+        entry, sim = self.semantic_cache.lookup(vec, self.cache_scope, self.service_version, question=query)
+        if entry is not None:
+            return entry["contexts"], replay_stream(entry["answer"]), {"cached": True, "similarity": sim}
+
+        ctx, stream = self.query_stream(query)
+
+        def record():
+            acc = []
+            for token in stream:
+                acc.append(token)
+                yield token
+            if acc:
+                self.semantic_cache.put(vec, self.cache_scope, self.service_version, query, "".join(acc), ctx)
+
+        return ctx, record(), {"cached": False, "similarity": sim}
+
 
 def build_rag(
     db: str,
@@ -146,99 +812,170 @@ def build_rag(
     service: str,
     columns: List[str],
     k: int,
-    model: str
+    model: str,
+    use_semantic_cache: bool = False,
+    context_budget: Optional[int] = DEFAULT_CONTEXT_BUDGET,
+    multi_query: bool = False,
 ) -> RAG:
-    # get_active_session hanya tersedia di Streamlit in Snowflake
-    session = get_active_session()
+    # Session, Root, handle service & cache retrieval dipakai ulang (st.cache_resource)
     retriever = CortexSearchRetriever(
-        snowpark_session=session,
+        snowpark_session=get_session(),
         db=db,
         schema=schema,
         service=service,
         columns=columns,
-        limit_to_retrieve=k
+        limit_to_retrieve=k,
+        search_service=get_search_service(db, schema, service),
+        cache=get_retrieval_cache(),
+        cache_ttl_s=get_target_lag_seconds(db, schema, service),
+    )
+    fq_service = f"{db}.{schema}.{service}".upper()
+    version = get_service_version(db, schema, service)
+    semantic_cache = get_semantic_cache() if use_semantic_cache else None
+    if semantic_cache is not None:
+        semantic_cache.invalidate(fq_service, version)
+    return RAG(
+        retriever=retriever,
+        model_name=model,
+        semantic_cache=semantic_cache,
+        cache_scope=(fq_service, tuple(columns), k, model, context_budget, multi_query),
+        service_version=version,
+        context_budget=context_budget,
+        multi_query=multi_query,
+        search_pool=get_search_pool() if multi_query else None,
     )
-    return RAG(retriever=retriever, model_name=model)
 
 
 # =========================
 # Streamlit UI (dua kolom)
 # =========================
-st.set_page_config(page_title="RAG on Snowflake Cortex", page_icon="❄️", layout="wide")
-
-st.title("❄️ SIGMA")
-st.caption("Strategic Insights for Growth & Marketing Automation")
-st.caption("Masukkan pertanyaanmu. Aplikasi ini mengambil konteks dari Cortex Search dan menjawab dengan model Cortex.")
-
-# Sidebar: konfigurasi
-with st.sidebar:
-    st.header("⚙️ Pengaturan")
-    db = st.text_input("Database", value=DEFAULT_DB)
-    schema = st.text_input("Schema", value=DEFAULT_SCHEMA)
-    service = st.text_input("Cortex Search Service", value=DEFAULT_SERVICE)
-    model_name = st.selectbox("Model", options=AVAILABLE_MODELS, index=AVAILABLE_MODELS.index(DEFAULT_MODEL))
-    top_k = st.slider("Jumlah konteks (Top-K)", min_value=1, max_value=10, value=DEFAULT_K, step=1)
-    show_context = st.checkbox("Tampilkan konteks yang diambil", value=False)
-    st.markdown("---")
-    if "history" not in st.session_state:
-        st.session_state["history"] = []
-    if st.button("🧹 Clear history"):
-        st.session_state["history"] = []
-
-# Layout dua kolom
-left_col, right_col = st.columns([2, 1], gap="large")
-
-with left_col:
-    query = st.text_input(
-        "Tulis pertanyaanmu di sini:",
-        value="",
-        placeholder="Apa yang kamu mau tanyakan?"
-    )
-    ask = st.button("Tanya", type="primary", use_container_width=True)
-
-    answer_container = st.empty()  # tempat stream jawaban
-
-    if ask and query.strip():
-        try:
-            rag = build_rag(db, schema, service, DEFAULT_COLUMNS, top_k, model_name)
-            with st.spinner("Mengambil konteks dan menyusun jawaban..."):
-                contexts, stream = rag.query_stream(query.strip())
-
-            acc = ""
-            placeholder = answer_container.markdown("")
-            for token in stream:
-                acc += token
-                placeholder.markdown(acc)
-
-            # simpan ke history
-            st.session_state["history"].append({"q": query.strip(), "a": acc, "ctx": contexts})
-
-        except Exception as e:
-            st.error(f"Terjadi error: {e}")
-
-with right_col:
-    st.subheader("🕘 Riwayat")
-    hist = st.session_state.get("history", [])
-    if not hist:
-        st.info("Belum ada riwayat.")
-    else:
-        # tampilkan 5 terakhir (terbaru di atas)
-        for item in reversed(hist[-5:]):
-            with st.expander(f"Q: {item['q'][:80] + ('…' if len(item['q'])>80 else '')}", expanded=False):
-                st.markdown(f"**Q:** {item['q']}")
-                st.markdown(f"**A:** {item['a']}")
-                if show_context and item.get("ctx"):
-                    st.markdown("**Context (Top-K):**")
-                    for i, c in enumerate(item["ctx"], start=1):
-                        st.markdown(f"- {i}. {c}")
-
-    # Panel konteks khusus pertanyaan terakhir
-    if show_context and hist:
+def main():
+    # UI hanya jalan saat dieksekusi Streamlit (script dijalankan sebagai __main__);
+    # import modul ini (mis. benchmark_rag.py) tidak merender apa pun.
+    st.set_page_config(page_title="RAG on Snowflake Cortex", page_icon="❄️", layout="wide")
+
+    st.title("❄️ SIGMA")
+    st.caption("Strategic Insights for Growth & Marketing Automation")
+    st.caption("Masukkan pertanyaanmu. Aplikasi ini mengambil konteks dari Cortex Search dan menjawab dengan model Cortex.")
+
+    # Sidebar: konfigurasi
+    with st.sidebar:
+        st.header("⚙️ Pengaturan")
+        db = st.text_input("Database", value=DEFAULT_DB)
+        schema = st.text_input("Schema", value=DEFAULT_SCHEMA)
+        service = st.text_input("Cortex Search Service", value=DEFAULT_SERVICE)
+        model_name = st.selectbox("Model", options=AVAILABLE_MODELS, index=AVAILABLE_MODELS.index(DEFAULT_MODEL))
+        top_k = st.slider("Jumlah konteks (Top-K)", min_value=1, max_value=20, value=DEFAULT_K, step=1)
+        context_budget = st.number_input(
+            "Budget token konteks", min_value=100, max_value=8000, value=DEFAULT_CONTEXT_BUDGET, step=100
+        )
+        show_context = st.checkbox("Tampilkan konteks yang diambil", value=False)
+        use_semantic_cache = st.checkbox(
+            "Pakai cache jawaban (pertanyaan mirip)", value=False,
+            help="Jawaban lama dipakai ulang kalau pertanyaan mirip dan angka / nama di dalamnya sama.",
+        )
+        multi_query = st.checkbox(
+            "Multi-query retrieval", value=False,
+            help="Pecah pertanyaan majemuk jadi beberapa sub-query, dicari paralel lalu digabung (RRF).",
+        )
         st.markdown("---")
-        st.subheader("📎 Konteks Terakhir")
-        last = hist[-1]
-        if last.get("ctx"):
-            for i, c in enumerate(last["ctx"], start=1):
-                st.markdown(f"**{i}.** {c}")
+        if "history" not in st.session_state:
+            st.session_state["history"] = []
+        if st.button("🧹 Clear history"):
+            st.session_state["history"] = []
+        retrieval_cache = get_retrieval_cache()
+        st.caption(
+            f"Cache retrieval: {len(retrieval_cache)} entri · "
+            f"hit {retrieval_cache.hits} / miss {retrieval_cache.misses}"
+        )
+        semantic_cache = get_semantic_cache()
+        st.caption(
+            f"Cache jawaban: {len(semantic_cache)} entri · "
+            f"hit {semantic_cache.hits} / miss {semantic_cache.misses}"
+        )
+        latency = get_latency_log().summary()
+        if latency:
+            st.markdown("**⏱️ Latency (p50 / p95)**")
+            st.markdown("\n".join(
+                ["| Tahap | n | p50 | p95 |", "|---|---:|---:|---:|"]
+                + [f"| {stage} | {n} | {p50:.2f} | {p95:.2f} |" for stage, (n, p50, p95) in latency.items()]
+            ))
+
+    # Layout dua kolom
+    left_col, right_col = st.columns([2, 1], gap="large")
+
+    with left_col:
+        query = st.text_input(
+            "Tulis pertanyaanmu di sini:",
+            value="",
+            placeholder="Apa yang kamu mau tanyakan?"
+        )
+        ask = st.button("Tanya", type="primary", use_container_width=True)
+
+        answer_container = st.empty()  # tempat stream jawaban
+
+        if ask and query.strip():
+            try:
+                rag = build_rag(
+                    db, schema, service, get_search_columns(db, schema, service), top_k, model_name,
+                    use_semantic_cache, int(context_budget), multi_query,
+                )
+                t_start = time.perf_counter()
+                with st.spinner("Mengambil konteks dan menyusun jawaban..."):
+                    contexts, stream, info = rag.cached_query_stream(query.strip())
+                if info["cached"]:
+                    st.caption(f"⚡ Dari cache jawaban (kemiripan {info['similarity']:.2f})")
+
+                renderer = RenderCoalescer(answer_container.markdown(""))
+                for token in stream:
+                    renderer.add(token)
+                acc = renderer.close()
+
+                get_latency_log().append({
+                    "ts": time.time(),
+                    "model": model_name,
+                    "cached": info["cached"],
+                    "multi_query": multi_query,
+                    **rag.timings,
+                    "ttft_s": (renderer.first_token_at - t_start) if renderer.first_token_at else None,
+                    "tokens_per_s": renderer.tokens_per_s(),
+                    "total_s": time.perf_counter() - t_start,
+                    "renders": renderer.renders,
+                })
+
+                # simpan ke history
+                st.session_state["history"].append({"q": query.strip(), "a": acc, "ctx": contexts})
+
+            except Exception as e:
+                st.error(f"Terjadi error: {e}")
+
+    with right_col:
+        st.subheader("🕘 Riwayat")
+        hist = st.session_state.get("history", [])
+        if not hist:
+            st.info("Belum ada riwayat.")
         else:
-            st.caption("Tidak ada konteks yang ditemukan.")
+            # tampilkan 5 terakhir (terbaru di atas)
+            for item in reversed(hist[-5:]):
+                with st.expander(f"Q: {item['q'][:80] + ('…' if len(item['q'])>80 else '')}", expanded=False):
+                    st.markdown(f"**Q:** {item['q']}")
+                    st.markdown(f"**A:** {item['a']}")
+                    if show_context and item.get("ctx"):
+                        st.markdown("**Context (Top-K):**")
+                        for i, c in enumerate(item["ctx"], start=1):
+                            st.markdown(f"- {i}. {c}")
+
+        # Panel konteks khusus pertanyaan terakhir
+        if show_context and hist:
+            st.markdown("---")
+            st.subheader("📎 Konteks Terakhir")
+            last = hist[-1]
+            if last.get("ctx"):
+                for i, c in enumerate(last["ctx"], start=1):
+                    st.markdown(f"**{i}.** {c}")
+            else:
+                st.caption("Tidak ada konteks yang ditemukan.")
+
+
+if __name__ == "__main__":
+    main()